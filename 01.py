@@ -5,6 +5,9 @@ import seaborn as sns
 import matplotlib.font_manager as fm
 import os
 
+from correlation_accumulator import CovarianceAccumulator
+from association_matrix import association_matrix
+
 # --------------------------------------------------------
 # 0. 中文字型設定
 # --------------------------------------------------------
@@ -109,8 +112,11 @@ for col in ["年齡", "每月費用", "總費用", "總收入"]:
 # 8. Heatmap 相關係數圖
 # --------------------------------------------------------
 
+# 相關係數由分塊累加的共變異數累加器計算 (不需一次載入全部資料，並快取於 cleaned_customer_data.corr.npz)
+correlation = CovarianceAccumulator.load_cached("cleaned_customer_data.csv").correlation(num_cols)
+
 plt.figure(figsize=(12,10))
-sns.heatmap(df[num_cols].corr(), annot=True, cmap="Blues")
+sns.heatmap(correlation, annot=True, cmap="Blues")
 plt.title("數值欄位相關矩陣 Heatmap", fontproperties=font_prop)
 
 save_path = "figures/heatmap/heatmap.png"
@@ -118,6 +124,21 @@ plt.savefig(save_path, dpi=300, bbox_inches="tight")
 plt.close()
 print(f"📊 已儲存：{save_path}")
 
+# 全部欄位 (數值與類別) 的關聯矩陣：數值–數值 Pearson、數值–類別 η、類別–類別 Cramér's V
+association, _ = association_matrix(df)
+association = association.dropna(how="all").dropna(axis=1, how="all")
+
+plt.figure(figsize=(22,18))
+sns.heatmap(association, cmap="Blues", vmin=-1, vmax=1, xticklabels=True, yticklabels=True)
+plt.title("全部欄位關聯矩陣 Heatmap (Pearson / η / Cramér's V)", fontproperties=font_prop)
+plt.xticks(fontproperties=font_prop)
+plt.yticks(fontproperties=font_prop)
+
+save_path = "figures/heatmap/association_heatmap.png"
+plt.savefig(save_path, dpi=200, bbox_inches="tight")
+plt.close()
+print(f"📊 已儲存：{save_path}")
+
 # --------------------------------------------------------
 # 完成
 # --------------------------------------------------------
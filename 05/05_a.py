@@ -6,6 +6,7 @@ from sklearn.metrics import silhouette_score
 import matplotlib.pyplot as plt
 import seaborn as sns
 import warnings
+from cluster_service import ClusterModel
 warnings.filterwarnings('ignore')
 
 # 設定中文字型
@@ -128,4 +129,9 @@ plt.show()
 # ==================== 6. 儲存結果 ====================
 print("\n【步驟 6】儲存分群結果")
 df.to_csv('customer_clusters.csv', index=False, encoding='utf-8-sig')
-print(f"✓ 分群結果已儲存至 'customer_clusters.csv'")
\ No newline at end of file
+print(f"✓ 分群結果已儲存至 'customer_clusters.csv'")
+
+# 保存標準化參數、群集中心與區域對應，供 cluster_service 即時標記新顧客
+cluster_model = ClusterModel.from_fitted(scaler, kmeans_final, cluster_names, X_scaled)
+cluster_model.save('cluster_model.npz')
+print(f"✓ 分群模型已儲存至 'cluster_model.npz'")
\ No newline at end of file
@@ -1,152 +1,60 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-
-# 設定 Matplotlib 顯示中文字體
-plt.rcParams['font.sans-serif'] = ['Microsoft JhengHei']
-plt.rcParams['axes.unicode_minus'] = False
-
-# 讀取數據
-df = pd.read_csv('customer_clusters.csv')
-
-# 1. 性別特徵分析 (按區域)
-plt.figure(figsize=(10, 6))
-sns.countplot(data=df, x='區域', hue='性別', palette='viridis')
-plt.title('各區域客戶性別分佈')
-plt.xlabel('區域')
-plt.ylabel('客戶數量')
-
-plt.grid(axis='y', linestyle='--')
-plt.savefig('05/05_性別特徵差異_東西.png')
-plt.close()
-
-print("已生成 '05/05_性別特徵差異_東西.png'")
-
-# 2. 年齡特徵分析
-plt.figure(figsize=(10, 6))
-sns.histplot(data=df, x='年齡', hue='區域', multiple='stack', palette='viridis', bins=20)
-plt.title('各區域客戶年齡分佈')
-plt.xlabel('年齡')
-plt.ylabel('客戶數量')
-
-plt.grid(axis='y', linestyle='--')
-plt.savefig('05/05_年齡特徵差異_東西.png')
-plt.close()
-
-print("已生成 '05/05_年齡特徵差異_東西.png'")
-
-# 3. 網路服務特徵分析
-plt.figure(figsize=(10, 6))
-sns.countplot(data=df, x='區域', hue='網路服務', palette='viridis')
-plt.title('各區域客戶網路服務使用分佈')
-plt.xlabel('區域')
-plt.ylabel('客戶數量')
-
-plt.grid(axis='y', linestyle='--')
-plt.savefig('05/05_網路服務特徵差異_東西.png')
-plt.close()
-
-print("已生成 '05/05_網路服務特徵差異_東西.png'")
-
-# 4. 網路類型特徵分析
-plt.figure(figsize=(10, 6))
-sns.countplot(data=df, x='區域', hue='網路連線類型', palette='viridis')
-plt.title('各區域客戶網路類型分佈')
-plt.xlabel('區域')
-plt.ylabel('客戶數量')
-
-plt.grid(axis='y', linestyle='--')
-plt.savefig('05/05_網路類型特徵差異_東西.png')
-plt.close()
-
-print("已生成 '05/05_網路類型特徵差異_東西.png'")
-
-# 5. 婚姻特徵分析
-plt.figure(figsize=(10, 6))
-sns.countplot(data=df, x='區域', hue='婚姻', palette='viridis')
-plt.title('各區域客戶婚姻狀況分佈')
-plt.xlabel('區域')
-plt.ylabel('客戶數量')
-
-plt.grid(axis='y', linestyle='--')
-plt.savefig('05/05_婚姻特徵差異_東西.png')
-plt.close()
+import os
 
-print("已生成 '05/05_婚姻特徵差異_東西.png'")
-
-# 6. 扶養人數特徵分析
-plt.figure(figsize=(10, 6))
-sns.countplot(data=df, x='區域', hue='扶養人數', palette='viridis')
-plt.title('各區域客戶扶養人數分佈')
-plt.xlabel('區域')
-plt.ylabel('客戶數量')
-
-plt.grid(axis='y', linestyle='--')
-plt.savefig('05/05_扶養人數特徵差異_東西.png')
-plt.close()
-
-print("已生成 '05/05_扶養人數特徵差異_東西.png'")
-
-# 7. 優惠方式特徵分析
-plt.figure(figsize=(10, 6))
-sns.countplot(data=df, x='區域', hue='優惠方式', palette='viridis')
-plt.title('各區域客戶優惠方式分佈')
-plt.xlabel('區域')
-plt.ylabel('客戶數量')
-
-plt.grid(axis='y', linestyle='--')
-plt.savefig('05/05_優惠方式特徵差異_東西.png')
-plt.close()
-
-print("已生成 '05/05_優惠方式特徵差異_東西.png'")
-
-# 8. 合約類型特徵分析
-plt.figure(figsize=(10, 6))
-sns.countplot(data=df, x='區域', hue='合約類型', palette='viridis')
-plt.title('各區域客戶合約類型分佈')
-plt.xlabel('區域')
-plt.ylabel('客戶數量')
-
-plt.grid(axis='y', linestyle='--')
-plt.savefig('05/05_合約類型特徵差異_東西.png')
-plt.close()
-
-print("已生成 '05/05_合約類型特徵差異_東西.png'")
-
-# 9. 支付帳單方式特徵分析
-plt.figure(figsize=(10, 6))
-sns.countplot(data=df, x='區域', hue='支付帳單方式', palette='viridis')
-plt.title('各區域客戶支付帳單方式分佈')
-plt.xlabel('區域')
-plt.ylabel('客戶數量')
-
-plt.grid(axis='y', linestyle='--')
-plt.savefig('05/05_支付帳單方式特徵差異_東西.png')
-plt.close()
-
-print("已生成 '05/05_支付帳單方式特徵差異_東西.png'")
-
-# 10. 每月費用特徵分析 (Box Plot)
-plt.figure(figsize=(10, 6))
-sns.boxplot(data=df, x='區域', y='每月費用', hue='區域', palette='viridis', legend=False)
-plt.title('各區域客戶每月費用分佈')
-plt.xlabel('區域')
-plt.ylabel('每月費用')
-plt.grid(axis='y', linestyle='--')
-plt.savefig('05/05_每月費用特徵差異_東西.png')
-plt.close()
-
-print("已生成 '05/05_每月費用特徵差異_東西.png'")
-
-# 11. 總收入特徵分析 (Box Plot)
-plt.figure(figsize=(10, 6))
-sns.boxplot(data=df, x='區域', y='總收入', hue='區域', palette='viridis', legend=False)
-plt.title('各區域客戶總收入分佈')
-plt.xlabel('區域')
-plt.ylabel('總收入')
-plt.grid(axis='y', linestyle='--')
-plt.savefig('05/05_總收入特徵差異_東西.png')
-plt.close()
-
-print("已生成 '05/05_總收入特徵差異_東西.png'")
+import pandas as pd
 
+from segment_profile import SegmentProfiler, render_profile_charts
+from segment_tests import run_segment_tests
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+
+# 分群欄位：可換成 '年齡群組'、'CLV_Group'、'Cluster' 等任何欄位
+SEGMENT_COL = '區域'
+SEGMENT_SUFFIX = '東西'
+
+# 要比較的特徵：(欄位, 圖表類型, 標題)
+# 新增特徵只需在此加一列，不會再多掃描一次資料
+FEATURE_CHARTS = [
+    ('性別', 'count', '各區域客戶性別分佈'),
+    ('年齡', 'hist', '各區域客戶年齡分佈'),
+    ('網路服務', 'count', '各區域客戶網路服務使用分佈'),
+    ('網路連線類型', 'count', '各區域客戶網路類型分佈'),
+    ('婚姻', 'count', '各區域客戶婚姻狀況分佈'),
+    ('扶養人數', 'count', '各區域客戶扶養人數分佈'),
+    ('優惠方式', 'count', '各區域客戶優惠方式分佈'),
+    ('合約類型', 'count', '各區域客戶合約類型分佈'),
+    ('支付帳單方式', 'count', '各區域客戶支付帳單方式分佈'),
+    ('每月費用', 'box', '各區域客戶每月費用分佈'),
+    ('總收入', 'box', '各區域客戶總收入分佈'),
+]
+
+# 圖檔名稱與欄位名稱不同的特徵 (沿用既有檔名)
+FILE_LABELS = {'網路連線類型': '網路類型'}
+
+if __name__ == "__main__":
+    # 讀取數據
+    df = pd.read_csv(os.path.join(base_dir, 'customer_clusters.csv'), encoding='utf-8-sig')
+
+    # 一次計算所有特徵的區段分佈
+    categorical = [f for f, kind, _ in FEATURE_CHARTS if kind == 'count']
+    numeric = [f for f, kind, _ in FEATURE_CHARTS if kind != 'count']
+    profiler = SegmentProfiler(df, SEGMENT_COL)
+    profile = profiler.profile(categorical=categorical, numeric=numeric, bins=20)
+
+    profile_path = os.path.join(base_dir, f'05_特徵輪廓_{SEGMENT_SUFFIX}.csv')
+    profile.to_csv(profile_path, index=False, encoding='utf-8-sig')
+    print(f"已生成 '{os.path.relpath(profile_path)}' ({len(profile)} 列)")
+
+    # 以同一份編碼做所有特徵的顯著性檢定，取代肉眼比較圖表
+    tests = run_segment_tests(df, SEGMENT_COL, categorical=categorical, numeric=numeric, profiler=profiler)
+    tests_path = os.path.join(base_dir, f'05_顯著性檢定_{SEGMENT_SUFFIX}.csv')
+    tests.to_csv(tests_path, index=False, encoding='utf-8-sig')
+    print(f"已生成 '{os.path.relpath(tests_path)}' (顯著差異 {int(tests['significant'].sum())} / {len(tests)} 項)")
+
+    # 由輪廓表平行繪製所有比較圖
+    charts = [
+        {'feature': feature, 'kind': kind, 'title': title,
+         'path': os.path.join(base_dir, f'05_{FILE_LABELS.get(feature, feature)}特徵差異_{SEGMENT_SUFFIX}.png')}
+        for feature, kind, title in FEATURE_CHARTS
+    ]
+    for path in render_profile_charts(profile, charts, segment_label=SEGMENT_COL):
+        print(f"已生成 '{os.path.relpath(path)}'")
@@ -1,59 +1,86 @@
+import os
+import sys
 import pandas as pd
-from mlxtend.frequent_patterns import apriori, association_rules
 
-def find_association_rules(df, region_name):
-    """
-    為特定區域的顧客資料分析並找出關聯規則。
-    """
-    # 篩選出特定區域的顧客
-    region_customers = df[df['區域'] == region_name].copy()
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from itemset_lattice import ItemsetLattice
+from rule_store import save_rules
 
-    if region_customers.empty:
-        print(f"找不到區域為 '{region_name}' 的顧客資料。")
-        return None
+# 頻繁項目集格以最低關心的支持度探勘一次並快取，較高門檻的規則都由快取推得
+LATTICE_MIN_SUPPORT = 0.2
 
+def find_association_rules_by_region(df, min_support=0.3, return_lattices=False):
+    """
+    一次為所有區域的顧客資料分析並找出關聯規則，回傳 {區域: 規則表或 None}。
+    return_lattices=True 時另外回傳 {區域: ItemsetLattice}，供之後的門檻掃描重複使用。
+    """
     # 選取用於關聯規則分析的特徵
     features = ['性別', '婚姻', '優惠方式', '電話服務', '多線路服務', '網路服務', 
                 '網路連線類型', '線上安全服務', '線上備份服務', '設備保護計劃', '技術支援計劃', 
                 '電視節目', '電影節目', '音樂節目', '無限資料下載', '合約類型', '無紙化計費', '支付帳單方式', '客戶狀態']
 
+    customers = df[df['區域'].notna()].copy()
+
     # 將 'No phone service' 和 'No internet service' 標準化為 'No'
     for col in features:
-        if col in region_customers.columns and region_customers[col].dtype == 'object':
-            region_customers[col] = region_customers[col].replace(['No phone service', 'No internet service'], 'No')
+        if col in customers.columns and customers[col].dtype == 'object':
+            customers[col] = customers[col].replace(['No phone service', 'No internet service'], 'No')
 
-    # 進行 one-hot 編碼
-    basket = pd.get_dummies(region_customers[features])
+    # 進行一次 one-hot 編碼，再以分層 Eclat 同時建立各區域的頻繁項目集格
+    basket = pd.get_dummies(customers[features])
+    lattices = ItemsetLattice.build_stratified(basket, customers['區域'],
+                                               min_support=min(LATTICE_MIN_SUPPORT, min_support))
 
-    # 使用 Apriori 演算法找出頻繁項集
-    frequent_itemsets = apriori(basket, min_support=0.3, use_colnames=True)
+    results = {}
+    for region_name, lattice in lattices.items():
+        if lattice.frequent_itemsets(min_support).empty:
+            print(f"在區域 '{region_name}' 中找不到支持度 > {min_support} 的頻繁項集。")
+            results[region_name] = None
+            continue
 
-    if frequent_itemsets.empty:
-        print(f"在區域 '{region_name}' 中找不到支持度 > 0.3 的頻繁項集。")
-        return None
+        # 由快取的格產生關聯規則 (欄位與 mlxtend association_rules 相同)
+        rules = lattice.rules(min_support=min_support, min_lift=1)
+
+        if rules.empty:
+            results[region_name] = None
+            continue
 
-    # 產生關聯規則
-    rules = association_rules(frequent_itemsets, metric="lift", min_threshold=1)
+        # 根據提升度和信賴度排序
+        results[region_name] = rules.sort_values(['confidence', 'lift'], ascending=[False, False])
 
-    if rules.empty:
+    if return_lattices:
+        return results, lattices
+    return results
+
+def find_association_rules(df, region_name, min_support=0.3):
+    """
+    為特定區域的顧客資料分析並找出關聯規則 (保留原本的單一區域介面，內部改用分層探勘)。
+    """
+    region_customers = df[df['區域'] == region_name]
+    if region_customers.empty:
+        print(f"找不到區域為 '{region_name}' 的顧客資料。")
         return None
-        
-    # 根據提升度和信賴度排序
-    rules = rules.sort_values(['confidence', 'lift'], ascending=[False, False])
-    
-    return rules
+    return find_association_rules_by_region(region_customers, min_support).get(region_name)
 
 # --- 主程式執行區 ---
 try:
     df = pd.read_csv("05/customer_clusters.csv", encoding='utf-8-sig')
 
-    print("正在分析東部顧客...")
-    east_rules = find_association_rules(df, '東部')
+    print("正在分析各區域顧客...")
+    region_rules, region_lattices = find_association_rules_by_region(df, return_lattices=True)
+    if '東部' not in region_rules:
+        print("找不到區域為 '東部' 的顧客資料。")
+    east_rules = region_rules.get('東部')
     if east_rules is not None and not east_rules.empty:
-        # 儲存結果
-        output_path_east = "05/east_customer_rules.csv"
-        east_rules.to_csv(output_path_east, index=False, encoding='utf-8-sig')
-        print(f"東部顧客的關聯規則已儲存至: {output_path_east}")
+        # 儲存結果：二進位規則檔供後續分析讀取，CSV 僅供報告閱讀
+        output_path_east = "05/east_customer_rules.npz"
+        store = save_rules(east_rules, output_path_east)
+        store.to_csv("05/east_customer_rules.csv")
+        print(f"東部顧客的關聯規則已儲存至: {output_path_east} (可讀版本: 05/east_customer_rules.csv)")
+
+        # 保存頻繁項目集格，調整門檻時可用 itemset_lattice.py 直接掃描，不需重新探勘
+        region_lattices['東部'].save("05/east_customer_lattice.npz")
+        print("東部顧客的頻繁項目集格已儲存至: 05/east_customer_lattice.npz")
         print("東部顧客關聯規則前五筆：")
         print(east_rules.head())
     else:
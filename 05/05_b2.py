@@ -1,8 +1,11 @@
-import pandas as pd
-import ast
-from itertools import combinations
+import os
+import sys
 import warnings
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from rule_pruning import prune_redundant_rules
+from rule_store import load_rules, save_rules
+
 # 忽略解析過程中可能出現的警告
 warnings.filterwarnings("ignore", category=UserWarning)
 
@@ -15,18 +18,6 @@ TARGET_FEATURES = [
     '支付帳單方式'
 ]
 
-def parse_fs_string(s):
-    """安全地將 frozenset 的字串表示法解析為 frozenset 物件。"""
-    s = s.strip()
-    if s.startswith("frozenset("):
-        s = s[len("frozenset("):-1]
-    try:
-        # 使用 ast.literal_eval 比 eval 更安全
-        return frozenset(ast.literal_eval(s))
-    except (ValueError, SyntaxError):
-        # 處理無效或空的字串
-        return frozenset()
-
 def contains_target_feature(itemset, targets):
     """檢查 itemset 中是否有任何項目與目標特徵相關。"""
     for item in itemset:
@@ -40,14 +31,13 @@ def analyze_advanced_rules(input_filepath, output_filepath, target_features):
     對關聯規則進行進階分析，專注於指定的特徵，並找出有價值的、非冗餘的規則。
     """
     try:
-        rules_df = pd.read_csv(input_filepath, encoding='utf-8-sig')
+        # 二進位規則檔直接還原為 frozenset，不需逐格解析字串
+        rules_df = load_rules(input_filepath)
     except FileNotFoundError:
         print(f"錯誤：在 {input_filepath} 找不到輸入檔案")
         return
 
     # --- 1. 資料準備與特徵篩選 ---
-    rules_df['antecedents'] = rules_df['antecedents'].apply(parse_fs_string)
-    rules_df['consequents'] = rules_df['consequents'].apply(parse_fs_string)
     rules_df = rules_df[rules_df['consequents'].apply(lambda x: len(x) > 0)]
     
     print(f"成功讀取 {len(rules_df)} 條規則。")
@@ -65,26 +55,9 @@ def analyze_advanced_rules(input_filepath, output_filepath, target_features):
     feature_rules_df['antecedent_len'] = feature_rules_df['antecedents'].apply(len)
     feature_rules_df = feature_rules_df.sort_values('antecedent_len', ascending=True)
 
-    indices_to_drop = set()
-    rules_tuples = list(feature_rules_df.itertuples())
-
-    for i in range(len(rules_tuples)):
-        rule1 = rules_tuples[i]
-        if rule1.Index in indices_to_drop:
-            continue
-        
-        for j in range(i + 1, len(rules_tuples)):
-            rule2 = rules_tuples[j]
-            if rule2.Index in indices_to_drop:
-                continue
-
-            # 若 rule1 的前項是 rule2 的子集，且後項相同，且信賴度更高或相等，則 rule2 是冗餘的
-            if (rule1.consequents == rule2.consequents and
-                rule1.antecedents.issubset(rule2.antecedents) and
-                rule1.confidence >= rule2.confidence):
-                indices_to_drop.add(rule2.Index)
-
-    non_redundant_rules = feature_rules_df.drop(list(indices_to_drop))
+    # 依後項分組並以前項子集索引比對，只檢查候選的一般化規則
+    # 若 rule1 的前項是 rule2 的子集，且後項相同，且信賴度更高或相等，則 rule2 是冗餘的
+    non_redundant_rules = prune_redundant_rules(feature_rules_df)
     print(f"移除冗餘規則後，剩下 {len(non_redundant_rules)} 條規則。")
     print("-" * 70)
 
@@ -128,13 +101,16 @@ def analyze_advanced_rules(input_filepath, output_filepath, target_features):
     print(final_valuable_rules.head(10))
 
     try:
-        final_valuable_rules.to_csv(output_filepath, index=False, encoding='utf-8-sig')
-        print(f"\n分析完成！所有篩選出的高價值規則已儲存至: {output_filepath}")
+        # 二進位規則檔供 rule_targeting.py 套用回顧客資料，CSV 為 RuleStore 的可讀格式 (項目以 ", " 串接)
+        rules_path = os.path.splitext(output_filepath)[0] + '.npz'
+        store = save_rules(final_valuable_rules.drop(columns='antecedent_len'), rules_path)
+        store.to_csv(output_filepath)
+        print(f"\n分析完成！所有篩選出的高價值規則已儲存至: {output_filepath} (規則檔: {rules_path})")
     except Exception as e:
         print(f"儲存檔案時發生錯誤: {e}")
 
 # --- 主程式執行區 ---
 if __name__ == "__main__":
-    INPUT_FILE = "05/east_customer_rules.csv"
+    INPUT_FILE = "05/east_customer_rules.npz"
     OUTPUT_FILE = "05/advanced_rules_analysis.csv"
     analyze_advanced_rules(INPUT_FILE, OUTPUT_FILE, TARGET_FEATURES)
@@ -0,0 +1,161 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+# 分群使用的特徵欄位 (與 05_a.py 相同)
+FEATURES = ['緯度', '經度']
+# partial_fit 時每個中心最多「記得」的樣本數；累積數超過後學習率不再下降，中心仍能跟上分布移動
+MAX_COUNT = 1000
+
+
+class ClusterModel:
+    """
+    已訓練的地理分群模型：標準化參數、群集中心與群集 → 區域名稱對應。
+
+    可存成 .npz，載入後以最近中心點即時標記單一顧客或小批次顧客，
+    並支援 partial_fit 漸進更新中心點與漂移監控。
+    """
+
+    def __init__(self, mean, scale, centers, labels, counts, base_inertia, features=FEATURES):
+        self.mean = np.asarray(mean, dtype=float)
+        self.scale = np.asarray(scale, dtype=float)
+        self.centers = np.asarray(centers, dtype=float)          # 標準化空間中的中心點
+        self.labels = np.asarray(labels, dtype=str)              # 群集編號 → 區域名稱
+        self.counts = np.asarray(counts, dtype=float)            # 各中心累積的樣本數
+        self.base_inertia = float(base_inertia)                  # 訓練時的平均平方距離
+        self.features = list(features)
+        self.reference_centers = self.centers.copy()
+        self._recent_sq_dist = []
+
+    # ---------- 建立與保存 ----------
+    @classmethod
+    def from_fitted(cls, scaler, kmeans, cluster_names, X_scaled):
+        """由 05_a.py 訓練好的 StandardScaler、KMeans 與群集名稱建立。"""
+        n_clusters = kmeans.n_clusters
+        labels = [cluster_names.get(i, str(i)) for i in range(n_clusters)]
+        counts = np.bincount(kmeans.labels_, minlength=n_clusters)
+        return cls(scaler.mean_, scaler.scale_, kmeans.cluster_centers_, labels, counts,
+                   kmeans.inertia_ / len(X_scaled), features=list(scaler.feature_names_in_))
+
+    def save(self, path):
+        np.savez(path, mean=self.mean, scale=self.scale, centers=self.centers,
+                 reference_centers=self.reference_centers, labels=self.labels,
+                 counts=self.counts, base_inertia=self.base_inertia,
+                 features=np.array(self.features, dtype=str))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            model = cls(data['mean'], data['scale'], data['centers'], data['labels'],
+                        data['counts'], data['base_inertia'], list(data['features']))
+            model.reference_centers = data['reference_centers']
+        return model
+
+    # ---------- 即時標記 ----------
+    def _scaled(self, X):
+        if isinstance(X, pd.DataFrame):
+            X = X[self.features].to_numpy(dtype=float)
+        X = np.atleast_2d(np.asarray(X, dtype=float))
+        return (X - self.mean) / self.scale
+
+    def _nearest(self, Z):
+        # |z - c|^2 = |z|^2 - 2 z·c + |c|^2，一次計算所有樣本到所有中心的距離
+        sq = ((Z ** 2).sum(axis=1)[:, None] - 2 * Z @ self.centers.T
+              + (self.centers ** 2).sum(axis=1)[None, :])
+        idx = sq.argmin(axis=1)
+        return idx, np.maximum(sq[np.arange(len(Z)), idx], 0)
+
+    def predict(self, X):
+        """回傳每筆資料的群集編號。X 可為 DataFrame (含緯度/經度) 或 (n, 2) 陣列。"""
+        return self._nearest(self._scaled(X))[0]
+
+    def assign(self, X):
+        """回傳每筆資料的區域名稱 (東部 / 西部)。"""
+        return self.labels[self.predict(X)]
+
+    def assign_one(self, lat, lon):
+        """標記單一顧客。"""
+        return str(self.assign([[lat, lon]])[0])
+
+    # ---------- 漸進更新與漂移監控 ----------
+    def partial_fit(self, X, max_count=MAX_COUNT):
+        """
+        以新一批資料更新中心點 (Mini-batch K-means 的逐中心學習率)，
+        並記錄這批資料的平均平方距離供漂移指標使用。
+        各中心的累積數以 max_count 為上限，學習率 = 本批數 / (累積數 + 本批數) 不會趨近 0，
+        舊資料的權重以固定比例衰減；max_count=np.inf 即為一般的累積平均。
+        """
+        Z = self._scaled(X)
+        idx, sq = self._nearest(Z)
+        k = len(self.centers)
+        batch_counts = np.bincount(idx, minlength=k).astype(float)
+        batch_sums = np.zeros_like(self.centers)
+        np.add.at(batch_sums, idx, Z)
+
+        seen = batch_counts > 0
+        prior = np.minimum(self.counts, max_count)
+        total = prior + batch_counts
+        self.centers[seen] = (self.centers[seen] * prior[seen, None] + batch_sums[seen]) / total[seen, None]
+        self.counts = np.minimum(total, max_count)
+        self._recent_sq_dist.append(sq)
+        return self
+
+    def drift(self):
+        """
+        回傳漂移指標：
+          - center_shift: 各中心相對訓練時位置的最大位移 (標準化單位)
+          - inertia_ratio: 近期資料平均平方距離 / 訓練時平均平方距離
+          - label_flip: 依經度判斷東西部的順序是否已經對調
+        """
+        shift = float(np.sqrt(((self.centers - self.reference_centers) ** 2).sum(axis=1)).max())
+        if self._recent_sq_dist:
+            inertia_ratio = float(np.concatenate(self._recent_sq_dist).mean() / self.base_inertia)
+        else:
+            inertia_ratio = 1.0
+
+        lon = self.features.index('經度') if '經度' in self.features else -1
+        order_now = np.argsort(self.centers[:, lon])
+        order_ref = np.argsort(self.reference_centers[:, lon])
+        return {
+            'center_shift': shift,
+            'inertia_ratio': inertia_ratio,
+            'label_flip': bool(np.any(order_now != order_ref)),
+        }
+
+    def needs_recluster(self, max_shift=0.25, max_inertia_ratio=1.5):
+        """漂移超過門檻時回傳 True，代表應重新執行 05_a.py 的完整分群。"""
+        d = self.drift()
+        return d['label_flip'] or d['center_shift'] > max_shift or d['inertia_ratio'] > max_inertia_ratio
+
+
+if __name__ == "__main__":
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    model = ClusterModel.load(os.path.join(base_dir, 'cluster_model.npz'))
+    df = pd.read_csv(os.path.join(base_dir, 'customer_clusters.csv'), encoding='utf-8-sig')
+
+    # 與批次分群結果比對
+    start = time.perf_counter()
+    regions = model.assign(df)
+    elapsed = time.perf_counter() - start
+    print(f"批次標記 {len(df)} 筆: {elapsed * 1000:.2f} ms, 與 customer_clusters.csv 一致率 {np.mean(regions == df['區域']):.4f}")
+
+    start = time.perf_counter()
+    region = model.assign_one(34.05, -118.24)
+    print(f"單筆標記 (34.05, -118.24) → {region}: {(time.perf_counter() - start) * 1e6:.0f} µs")
+
+    # 以資料本身模擬新進顧客做漸進更新
+    for batch in np.array_split(df[FEATURES].to_numpy(), 10):
+        model.partial_fit(batch)
+    print(f"漂移指標: {model.drift()}, 需要重新分群: {model.needs_recluster()}")
+
+    # 模擬分布移動 (新顧客整體往東 1 度)：有上限的累積數讓中心跟上，累積平均則幾乎不動
+    shifted = df[FEATURES].to_numpy() + [0.0, 1.0]
+    for max_count in [MAX_COUNT, np.inf]:
+        online = ClusterModel.load(os.path.join(base_dir, 'cluster_model.npz'))
+        online.counts = online.counts * 10          # 模擬已累積大量歷史資料
+        for batch in np.array_split(shifted, 10):
+            online.partial_fit(batch, max_count=max_count)
+        d = online.drift()
+        print(f"max_count={max_count:g}: 中心最大位移 {d['center_shift']:.3f}, 需要重新分群: {online.needs_recluster()}")
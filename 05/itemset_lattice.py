@@ -0,0 +1,233 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from itemset_miner import (TransactionBitsets, mine_frequent_itemsets, mine_stratified_itemsets,
+                           min_support_count, segment_masks)
+from rule_store import itemset_hashes, splitmix64
+
+# 與 mlxtend association_rules 相同的輸出欄位
+RULE_COLUMNS = ['antecedents', 'consequents', 'antecedent support', 'consequent support', 'support',
+                'confidence', 'lift', 'representativity', 'leverage', 'conviction', 'zhangs_metric',
+                'jaccard', 'certainty', 'kulczynski']
+
+
+class ItemsetLattice:
+    """
+    在「最低關心支持度」下探勘一次並保存的頻繁項目集格 (lattice)。
+
+    任何較高的支持度 / 信賴度 / 提升度門檻組合，所需的規則都能直接由格中的計數推得
+    (頻繁項目集的所有子集合都在格內)，不需要再讀取交易資料。
+    """
+
+    def __init__(self, items, n_transactions, offsets, ids, counts, min_support):
+        self.items = np.asarray(items, dtype=str)
+        self.n_transactions = int(n_transactions)
+        self.offsets = offsets            # CSR：第 i 個項目集為 ids[offsets[i]:offsets[i+1]]
+        self.ids = ids
+        self.counts = counts              # 各項目集出現次數
+        self.min_support = float(min_support)
+        self._lookup = pd.Index(itemset_hashes(offsets, ids))
+        self._rule_base = None
+        self._metrics = None
+
+    def __len__(self):
+        return len(self.counts)
+
+    # ---------- 建立 ----------
+    @classmethod
+    def from_found(cls, found, items, n_transactions, min_support):
+        """由探勘結果 [(項目索引 tuple, 次數), ...] 建立。"""
+        found = sorted(found, key=lambda x: (len(x[0]), sorted(x[0])))
+        lengths = np.array([len(idx) for idx, _ in found], dtype=np.int64)
+        offsets = np.zeros(len(found) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        ids = np.array([i for idx, _ in found for i in sorted(idx)], dtype=np.int32)
+        counts = np.array([c for _, c in found], dtype=np.int64)
+        return cls(items, n_transactions, offsets, ids, counts, min_support)
+
+    @classmethod
+    def build(cls, basket, min_support, max_len=None):
+        """在 one-hot 資料表上以 Eclat 探勘並建立格。"""
+        bitsets = TransactionBitsets.from_frame(basket)
+        found = mine_frequent_itemsets(bitsets, min_support=min_support, max_len=max_len)
+        return cls.from_found(found, bitsets.items, bitsets.n_transactions, min_support)
+
+    @classmethod
+    def build_stratified(cls, basket, segments, min_support, max_len=None, n_jobs=1):
+        """一次分層探勘，回傳 {區段鍵: ItemsetLattice}。"""
+        bitsets = TransactionBitsets.from_frame(basket)
+        keys, masks = segment_masks(segments)
+        sizes, found = mine_stratified_itemsets(bitsets, masks, min_support=min_support,
+                                                max_len=max_len, n_jobs=n_jobs)
+        lattices = {}
+        for s, key in enumerate(keys):
+            n = int(sizes[s])
+            min_count = min_support_count(min_support, n) if n else 1
+            seg_found = [(idx, int(c[s])) for idx, c in found if c[s] >= min_count]
+            lattices[key] = cls.from_found(seg_found, bitsets.items, n, min_support)
+        return lattices
+
+    # ---------- 讀寫 ----------
+    def save(self, path):
+        np.savez(path, items=self.items, n_transactions=self.n_transactions,
+                 offsets=self.offsets, ids=self.ids, counts=self.counts, min_support=self.min_support)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['items'], data['n_transactions'], data['offsets'], data['ids'],
+                       data['counts'], data['min_support'])
+
+    # ---------- 頻繁項目集 ----------
+    @property
+    def supports(self):
+        return self.counts / self.n_transactions
+
+    def _check_support(self, min_support):
+        if min_support is None:
+            return self.min_support
+        if min_support < self.min_support:
+            raise ValueError(f"min_support={min_support} 低於格的最低支持度 {self.min_support}，需要重新探勘")
+        return min_support
+
+    def _itemset_names(self, rows):
+        return [frozenset(self.items[self.ids[self.offsets[r]:self.offsets[r + 1]]].tolist()) for r in rows]
+
+    def frequent_itemsets(self, min_support=None, use_colnames=True):
+        """回傳與 apriori 相同格式的 frequent_itemsets (support >= min_support)。"""
+        min_support = self._check_support(min_support)
+        rows = np.flatnonzero(self.supports >= min_support)
+        if use_colnames:
+            itemsets = self._itemset_names(rows)
+        else:
+            itemsets = [frozenset(self.ids[self.offsets[r]:self.offsets[r + 1]].tolist()) for r in rows]
+        return pd.DataFrame({'support': self.supports[rows], 'itemsets': itemsets})
+
+    # ---------- 規則 ----------
+    def rule_base(self):
+        """
+        以格中所有項目集產生全部規則 (信賴度不設下限)，回傳 (項目集, 前項, 後項) 三個格索引陣列。
+        結果會快取，之後任何門檻都只是布林篩選。
+        """
+        if self._rule_base is not None:
+            return self._rule_base
+
+        lengths = np.diff(self.offsets)
+        parts = []
+        for k in range(2, int(lengths.max(initial=0)) + 1):
+            rows = np.flatnonzero(lengths == k)
+            if len(rows) == 0:
+                continue
+            ids_k = self.ids[self.offsets[rows][:, None] + np.arange(k)]
+            hashes = splitmix64(ids_k.astype(np.uint64))
+            # 每個位元樣式代表一種「前項 = 選取的位置」的切分
+            for pattern in range(1, 2 ** k - 1):
+                sel = ((pattern >> np.arange(k)) & 1).astype(bool)
+                ant = self._lookup.get_indexer(hashes[:, sel].sum(axis=1, dtype=np.uint64))
+                con = self._lookup.get_indexer(hashes[:, ~sel].sum(axis=1, dtype=np.uint64))
+                parts.append((rows, ant, con))
+
+        if parts:
+            base = tuple(np.concatenate([p[i] for p in parts]) for i in range(3))
+        else:
+            base = (np.zeros(0, dtype=np.int64),) * 3
+        if (base[1] < 0).any() or (base[2] < 0).any():
+            raise ValueError("格中缺少部分子集合，無法由快取推導規則")
+        self._rule_base = base
+        return base
+
+    def _rule_metrics(self):
+        if self._metrics is not None:
+            return self._metrics
+        rows, ant, con = self.rule_base()
+        s = self.supports
+        s_ac, s_a, s_c = s[rows], s[ant], s[con]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            confidence = s_ac / s_a
+            lift = confidence / s_c
+            leverage = s_ac - s_a * s_c
+            conviction = np.where(confidence < 1.0, (1.0 - s_c) / (1.0 - confidence), np.inf)
+            zhang_den = np.maximum(s_ac * (1 - s_a), s_a * (s_c - s_ac))
+            zhangs = np.where(zhang_den == 0, 0, leverage / zhang_den)
+            certainty = np.where(1 - s_c == 0, 0, (confidence - s_c) / (1 - s_c))
+        self._metrics = {
+            'antecedent support': s_a, 'consequent support': s_c, 'support': s_ac,
+            'confidence': confidence, 'lift': lift, 'representativity': np.ones_like(s_ac),
+            'leverage': leverage, 'conviction': conviction, 'zhangs_metric': zhangs,
+            'jaccard': s_ac / (s_a + s_c - s_ac), 'certainty': certainty,
+            'kulczynski': (confidence + s_ac / s_c) / 2,
+        }
+        return self._metrics
+
+    def rule_mask(self, min_support=None, min_confidence=0.0, min_lift=None):
+        """回傳符合門檻 (皆為 >=) 的規則布林遮罩。"""
+        min_support = self._check_support(min_support)
+        m = self._rule_metrics()
+        mask = (m['support'] >= min_support) & (m['confidence'] >= min_confidence)
+        if min_lift is not None:
+            mask &= m['lift'] >= min_lift
+        return mask
+
+    def rules(self, min_support=None, min_confidence=0.0, min_lift=None):
+        """回傳與 mlxtend association_rules 相同欄位的規則表。"""
+        mask = self.rule_mask(min_support, min_confidence, min_lift)
+        _, ant, con = self.rule_base()
+        table = {
+            'antecedents': self._itemset_names(ant[mask]),
+            'consequents': self._itemset_names(con[mask]),
+        }
+        table.update({name: values[mask] for name, values in self._rule_metrics().items()})
+        return pd.DataFrame(table, columns=RULE_COLUMNS)
+
+    def sweep(self, supports, confidences, lifts):
+        """對所有門檻組合產生摘要報表，完全不需要重新探勘。"""
+        m = self._rule_metrics()
+        report = []
+        for s in supports:
+            s_mask = m['support'] >= self._check_support(s)
+            for c in confidences:
+                sc_mask = s_mask & (m['confidence'] >= c)
+                for l in lifts:
+                    mask = sc_mask & (m['lift'] >= l)
+                    n = int(mask.sum())
+                    report.append({
+                        'min_support': s, 'min_confidence': c, 'min_lift': l,
+                        '規則數量': n,
+                        '平均信賴度': m['confidence'][mask].mean() if n else 0,
+                        '平均提升度': m['lift'][mask].mean() if n else 0,
+                        '最大提升度': m['lift'][mask].max() if n else 0,
+                    })
+        return pd.DataFrame(report)
+
+
+def _float_list(text):
+    return [float(x) for x in text.split(',')]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="由快取的頻繁項目集格產生門檻掃描報表")
+    parser.add_argument('lattice', help="ItemsetLattice 的 .npz 檔")
+    parser.add_argument('--supports', type=_float_list, default=None, help="例如 0.3,0.35,0.4")
+    parser.add_argument('--confidences', type=_float_list, default=[0.5, 0.6, 0.7, 0.8, 0.9])
+    parser.add_argument('--lifts', type=_float_list, default=[1.0, 1.1, 1.2, 1.5])
+    parser.add_argument('--output', help="報表輸出 CSV 路徑")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    lattice = ItemsetLattice.load(args.lattice)
+    supports = args.supports or [round(lattice.min_support + 0.05 * i, 2) for i in range(5)]
+    report = lattice.sweep(supports, args.confidences, args.lifts)
+    elapsed = time.perf_counter() - start
+
+    print(f"格內 {len(lattice)} 個項目集, {len(lattice.rule_base()[0])} 條候選規則, "
+          f"{len(report)} 組門檻, 耗時 {elapsed:.2f}s")
+    print(report.to_string(index=False))
+    if args.output:
+        report.to_csv(args.output, index=False, encoding='utf-8-sig')
+        print(f"\n報表已儲存至: {args.output}")
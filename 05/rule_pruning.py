@@ -0,0 +1,148 @@
+import os
+import sys
+import time
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+# 前項子集合數量超過同群較短規則數時，改用位元遮罩掃描比較
+_MAX_SUBSET_ENUM = 4096
+
+
+def _encode(itemsets, item_index):
+    """把 frozenset 轉成排序後的項目 ID tuple。"""
+    return [tuple(sorted(item_index[i] for i in s)) for s in itemsets]
+
+
+def _to_words(id_tuples, n_items):
+    """把項目 ID tuple 轉成 (規則數, 字組數) 的 uint64 位元遮罩。"""
+    n_words = max(1, -(-n_items // 64))
+    words = np.zeros((len(id_tuples), n_words), dtype=np.uint64)
+    for row, ids in enumerate(id_tuples):
+        for i in ids:
+            words[row, i >> 6] |= np.uint64(1) << np.uint64(i & 63)
+    return words
+
+
+def find_redundant_rules(antecedents, consequents, confidence):
+    """
+    找出冗餘規則：存在另一條後項相同、前項為其真子集且信賴度不低於它的規則。
+
+    規則先依後項分組，再以「前項 ID tuple → 最高信賴度」雜湊索引查詢每條規則的所有
+    候選一般化 (前項的真子集)；前項很長、子集合太多時，改以位元遮罩與同組較短規則
+    一次比較。前項與後項完全相同的重複規則，只保留順序在前且信賴度較高者。
+
+    回傳與輸入同長度的布林陣列 (True 代表冗餘)。
+    """
+    antecedents, consequents = list(antecedents), list(consequents)
+    confidence = np.asarray(confidence, dtype=float)
+    items = sorted(set().union(*antecedents, *consequents), key=str)
+    item_index = {item: i for i, item in enumerate(items)}
+    ant_ids = _encode(antecedents, item_index)
+    con_ids = _encode(consequents, item_index)
+
+    groups = {}
+    for row, con in enumerate(con_ids):
+        groups.setdefault(con, []).append(row)
+
+    redundant = np.zeros(len(ant_ids), dtype=bool)
+    for rows in groups.values():
+        # 同一後項內，依前項長度 (穩定) 排序
+        rows = sorted(rows, key=lambda r: len(ant_ids[r]))
+        best = {}
+        for r in rows:
+            key = ant_ids[r]
+            if key in best:
+                redundant[r] = best[key] >= confidence[r]
+                best[key] = max(best[key], confidence[r])
+            else:
+                best[key] = confidence[r]
+
+        group_lens = np.array([len(ant_ids[r]) for r in rows])
+        group_conf = confidence[rows]
+        group_words = None
+        for pos, r in enumerate(rows):
+            if redundant[r]:
+                continue
+            key = ant_ids[r]
+            k = len(key)
+            n_shorter = int(np.searchsorted(group_lens, k))
+            if n_shorter == 0:
+                continue
+
+            if 2 ** k - 2 <= min(n_shorter, _MAX_SUBSET_ENUM):
+                # 直接列舉所有真子集並查表
+                redundant[r] = any(
+                    best.get(sub, -np.inf) >= confidence[r]
+                    for size in range(1, k)
+                    for sub in combinations(key, size)
+                )
+            else:
+                # 與同組較短規則一次做位元子集檢查
+                if group_words is None:
+                    group_words = _to_words([ant_ids[x] for x in rows], len(items))
+                target = group_words[pos]
+                is_subset = ((group_words[:n_shorter] & ~target) == 0).all(axis=1)
+                redundant[r] = bool(np.any(is_subset & (group_conf[:n_shorter] >= confidence[r])))
+
+    return redundant
+
+
+def prune_redundant_rules(rules_df):
+    """回傳移除冗餘規則後的規則表 (保留原本的列順序與索引)。"""
+    mask = find_redundant_rules(rules_df['antecedents'], rules_df['consequents'], rules_df['confidence'])
+    return rules_df[~mask]
+
+
+def prune_redundant_rules_pairwise(rules_df):
+    """原本 05_b2.py 的兩兩比較版本，僅保留作為正確性與效能的對照基準。"""
+    rules_df = rules_df.assign(antecedent_len=rules_df['antecedents'].apply(len))
+    rules_df = rules_df.sort_values('antecedent_len', ascending=True)
+
+    indices_to_drop = set()
+    rules_tuples = list(rules_df.itertuples())
+    for i in range(len(rules_tuples)):
+        rule1 = rules_tuples[i]
+        if rule1.Index in indices_to_drop:
+            continue
+        for j in range(i + 1, len(rules_tuples)):
+            rule2 = rules_tuples[j]
+            if rule2.Index in indices_to_drop:
+                continue
+            if (rule1.consequents == rule2.consequents and
+                    rule1.antecedents.issubset(rule2.antecedents) and
+                    rule1.confidence >= rule2.confidence):
+                indices_to_drop.add(rule2.Index)
+    return rules_df.drop(list(indices_to_drop)).drop(columns='antecedent_len')
+
+
+if __name__ == "__main__":
+    from mlxtend.frequent_patterns import association_rules
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from itemset_miner import eclat
+
+    # --- 效能比較：索引剪枝 vs 原本的兩兩比較 ---
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    df = pd.read_csv(os.path.join(base_dir, 'customer_clusters.csv'), encoding='utf-8-sig')
+    features = ['性別', '婚姻', '優惠方式', '電話服務', '多線路服務', '網路服務',
+                '網路連線類型', '線上安全服務', '線上備份服務', '設備保護計劃', '技術支援計劃',
+                '電視節目', '電影節目', '音樂節目', '無限資料下載', '合約類型', '無紙化計費',
+                '支付帳單方式', '客戶狀態']
+    basket = pd.get_dummies(df.loc[df['區域'] == '東部', features])
+
+    for min_support in [0.3, 0.25, 0.2]:
+        itemsets = eclat(basket, min_support=min_support, use_colnames=True)
+        rules = association_rules(itemsets, metric='lift', min_threshold=1)
+
+        start = time.perf_counter()
+        fast = prune_redundant_rules(rules)
+        t_fast = time.perf_counter() - start
+
+        start = time.perf_counter()
+        slow = prune_redundant_rules_pairwise(rules)
+        t_slow = time.perf_counter() - start
+
+        same = set(fast.index) == set(slow.index)
+        print(f"min_support={min_support}: {len(rules)} 條規則 → 保留 {len(fast)} 條, "
+              f"索引 {t_fast:.3f}s / 兩兩比較 {t_slow:.3f}s (加速 {t_slow / t_fast:.0f}x), 結果一致: {same}")
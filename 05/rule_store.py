@@ -0,0 +1,157 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+# 規則表中以項目集合表示的欄位
+ITEMSET_COLUMNS = ['antecedents', 'consequents']
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+
+def splitmix64(x):
+    """SplitMix64 混合函數 (uint64 陣列運算，溢位自動回繞)。"""
+    z = np.asarray(x, dtype=np.uint64) + _GOLDEN
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def itemset_hashes(offsets, ids):
+    """
+    以 CSR 格式的項目 ID 計算每個項目集合的 64 位元雜湊。
+    各項目雜湊值相加與順序無關，等同對排序後的 ID 序列取雜湊。
+    """
+    item_hash = splitmix64(ids.astype(np.uint64))
+    sums = np.zeros(len(offsets) - 1, dtype=np.uint64)
+    nonempty = offsets[1:] > offsets[:-1]
+    if item_hash.size:
+        sums[nonempty] = np.add.reduceat(item_hash, offsets[:-1][nonempty])
+    return sums
+
+
+def _flatten(id_lists):
+    """把多個 ID 列表轉成 CSR 格式 (offsets, ids)。"""
+    lengths = np.fromiter((len(x) for x in id_lists), dtype=np.int64, count=len(id_lists))
+    offsets = np.zeros(len(id_lists) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    ids = np.fromiter((i for x in id_lists for i in x), dtype=np.int32, count=int(offsets[-1]))
+    return offsets, ids
+
+
+class RuleStore:
+    """
+    關聯規則的二進位欄式儲存格式。
+
+    前項與後項以共用項目字典的整數 ID 陣列 (CSR: offsets + ids) 儲存，
+    各指標欄位存成 float64 陣列，整體寫入單一 .npz 檔，讀取時不需要任何字串解析。
+    """
+
+    def __init__(self, items, ant_offsets, ant_ids, con_offsets, con_ids, metrics):
+        self.items = np.asarray(items, dtype=str)
+        self.ant_offsets = ant_offsets
+        self.ant_ids = ant_ids
+        self.con_offsets = con_offsets
+        self.con_ids = con_ids
+        self.metrics = metrics
+
+    def __len__(self):
+        return len(self.ant_offsets) - 1
+
+    # ---------- 建立 ----------
+    @classmethod
+    def from_rules(cls, rules, items=None):
+        """由 mlxtend association_rules 產生的規則表 (frozenset 欄位) 建立。"""
+        if items is None:
+            items = sorted(set().union(*rules['antecedents'], *rules['consequents']))
+        item_index = {item: i for i, item in enumerate(items)}
+
+        def encode(col):
+            return _flatten([sorted(item_index[i] for i in s) for s in rules[col]])
+
+        ant_offsets, ant_ids = encode('antecedents')
+        con_offsets, con_ids = encode('consequents')
+        metrics = {
+            col: rules[col].to_numpy(dtype=float)
+            for col in rules.columns
+            if col not in ITEMSET_COLUMNS and pd.api.types.is_numeric_dtype(rules[col])
+        }
+        return cls(items, ant_offsets, ant_ids, con_offsets, con_ids, metrics)
+
+    # ---------- 讀寫 ----------
+    def save(self, path):
+        np.savez(
+            path,
+            items=self.items,
+            ant_offsets=self.ant_offsets, ant_ids=self.ant_ids,
+            con_offsets=self.con_offsets, con_ids=self.con_ids,
+            metric_names=np.array(list(self.metrics), dtype=str),
+            **{f'metric_{i}': v for i, v in enumerate(self.metrics.values())},
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            names = list(data['metric_names'])
+            metrics = {name: data[f'metric_{i}'] for i, name in enumerate(names)}
+            return cls(data['items'], data['ant_offsets'], data['ant_ids'],
+                       data['con_offsets'], data['con_ids'], metrics)
+
+    # ---------- 存取 ----------
+    def antecedent_ids(self, i):
+        return self.ant_ids[self.ant_offsets[i]:self.ant_offsets[i + 1]]
+
+    def consequent_ids(self, i):
+        return self.con_ids[self.con_offsets[i]:self.con_offsets[i + 1]]
+
+    def _split(self, offsets, ids):
+        if len(offsets) == 1:              # 空的規則集 (np.split 會回傳一個空區段)
+            return []
+        return np.split(ids, offsets[1:-1])
+
+    def to_frame(self, itemsets='frozenset', sep=', '):
+        """
+        轉回規則表。itemsets 可為 'frozenset' (與 mlxtend 相同)、'ids' (項目 ID 陣列)
+        或 'text' (以 sep 串接的可讀字串)。
+        """
+        columns = {}
+        for col, offsets, ids in [('antecedents', self.ant_offsets, self.ant_ids),
+                                  ('consequents', self.con_offsets, self.con_ids)]:
+            parts = self._split(offsets, ids)
+            if itemsets == 'ids':
+                columns[col] = parts
+            elif itemsets == 'text':
+                columns[col] = [sep.join(self.items[p]) for p in parts]
+            else:
+                columns[col] = [frozenset(self.items[p].tolist()) for p in parts]
+        columns.update(self.metrics)
+        return pd.DataFrame(columns)
+
+    def to_csv(self, path, sep=', ', **kwargs):
+        """匯出給報告使用的可讀 CSV。"""
+        kwargs.setdefault('index', False)
+        kwargs.setdefault('encoding', 'utf-8-sig')
+        self.to_frame(itemsets='text', sep=sep).to_csv(path, **kwargs)
+
+
+def load_rules(path):
+    """讀取 .npz 規則檔，回傳 mlxtend 格式的規則表。"""
+    return RuleStore.load(path).to_frame()
+
+
+def save_rules(rules, path):
+    """把 mlxtend 格式的規則表寫入 .npz 規則檔。"""
+    store = RuleStore.from_rules(rules)
+    store.save(path)
+    return store
+
+
+if __name__ == "__main__":
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    npz_path = os.path.join(base_dir, 'east_customer_rules.npz')
+
+    start = time.perf_counter()
+    rules = load_rules(npz_path)
+    print(f"讀取 {len(rules)} 條規則: {(time.perf_counter() - start) * 1000:.1f} ms")
+    print(rules.head())
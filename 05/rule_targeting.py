@@ -0,0 +1,189 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from itemset_miner import pack_columns, popcount
+from rule_store import RuleStore
+
+# 05_b.py 在 one-hot 編碼前做的值替換
+_VALUE_REPLACEMENTS = {'No phone service': 'No', 'No internet service': 'No'}
+
+
+def load_rule_set(path, sep=', '):
+    """
+    讀取規則集，回傳 RuleStore。建議使用 .npz 規則檔 (項目集以 CSR 儲存)；
+    也支援 RuleStore.to_csv 輸出的可讀 CSV (前項/後項為以 sep 串接的項目名稱)。
+    """
+    if path.endswith('.npz'):
+        return RuleStore.load(path)
+    rules = pd.read_csv(path, encoding='utf-8-sig', keep_default_na=False)
+    for col in ['antecedents', 'consequents']:
+        rules[col] = rules[col].apply(lambda s: frozenset(s.split(sep)) if s else frozenset())
+    return RuleStore.from_rules(rules.drop(columns=['antecedent_len'], errors='ignore'))
+
+
+def encode_items(df, items):
+    """
+    把顧客資料編碼成 (顧客數, 項目數) 的布林矩陣。
+    項目可為 one-hot 名稱「欄位_值」(05_b.py) 或服務欄位名稱 (06.py，代表 'Yes')。
+    """
+    matrix = np.zeros((len(df), len(items)), dtype=bool)
+    for j, item in enumerate(items):
+        if item in df.columns:
+            matrix[:, j] = df[item].to_numpy() == 'Yes'
+            continue
+        col, _, value = item.rpartition('_')
+        if col not in df.columns:
+            raise KeyError(f"資料中找不到規則項目 '{item}' 對應的欄位")
+        values = df[col].replace(_VALUE_REPLACEMENTS).astype(str).to_numpy()
+        matrix[:, j] = values == value
+    return matrix
+
+
+def _itemset_bits(bits, offsets, ids):
+    """以 CSR 項目集對 packed 位元集合做 AND，回傳 (項目集數, 字組數)。"""
+    n_sets = len(offsets) - 1
+    lengths = np.diff(offsets)
+    width = int(lengths.max(initial=1))
+    # 不足長度的位置指向全為 1 的填充列
+    ones = np.full((1, bits.shape[1]), np.iinfo(np.uint64).max, dtype=np.uint64)
+    padded = np.vstack([bits, ones])
+    index = np.full((n_sets, width), len(bits), dtype=np.int64)
+    pos = np.arange(width)[None, :] < lengths[:, None]
+    index[pos] = ids
+    return np.bitwise_and.reduce(padded[index], axis=1)
+
+
+class RuleTargeting:
+    """
+    把規則集套用回顧客資料。
+
+    顧客資料編碼成每個項目一列 packed uint64 位元集合；每條規則的前項與後項各以一次
+    AND 得到符合的顧客集合。「符合前項但尚未擁有後項」的顧客即為該規則的目標名單，
+    同時以 popcount 重新計算規則在這份資料上的支持度、信賴度與提升度，用於監控規則衰退。
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.ant_bits = None
+        self.con_bits = None
+        self.population = None
+        self.n_customers = 0
+        self.n_rows = 0
+
+    def fit(self, df, mask=None):
+        """在一份顧客資料上計算所有規則的位元集合；mask 可限定規則適用的顧客 (例如某區域)。"""
+        matrix = encode_items(df, list(self.store.items))
+        # 最後一列為適用母體，所有名單與指標都只計算母體內的顧客
+        population = np.ones((len(df), 1), dtype=bool) if mask is None else np.asarray(mask, dtype=bool)[:, None]
+        bits = pack_columns(np.hstack([matrix, population]))
+        self.population = bits[-1]
+        self.n_customers = int(popcount(self.population))
+        self.ant_bits = _itemset_bits(bits[:-1], self.store.ant_offsets, self.store.ant_ids)
+        self.con_bits = _itemset_bits(bits[:-1], self.store.con_offsets, self.store.con_ids)
+        self.n_rows = len(df)
+        return self
+
+    # ---------- 名單 ----------
+    def target_bits(self):
+        """符合前項但未擁有完整後項的顧客 (規則數, 字組數)。"""
+        return self.ant_bits & ~self.con_bits & self.population
+
+    def _unpack(self, bits):
+        return np.unpackbits(bits.view(np.uint8), axis=-1, bitorder='little')[..., :self.n_rows].astype(bool)
+
+    def match_matrix(self):
+        """
+        回傳 (顧客數, 規則數) 的 int8 矩陣：0 不符合前項、1 符合前項但未擁有後項 (目標)、
+        2 符合前項且已擁有後項。
+        """
+        matched = self._unpack(self.ant_bits & self.population)
+        holds = self._unpack(self.ant_bits & self.con_bits & self.population)
+        return (matched.astype(np.int8) + holds).T
+
+    def targets(self, customer_ids, rules=None):
+        """回傳目標名單長表 (規則編號, 客戶編號)；rules 可指定只輸出部分規則。"""
+        rules = np.arange(len(self.store)) if rules is None else np.asarray(rules)
+        target = self._unpack(self.target_bits()[rules])
+        rule_pos, customer = np.nonzero(target)
+        return pd.DataFrame({
+            '規則編號': rules[rule_pos],
+            '客戶編號': np.asarray(customer_ids)[customer],
+        })
+
+    # ---------- 監控 ----------
+    def live_metrics(self, tolerance=0.1):
+        """
+        回傳每條規則的目標人數與即時指標，並和規則檔保存的指標比較。
+        信賴度或提升度相對下降超過 tolerance，或提升度跌破 1 時標記為衰退。
+        """
+        n = max(self.n_customers, 1)
+        ant = popcount(self.ant_bits & self.population)
+        con = popcount(self.con_bits & self.population)
+        both = popcount(self.ant_bits & self.con_bits & self.population)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            support = both / n
+            confidence = np.where(ant > 0, both / ant, np.nan)
+            lift = confidence / (con / n)
+
+        text = self.store.to_frame(itemsets='text')
+        report = pd.DataFrame({
+            '規則編號': np.arange(len(self.store)),
+            '前項': text['antecedents'],
+            '後項': text['consequents'],
+            '符合前項人數': ant,
+            '目標人數': ant - both,
+            '即時支持度': support,
+            '即時信賴度': confidence,
+            '即時提升度': lift,
+        })
+        metrics = self.store.metrics
+        if {'support', 'confidence', 'lift'} <= set(metrics):
+            report['原支持度'] = metrics['support']
+            report['原信賴度'] = metrics['confidence']
+            report['原提升度'] = metrics['lift']
+            report['信賴度變化'] = confidence - metrics['confidence']
+            report['提升度變化'] = lift - metrics['lift']
+            report['衰退'] = ((confidence < metrics['confidence'] * (1 - tolerance))
+                            | (lift < metrics['lift'] * (1 - tolerance))
+                            | ~(lift >= 1))
+        return report
+
+
+if __name__ == "__main__":
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    root = os.path.join(base_dir, '..')
+
+    # --- 東部高價值規則 (05_b2.py) 套用在東部顧客 ---
+    store = load_rule_set(os.path.join(base_dir, 'advanced_rules_analysis.npz'))
+    df = pd.read_csv(os.path.join(base_dir, 'customer_clusters.csv'), encoding='utf-8-sig')
+
+    start = time.perf_counter()
+    engine = RuleTargeting(store).fit(df, mask=df['區域'] == '東部')
+    report = engine.live_metrics()
+    targets = engine.targets(df['客戶編號'])
+    elapsed = time.perf_counter() - start
+    print(f"東部: {len(store)} 條規則 × {engine.n_customers} 位顧客, 耗時 {elapsed * 1000:.1f} ms")
+    print(f"  與規則檔指標的最大差異: 信賴度 {report['信賴度變化'].abs().max():.2e}, "
+          f"提升度 {report['提升度變化'].abs().max():.2e}; 衰退規則 {int(report['衰退'].sum())} 條")
+    print(f"  目標名單共 {len(targets)} 筆")
+    report.to_csv(os.path.join(base_dir, 'east_rule_monitoring.csv'), index=False, encoding='utf-8-sig')
+    targets.to_csv(os.path.join(base_dir, 'east_rule_targets.csv'), index=False, encoding='utf-8-sig')
+
+    # 規則用在另一個區域時的即時指標 (模擬規則移轉或衰退)
+    west = RuleTargeting(store).fit(df, mask=df['區域'] == '西部').live_metrics()
+    print(f"西部: 同一組規則有 {int(west['衰退'].sum())} / {len(west)} 條相對東部衰退")
+
+    # --- 年齡群組規則 (06.py) 套用在各自的年齡群組 ---
+    customers = pd.read_csv(os.path.join(root, 'cleaned_customer_data.csv'), encoding='utf-8-sig')
+    ages = customers['年齡'].to_numpy()
+    groups = np.select([ages <= 40, ages <= 65], ['青', '中'], '老')
+    for g in ['青', '中', '老']:
+        group_store = RuleStore.load(os.path.join(root, '06', f'age_group_{g}_rules.npz'))
+        group_report = RuleTargeting(group_store).fit(customers, mask=groups == g).live_metrics()
+        print(f"年齡群組 {g}: {len(group_store)} 條規則, 目標人數合計 {int(group_report['目標人數'].sum())}, "
+              f"衰退 {int(group_report['衰退'].sum())} 條")
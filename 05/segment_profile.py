@@ -0,0 +1,266 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import seaborn as sns
+from scipy.stats import rankdata
+
+# 輪廓表欄位：每一列是一個 (區段, 特徵, 統計量) 的觀測值
+PROFILE_COLUMNS = ['segment', 'feature', 'stat', 'level', 'bin_left', 'bin_right', 'value']
+
+# 盒鬚圖需要的分位數
+BOX_QUANTILES = {'q1': 0.25, 'median': 0.5, 'q3': 0.75}
+
+
+class SegmentProfiler:
+    """
+    以任意分群欄位 (區域、年齡群組、CLV_Group、Cluster...) 計算各區段的特徵分佈。
+
+    所有欄位只會編碼一次並快取，之後每次 profile() 都是在整數編碼上做單次 bincount，
+    新增比較特徵不需要再重新掃描整份資料。
+    """
+
+    def __init__(self, df, segment_col):
+        self.segment_col = segment_col
+        seg_codes, segments = pd.factorize(df[segment_col], sort=True)
+        valid = seg_codes >= 0
+        self.segments = list(segments)
+        self.n_segments = len(self.segments)
+        self._seg = seg_codes[valid].astype(np.int64)
+        self._df = df.loc[valid]
+        self._cat_cache = {}
+        self._num_cache = {}
+
+    # ---------- 欄位編碼 (快取) ----------
+    def _cat_codes(self, col):
+        if col not in self._cat_cache:
+            codes, levels = pd.factorize(self._df[col], sort=True)
+            self._cat_cache[col] = (codes.astype(np.int64), list(levels))
+        return self._cat_cache[col]
+
+    def _num_values(self, col):
+        if col not in self._num_cache:
+            self._num_cache[col] = pd.to_numeric(self._df[col], errors='coerce').to_numpy(dtype=float)
+        return self._num_cache[col]
+
+    # ---------- 類別特徵：一次 bincount 取得所有列聯表 ----------
+    def contingency_tables(self, features):
+        """回傳 {特徵: (levels, 區段 x 類別 計數矩陣)}。"""
+        if not features:
+            return {}
+        encoded = [self._cat_codes(f) for f in features]
+        sizes = np.array([len(levels) for _, levels in encoded], dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        total = int(sizes.sum())
+
+        codes = np.column_stack([c for c, _ in encoded])
+        flat = self._seg[:, None] * total + offsets[None, :] + codes
+        flat = flat[codes >= 0]
+        counts = np.bincount(flat, minlength=self.n_segments * total).reshape(self.n_segments, total)
+
+        return {
+            f: (levels, counts[:, off:off + size])
+            for f, (_, levels), off, size in zip(features, encoded, offsets, sizes)
+        }
+
+    # ---------- 數值特徵：一次計算動差與直方圖 ----------
+    def numeric_moments(self, features):
+        """回傳 (n, mean, var) 三個 區段 x 特徵 矩陣 (var 為樣本變異數)。"""
+        values = np.column_stack([self._num_values(f) for f in features])
+        valid = ~np.isnan(values)
+        n_feat = len(features)
+        flat = (self._seg[:, None] * n_feat + np.arange(n_feat)[None, :])[valid]
+        x = values[valid]
+        size = self.n_segments * n_feat
+
+        n = np.bincount(flat, minlength=size).reshape(self.n_segments, n_feat).astype(float)
+        s1 = np.bincount(flat, weights=x, minlength=size).reshape(self.n_segments, n_feat)
+        s2 = np.bincount(flat, weights=x * x, minlength=size).reshape(self.n_segments, n_feat)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = s1 / n
+            var = (s2 - n * mean ** 2) / (n - 1)
+        return n, mean, np.clip(var, 0, None)
+
+    def rank_sums(self, features):
+        """
+        回傳 (區段 x 特徵 的秩和, 各特徵的同秩修正項 sum(t^3 - t))，供 Mann-Whitney 檢定使用。
+        """
+        values = np.column_stack([self._num_values(f) for f in features])
+        ranks = rankdata(values, axis=0, nan_policy='omit')
+        valid = ~np.isnan(values)
+        n_feat = len(features)
+        flat = (self._seg[:, None] * n_feat + np.arange(n_feat)[None, :])[valid]
+        sums = np.bincount(flat, weights=ranks[valid], minlength=self.n_segments * n_feat)
+
+        ties = np.empty(n_feat)
+        for j in range(n_feat):
+            _, t = np.unique(values[valid[:, j], j], return_counts=True)
+            ties[j] = np.sum(t.astype(float) ** 3 - t)
+        return sums.reshape(self.n_segments, n_feat), ties
+
+    def numeric_histograms(self, features, bins=20):
+        """回傳 (edges, 區段 x 特徵 x bins 計數)，每個特徵使用自己的等寬分箱。"""
+        values = np.column_stack([self._num_values(f) for f in features])
+        lo = np.nanmin(values, axis=0)
+        hi = np.nanmax(values, axis=0)
+        width = np.where(hi > lo, (hi - lo) / bins, 1.0)
+        edges = lo[:, None] + width[:, None] * np.arange(bins + 1)[None, :]
+
+        valid = ~np.isnan(values)
+        idx = np.floor((values - lo) / width)
+        idx = np.clip(np.nan_to_num(idx), 0, bins - 1).astype(np.int64)
+        n_feat = len(features)
+        flat = (self._seg[:, None] * (n_feat * bins) + np.arange(n_feat)[None, :] * bins + idx)[valid]
+        counts = np.bincount(flat, minlength=self.n_segments * n_feat * bins)
+        return edges, counts.reshape(self.n_segments, n_feat, bins)
+
+    def numeric_quantiles(self, features):
+        """以單次分組計算盒鬚圖所需的分位數，回傳 {stat: 區段 x 特徵 矩陣}。"""
+        values = pd.DataFrame({f: self._num_values(f) for f in features})
+        q = values.groupby(self._seg).quantile(list(BOX_QUANTILES.values()))
+        q = q.reindex(pd.MultiIndex.from_product([range(self.n_segments), list(BOX_QUANTILES.values())]))
+        return {
+            stat: q.xs(p, level=1).to_numpy()
+            for stat, p in BOX_QUANTILES.items()
+        }
+
+    # ---------- 整合成 tidy 輪廓表 ----------
+    def profile(self, categorical=(), numeric=(), bins=20):
+        """計算所有指定特徵，回傳欄位為 PROFILE_COLUMNS 的 tidy DataFrame。"""
+        categorical, numeric = list(categorical), list(numeric)
+        seg_names = np.array(self.segments, dtype=object)
+        parts = []
+
+        for feature, (levels, table) in self.contingency_tables(categorical).items():
+            n_lv = len(levels)
+            parts.append(pd.DataFrame({
+                'segment': np.repeat(seg_names, n_lv),
+                'feature': feature,
+                'stat': 'count',
+                'level': np.tile(np.array(levels, dtype=object), self.n_segments),
+                'value': table.ravel().astype(float),
+            }))
+
+        if numeric:
+            n, mean, var = self.numeric_moments(numeric)
+            edges, hist = self.numeric_histograms(numeric, bins=bins)
+            quantiles = self.numeric_quantiles(numeric)
+            # 盒鬚圖的鬚：1.5 IQR 內的極值，以 (區段, 特徵) 一次計算
+            lower, upper = self._whiskers(numeric, quantiles)
+            scalar_stats = {'n': n, 'mean': mean, 'std': np.sqrt(var),
+                            **quantiles, 'whislo': lower, 'whishi': upper}
+
+            for j, feature in enumerate(numeric):
+                for stat, matrix in scalar_stats.items():
+                    parts.append(pd.DataFrame({
+                        'segment': seg_names, 'feature': feature, 'stat': stat,
+                        'value': matrix[:, j],
+                    }))
+                parts.append(pd.DataFrame({
+                    'segment': np.repeat(seg_names, bins),
+                    'feature': feature,
+                    'stat': 'hist',
+                    'bin_left': np.tile(edges[j, :-1], self.n_segments),
+                    'bin_right': np.tile(edges[j, 1:], self.n_segments),
+                    'value': hist[:, j, :].ravel().astype(float),
+                }))
+
+        if not parts:
+            return pd.DataFrame(columns=PROFILE_COLUMNS)
+        return pd.concat(parts, ignore_index=True).reindex(columns=PROFILE_COLUMNS)
+
+    def _whiskers(self, features, quantiles):
+        values = np.column_stack([self._num_values(f) for f in features])
+        iqr = quantiles['q3'] - quantiles['q1']
+        lo_fence = (quantiles['q1'] - 1.5 * iqr)[self._seg]
+        hi_fence = (quantiles['q3'] + 1.5 * iqr)[self._seg]
+        inside_lo = np.where(values >= lo_fence, values, np.inf)
+        inside_hi = np.where(values <= hi_fence, values, -np.inf)
+
+        shape = (self.n_segments, len(features))
+        lower = np.full(shape, np.inf)
+        upper = np.full(shape, -np.inf)
+        np.minimum.at(lower, self._seg, inside_lo)
+        np.maximum.at(upper, self._seg, inside_hi)
+        return lower, upper
+
+
+# ==================== 由輪廓表繪圖 ====================
+
+def _setup_font():
+    # 子行程不會繼承呼叫端的 rcParams，需各自設定中文字型
+    plt.rcParams['font.sans-serif'] = ['Microsoft JhengHei']
+    plt.rcParams['axes.unicode_minus'] = False
+
+
+def _draw_count(ax, table, feature, segment_label):
+    sns.barplot(data=table, x='segment', y='value', hue='level', palette='viridis', ax=ax)
+    ax.legend(title=feature)
+    ax.set_xlabel(segment_label)
+    ax.set_ylabel('客戶數量')
+
+
+def _draw_hist(ax, table, feature, segment_label):
+    hist = table[table['stat'] == 'hist']
+    edges = np.append(np.sort(hist['bin_left'].unique()), hist['bin_right'].max())
+    sns.histplot(data=hist, x='bin_left', weights='value', hue='segment', bins=edges,
+                 multiple='stack', palette='viridis', ax=ax)
+    ax.get_legend().set_title(segment_label)
+    ax.set_xlabel(feature)
+    ax.set_ylabel('客戶數量')
+
+
+def _draw_box(ax, table, feature, segment_label):
+    scalar = table[table['stat'] != 'hist']
+    stats = scalar.pivot(index='segment', columns='stat', values='value')
+    boxes = [
+        {'label': seg, 'med': row['median'], 'q1': row['q1'], 'q3': row['q3'],
+         'whislo': row['whislo'], 'whishi': row['whishi'], 'fliers': []}
+        for seg, row in stats.iterrows()
+    ]
+    artists = ax.bxp(boxes, showfliers=False, patch_artist=True)
+    for patch, color in zip(artists['boxes'], sns.color_palette('viridis', len(boxes))):
+        patch.set_facecolor(color)
+    ax.set_xlabel(segment_label)
+    ax.set_ylabel(feature)
+
+
+_DRAWERS = {'count': _draw_count, 'hist': _draw_hist, 'box': _draw_box}
+
+
+def _render_one(table, chart, segment_label):
+    _setup_font()
+    fig, ax = plt.subplots(figsize=(10, 6))
+    _DRAWERS[chart['kind']](ax, table, chart['feature'], segment_label)
+    ax.set_title(chart['title'])
+    ax.grid(axis='y', linestyle='--')
+    fig.savefig(chart['path'])
+    plt.close(fig)
+    return chart['path']
+
+
+def render_profile_charts(profile, charts, segment_label, max_workers=None):
+    """
+    依輪廓表平行繪製比較圖，不再回頭讀取原始資料。
+
+    charts 為 dict 列表，需包含 feature、kind ('count' / 'hist' / 'box')、title、path。
+    """
+    jobs = [(profile[profile['feature'] == c['feature']], c, segment_label) for c in charts]
+    if max_workers == 1:
+        return [_render_one(*job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(_render_one, *job) for job in jobs]
+        return [f.result() for f in futures]
+
+
+if __name__ == "__main__":
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    df = pd.read_csv(os.path.join(base_dir, 'customer_clusters.csv'), encoding='utf-8-sig')
+
+    profiler = SegmentProfiler(df, 'Cluster')
+    result = profiler.profile(categorical=['合約類型', '優惠方式'], numeric=['年齡', '每月費用'])
+    print(result.head(20).to_string())
@@ -0,0 +1,204 @@
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from segment_profile import SegmentProfiler
+
+# 結果表欄位
+RESULT_COLUMNS = ['feature', 'segment', 'test', 'statistic', 'dof', 'p_value',
+                  'effect_metric', 'effect_size', 'p_adjusted', 'significant']
+
+
+# ==================== 多重比較校正 ====================
+
+def adjust_pvalues(p, method='fdr_bh'):
+    """對一組 p 值做多重比較校正 (fdr_bh / holm / bonferroni)，NaN 會保留。"""
+    p = np.asarray(p, dtype=float)
+    out = np.full_like(p, np.nan)
+    ok = ~np.isnan(p)
+    pv = p[ok]
+    m = len(pv)
+    if m == 0:
+        return out
+
+    if method == 'bonferroni':
+        adj = pv * m
+    elif method == 'holm':
+        order = np.argsort(pv)
+        scaled = pv[order] * (m - np.arange(m))
+        adj = np.empty(m)
+        adj[order] = np.maximum.accumulate(scaled)
+    elif method == 'fdr_bh':
+        order = np.argsort(pv)[::-1]
+        scaled = pv[order] * m / (m - np.arange(m))
+        adj = np.empty(m)
+        adj[order] = np.minimum.accumulate(scaled)
+    else:
+        raise ValueError(f"不支援的校正方法: {method}")
+
+    out[ok] = np.minimum(adj, 1.0)
+    return out
+
+
+# ==================== 類別特徵：卡方檢定 + Cramér's V ====================
+
+def _padded_tables(tables):
+    """把各特徵的 區段 x 類別 列聯表補零堆疊成 (特徵, 區段, 最大類別數) 陣列。"""
+    n_seg = next(iter(tables.values()))[1].shape[0]
+    width = max(t.shape[1] for _, t in tables.values())
+    stacked = np.zeros((len(tables), n_seg, width))
+    for i, (_, t) in enumerate(tables.values()):
+        stacked[i, :, :t.shape[1]] = t
+    return stacked
+
+
+def _chi2_batch(observed):
+    """
+    對 (..., 列, 欄) 形狀的觀察次數一次計算卡方統計量、自由度與 Cramér's V。
+    全為零的列或欄不列入自由度。
+    """
+    row = observed.sum(axis=-1, keepdims=True)
+    col = observed.sum(axis=-2, keepdims=True)
+    total = observed.sum(axis=(-2, -1), keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        expected = row * col / total
+        chi2 = np.where(expected > 0, (observed - expected) ** 2 / expected, 0).sum(axis=(-2, -1))
+
+    n_rows = (row[..., 0] > 0).sum(axis=-1)
+    n_cols = (col[..., 0, :] > 0).sum(axis=-1)
+    dof = (n_rows - 1) * (n_cols - 1)
+    k = np.minimum(n_rows, n_cols) - 1
+    n = total[..., 0, 0]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cramers_v = np.sqrt(chi2 / (n * k))
+        p = np.where(dof > 0, stats.chi2.sf(chi2, np.maximum(dof, 1)), np.nan)
+    return chi2, dof, p, cramers_v
+
+
+def categorical_tests(tables, segments, comparisons):
+    """對所有類別特徵做「區段 vs 其他」的卡方檢定；區段超過兩個時另做整體檢定。"""
+    features = list(tables.keys())
+    counts = _padded_tables(tables)                       # (F, S, L)
+    total = counts.sum(axis=1, keepdims=True)             # (F, 1, L)
+
+    seg_idx = [segments.index(s) for s in comparisons]
+    inside = counts[:, seg_idx, :]                        # (F, C, L)
+    observed = np.stack([inside, total - inside], axis=2)  # (F, C, 2, L)
+    chi2, dof, p, v = _chi2_batch(observed)
+
+    frames = [pd.DataFrame({
+        'feature': np.repeat(features, len(comparisons)),
+        'segment': np.tile(np.array(comparisons, dtype=object), len(features)),
+        'test': 'chi2',
+        'statistic': chi2.ravel(), 'dof': dof.ravel().astype(float), 'p_value': p.ravel(),
+        'effect_metric': 'cramers_v', 'effect_size': v.ravel(),
+    })]
+
+    if len(segments) > 2:
+        chi2, dof, p, v = _chi2_batch(counts)
+        frames.append(pd.DataFrame({
+            'feature': features, 'segment': '全部', 'test': 'chi2',
+            'statistic': chi2, 'dof': dof.astype(float), 'p_value': p,
+            'effect_metric': 'cramers_v', 'effect_size': v,
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+# ==================== 數值特徵：Welch t 與 Mann-Whitney U ====================
+
+def _rest_moments(n, mean, var):
+    """由各區段動差推得「其餘區段」合併後的 n、平均數與變異數。"""
+    s1 = n * mean
+    s2 = var * (n - 1) + n * mean ** 2
+    n_rest = n.sum(axis=0) - n
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_rest = (s1.sum(axis=0) - s1) / n_rest
+        var_rest = ((s2.sum(axis=0) - s2) - n_rest * mean_rest ** 2) / (n_rest - 1)
+    return n_rest, mean_rest, np.clip(var_rest, 0, None)
+
+
+def numeric_tests(features, segments, comparisons, moments, rank_sums, ties):
+    """以預先彙總的動差與秩和，一次計算所有數值特徵的 Welch t 與 Mann-Whitney U 檢定。"""
+    n, mean, var = moments
+    n_rest, mean_rest, var_rest = _rest_moments(n, mean, var)
+    seg_idx = [segments.index(s) for s in comparisons]
+    n1, m1, v1 = n[seg_idx], mean[seg_idx], var[seg_idx]
+    n2, m2, v2 = n_rest[seg_idx], mean_rest[seg_idx], var_rest[seg_idx]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Welch t 檢定與 Cohen's d
+        se1, se2 = v1 / n1, v2 / n2
+        t = (m1 - m2) / np.sqrt(se1 + se2)
+        t_dof = (se1 + se2) ** 2 / (se1 ** 2 / (n1 - 1) + se2 ** 2 / (n2 - 1))
+        t_p = 2 * stats.t.sf(np.abs(t), t_dof)
+        pooled = np.sqrt(((n1 - 1) * v1 + (n2 - 1) * v2) / (n1 + n2 - 2))
+        cohens_d = (m1 - m2) / pooled
+
+        # Mann-Whitney U (常態近似，含同秩與連續性校正) 與 rank-biserial 相關
+        big_n = n1 + n2
+        u = rank_sums[seg_idx] - n1 * (n1 + 1) / 2
+        mu = n1 * n2 / 2
+        sigma = np.sqrt(n1 * n2 / 12 * ((big_n + 1) - ties / (big_n * (big_n - 1))))
+        z = (np.abs(u - mu) - 0.5) / sigma
+        u_p = np.clip(2 * stats.norm.sf(z), 0, 1)
+        rank_biserial = 2 * u / (n1 * n2) - 1
+
+    def frame(test, statistic, dof, p, metric, effect):
+        return pd.DataFrame({
+            'feature': np.tile(np.array(features, dtype=object), len(comparisons)),
+            'segment': np.repeat(np.array(comparisons, dtype=object), len(features)),
+            'test': test, 'statistic': statistic.ravel(), 'dof': np.asarray(dof, dtype=float).ravel(),
+            'p_value': p.ravel(), 'effect_metric': metric, 'effect_size': effect.ravel(),
+        })
+
+    return pd.concat([
+        frame('welch_t', t, t_dof, t_p, 'cohens_d', cohens_d),
+        frame('mann_whitney', u, np.full_like(u, np.nan), u_p, 'rank_biserial', rank_biserial),
+    ], ignore_index=True)
+
+
+# ==================== 整合入口 ====================
+
+def run_segment_tests(df, segment_col, categorical=(), numeric=(), alpha=0.05,
+                      correction='fdr_bh', profiler=None):
+    """
+    對所有 特徵 x 區段 組合做顯著性檢定，並做多重比較校正後依顯著程度排序。
+
+    區段只有兩個時只比較一次 (A vs B)，多於兩個時每個區段各自與其餘區段比較。
+    可傳入既有的 SegmentProfiler 以重複使用已編碼的欄位。
+    """
+    profiler = profiler or SegmentProfiler(df, segment_col)
+    segments = profiler.segments
+    comparisons = segments if len(segments) > 2 else segments[:1]
+    categorical, numeric = list(categorical), list(numeric)
+
+    frames = []
+    if categorical:
+        frames.append(categorical_tests(profiler.contingency_tables(categorical), segments, comparisons))
+    if numeric:
+        moments = profiler.numeric_moments(numeric)
+        rank_sums, ties = profiler.rank_sums(numeric)
+        frames.append(numeric_tests(numeric, segments, comparisons, moments, rank_sums, ties))
+    if not frames:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+
+    results = pd.concat(frames, ignore_index=True)
+    results['p_adjusted'] = adjust_pvalues(results['p_value'].to_numpy(), method=correction)
+    results['significant'] = results['p_adjusted'] < alpha
+    results['_abs_effect'] = results['effect_size'].abs()
+    results = results.sort_values(['p_adjusted', '_abs_effect'], ascending=[True, False])
+    return results.drop(columns='_abs_effect').reset_index(drop=True).reindex(columns=RESULT_COLUMNS)
+
+
+if __name__ == "__main__":
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    df = pd.read_csv(os.path.join(base_dir, 'customer_clusters.csv'), encoding='utf-8-sig')
+
+    results = run_segment_tests(
+        df, '區域',
+        categorical=['性別', '婚姻', '優惠方式', '網路連線類型', '合約類型', '支付帳單方式'],
+        numeric=['年齡', '每月費用', '總收入'],
+    )
+    print(results.to_string())
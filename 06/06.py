@@ -1,8 +1,18 @@
+import os
+import sys
+from itertools import combinations
 import pandas as pd
-from mlxtend.frequent_patterns import apriori, association_rules
 import warnings
 warnings.filterwarnings('ignore')
 
+# 共用的分群分析模組放在 05/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '05'))
+from segment_tests import run_segment_tests
+from itemset_lattice import ItemsetLattice
+from rule_store import RuleStore
+from rule_index import RuleIndex
+from service_cooccurrence import ServiceCooccurrence
+
 # 載入資料
 try:
     df = pd.read_csv('../cleaned_customer_data.csv', encoding='utf-8-sig')
@@ -55,25 +65,28 @@ all_rules = {}
 min_support = 0.35
 min_confidence = 0.7
 min_lift = 1.2
+# 頻繁項目集格以較低的支持度探勘一次，步驟 6 的門檻掃描直接由格推得規則
+lattice_min_support = 0.2
+
+# 建立一次二元編碼，並以分層探勘一次建立所有年齡群組的頻繁項目集格
+binary_data = create_binary_data(df)
+lattices = ItemsetLattice.build_stratified(binary_data, df['年齡群組'], min_support=lattice_min_support)
 
 for age_group in age_groups:
     print(f"\n分析【{age_group}年齡群組】...")
     
-    # 篩選該年齡群組的資料
-    group_data = df[df['年齡群組'] == age_group]
-    print(f"  樣本數: {len(group_data)}")
-    
-    # 建立二元編碼
-    binary_data = create_binary_data(group_data)
+    # 該年齡群組的樣本數
+    print(f"  樣本數: {(df['年齡群組'] == age_group).sum()}")
     
-    # 使用 Apriori 演算法找出頻繁項目集
     try:
-        frequent_itemsets = apriori(binary_data, min_support=min_support, use_colnames=True)
+        lattice = lattices[age_group]
+        lattice.save(f'age_group_{age_group}_lattice.npz')
+        frequent_itemsets = lattice.frequent_itemsets(min_support)
         print(f"  找到 {len(frequent_itemsets)} 個頻繁項目集")
         
-        # 產生關聯規則
+        # 由頻繁項目集格產生關聯規則
         if len(frequent_itemsets) > 0:
-            rules = association_rules(frequent_itemsets, metric="confidence", min_threshold=min_confidence)
+            rules = lattice.rules(min_support=min_support, min_confidence=min_confidence)
             
             # 篩選 lift > 1.2 的規則
             rules = rules[rules['lift'] > min_lift]
@@ -102,10 +115,12 @@ print("\n步驟 4: 儲存各年齡群組的關聯規則...")
 
 for age_group in age_groups:
     if len(all_rules[age_group]) > 0:
-        # 格式化規則輸出
-        rules_output = all_rules[age_group].copy()
-        rules_output['antecedents'] = rules_output['antecedents'].apply(lambda x: ', '.join(list(x)))
-        rules_output['consequents'] = rules_output['consequents'].apply(lambda x: ', '.join(list(x)))
+        # 以二進位規則檔保存完整規則，供後續程式直接載入
+        store = RuleStore.from_rules(all_rules[age_group], items=service_columns)
+        store.save(f'age_group_{age_group}_rules.npz')
+
+        # 格式化規則輸出 (可讀版本)
+        rules_output = store.to_frame(itemsets='text')
         
         # 選擇重要欄位並重新命名
         output_cols = rules_output[['antecedents', 'consequents', 'support', 'confidence', 'lift']]
@@ -114,62 +129,46 @@ for age_group in age_groups:
         # 儲存為 CSV
         filename = f'age_group_{age_group}_rules.csv'
         output_cols.to_csv(filename, index=False, encoding='utf-8-sig')
-        print(f"✓ 已儲存【{age_group}年齡群組】規則至 {filename}")
+        print(f"✓ 已儲存【{age_group}年齡群組】規則至 {filename} 與 age_group_{age_group}_rules.npz")
 
 print("\n" + "="*60)
 
 # --- 5. 找出相同與相異的規則 ---
 print("\n步驟 5: 分析各群組規則的相同與相異之處...")
 
-# 建立規則的文字表示以便比較
-def rule_to_string(antecedents, consequents):
-    ant = ', '.join(sorted(list(antecedents)))
-    con = ', '.join(sorted(list(consequents)))
-    return f"{ant} → {con}"
+# 以標準化規則雜湊建立跨群組索引，任意數量的群組都以陣列運算比較
+rule_index = RuleIndex.from_frames(all_rules, items=service_columns)
 
-# 為每個群組建立規則集合
-rule_sets = {}
-for age_group in age_groups:
-    if len(all_rules[age_group]) > 0:
-        rules_list = []
-        for _, row in all_rules[age_group].iterrows():
-            rule_str = rule_to_string(row['antecedents'], row['consequents'])
-            rules_list.append(rule_str)
-        rule_sets[age_group] = set(rules_list)
-    else:
-        rule_sets[age_group] = set()
-
-# 找出共同規則（三個群組都有的）
-if all(len(rule_sets[group]) > 0 for group in age_groups):
-    common_rules = rule_sets['青'] & rule_sets['中'] & rule_sets['老']
-else:
-    common_rules = set()
-
-print(f"\n【共同規則】(三個年齡群組都有的規則): {len(common_rules)} 條")
-for rule in sorted(common_rules):
+# 找出共同規則（所有群組都有的）
+common_mask = rule_index.common()
+print(f"\n【共同規則】(所有年齡群組都有的規則): {int(common_mask.sum())} 條")
+for rule in rule_index.to_frame(common_mask)['rule']:
     print(f"  • {rule}")
 
 # 找出各群組獨有的規則
 print("\n【獨有規則】")
 for age_group in age_groups:
-    unique_rules = rule_sets[age_group]
-    for other_group in age_groups:
-        if other_group != age_group:
-            unique_rules = unique_rules - rule_sets[other_group]
-    
-    print(f"\n【{age_group}年齡群組】獨有規則: {len(unique_rules)} 條")
-    for rule in sorted(unique_rules):
+    unique_mask = rule_index.unique_to(age_group)
+    print(f"\n【{age_group}年齡群組】獨有規則: {int(unique_mask.sum())} 條")
+    for rule in rule_index.to_frame(unique_mask)['rule']:
         print(f"  • {rule}")
 
 # 找出兩兩共同的規則
 print("\n【兩兩共同規則】")
-pairs = [('青', '中'), ('青', '老'), ('中', '老')]
-for group1, group2 in pairs:
-    shared_rules = (rule_sets[group1] & rule_sets[group2]) - common_rules
-    print(f"\n【{group1}】與【{group2}】共同但其他群組沒有的規則: {len(shared_rules)} 條")
-    for rule in sorted(shared_rules):
+for group1, group2 in combinations(age_groups, 2):
+    shared_mask = rule_index.common([group1, group2]) & ~common_mask
+    print(f"\n【{group1}】與【{group2}】共同但其他群組沒有的規則: {int(shared_mask.sum())} 條")
+    for rule in rule_index.to_frame(shared_mask)['rule']:
         print(f"  • {rule}")
 
+# 兩兩群組共有規則的提升度差異
+print("\n【提升度差異】(兩群組都有的規則，依差異大小排序)")
+for group1, group2 in combinations(age_groups, 2):
+    delta = rule_index.metric_delta(group1, group2, metric='lift')
+    if len(delta) > 0:
+        print(f"\n【{group1}】→【{group2}】")
+        print(delta[['rule', f'lift_{group1}', f'lift_{group2}', 'lift_delta']].head(5).to_string(index=False))
+
 print("\n" + "="*60)
 print("分析完成！")
 
@@ -206,6 +205,45 @@ print("✓ 已儲存摘要統計至 age_group_rules_summary.csv")
 print("\n摘要統計:")
 print(summary_df.to_string(index=False))
 
+# 門檻掃描：所有支持度 / 信賴度 / 提升度組合都由快取的格推得，不重新探勘
+sweep = pd.concat([
+    lattices[age_group].sweep(supports=[0.2, 0.25, 0.3, 0.35, 0.4],
+                              confidences=[0.5, 0.6, 0.7, 0.8, 0.9],
+                              lifts=[1.0, 1.1, 1.2, 1.5]).assign(年齡群組=age_group)
+    for age_group in age_groups
+], ignore_index=True)
+sweep = sweep[['年齡群組'] + [c for c in sweep.columns if c != '年齡群組']]
+sweep.to_csv('age_group_threshold_sweep.csv', index=False, encoding='utf-8-sig')
+print(f"✓ 已儲存 {len(sweep)} 組門檻的掃描結果至 age_group_threshold_sweep.csv")
+
+print("\n" + "="*60)
+
+# --- 7. 各年齡群組特徵差異的顯著性檢定 ---
+print("\n步驟 7: 檢定各年齡群組的服務使用與費用差異...")
+
+test_results = run_segment_tests(
+    df, '年齡群組',
+    categorical=service_columns + ['合約類型', '優惠方式', '網路連線類型'],
+    numeric=['每月費用', '總收入', '加入期間 (月)']
+)
+test_results.to_csv('age_group_feature_tests.csv', index=False, encoding='utf-8-sig')
+print(f"✓ 已儲存檢定結果至 age_group_feature_tests.csv (顯著差異 {int(test_results['significant'].sum())} / {len(test_results)} 項)")
+print("\n差異最顯著的前 10 項:")
+print(test_results.head(10).to_string(index=False))
+
+print("\n" + "="*60)
+
+# --- 8. 服務兩兩共現矩陣 ---
+print("\n步驟 8: 計算各年齡群組的服務共現矩陣 (提升度、Jaccard、條件機率)...")
+
+# 共現計數可增量更新，新顧客只需 cooccurrence.update(...) 後重新儲存
+cooccurrence = ServiceCooccurrence.from_frame(df, '年齡群組', services=service_columns)
+cooccurrence.save('age_group_cooccurrence.npz')
+print("✓ 已儲存共現矩陣至 age_group_cooccurrence.npz")
+for age_group in age_groups:
+    print(f"\n【{age_group}年齡群組】提升度最高的服務對 (支持度 ≥ 0.1):")
+    print(cooccurrence.top_pairs(age_group, min_support=0.1, n=5).round(3).to_string(index=False))
+
 print("\n" + "="*60)
 print("所有分析完成！")
 
@@ -0,0 +1,137 @@
+import os
+import sys
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '05'))
+from rule_store import RuleStore, itemset_hashes, splitmix64
+
+_CONSEQUENT_SALT = np.uint64(0xD6E8FEB86659FD93)
+
+
+def rule_hashes(store):
+    """回傳 RuleStore 中每條規則 (前項, 後項) 的標準化 64 位元雜湊。"""
+    ant = itemset_hashes(store.ant_offsets, store.ant_ids)
+    con = itemset_hashes(store.con_offsets, store.con_ids)
+    return splitmix64(ant ^ splitmix64(con ^ _CONSEQUENT_SALT))
+
+
+class RuleIndex:
+    """
+    跨區段的規則索引：每條規則以標準化雜湊識別，並保存各區段的指標向量。
+
+    「所有區段共同的規則」、「某區段獨有的規則」、「兩區段的提升度差異」等查詢
+    皆以布林矩陣與陣列運算完成，適用任意數量的區段。
+    """
+
+    def __init__(self, items, segments, hashes, ant, con, metrics):
+        self.items = np.asarray(items, dtype=str)
+        self.segments = list(segments)
+        self.hashes = hashes          # (規則數,) 已排序的規則雜湊
+        self.ant = ant                # 每條規則的前項 ID 陣列
+        self.con = con                # 每條規則的後項 ID 陣列
+        self.metrics = metrics        # {指標: (規則數, 區段數) 矩陣，缺少者為 NaN}
+        self.present = ~np.isnan(next(iter(metrics.values())))  # (規則數, 區段數) 是否出現
+
+    @classmethod
+    def from_frames(cls, rules_by_segment, items=None, metrics=('support', 'confidence', 'lift')):
+        """由 {區段: mlxtend 規則表} 建立；items 為共用的項目字典。"""
+        frames = {s: r for s, r in rules_by_segment.items() if len(r) > 0}
+        if items is None:
+            items = sorted(set().union(*(set().union(*r['antecedents'], *r['consequents'])
+                                         for r in frames.values())))
+        stores = {s: RuleStore.from_rules(r, items=items) for s, r in frames.items()}
+        return cls.from_stores(stores, items, segments=list(rules_by_segment), metrics=metrics)
+
+    @classmethod
+    def from_stores(cls, stores, items, segments=None, metrics=('support', 'confidence', 'lift')):
+        """由 {區段: RuleStore} 建立 (各 RuleStore 需使用同一份項目字典)。"""
+        segments = list(segments) if segments is not None else list(stores)
+        seg_pos = {s: i for i, s in enumerate(segments)}
+
+        hashes = [rule_hashes(st) for st in stores.values()]
+        all_hashes = np.concatenate(hashes) if hashes else np.zeros(0, dtype=np.uint64)
+        seg_of_row = np.concatenate([np.full(len(h), seg_pos[s]) for s, h in zip(stores, hashes)]) \
+            if hashes else np.zeros(0, dtype=int)
+        unique, first, inverse = np.unique(all_hashes, return_index=True, return_inverse=True)
+
+        # 以每條規則第一次出現的位置取回前項/後項 ID
+        ant, con = [], []
+        row_store = [(st, i) for st in stores.values() for i in range(len(st))]
+        for f in first:
+            st, i = row_store[f]
+            ant.append(st.antecedent_ids(i))
+            con.append(st.consequent_ids(i))
+
+        matrices = {}
+        for m in metrics:
+            mat = np.full((len(unique), len(segments)), np.nan)
+            values = np.concatenate([st.metrics[m] for st in stores.values()]) if stores else np.zeros(0)
+            mat[inverse, seg_of_row] = values
+            matrices[m] = mat
+        return cls(items, segments, unique, ant, con, matrices)
+
+    # ---------- 查詢 ----------
+    def _cols(self, segments):
+        return [self.segments.index(s) for s in segments]
+
+    def common(self, segments=None):
+        """所有指定區段 (預設為全部) 都有的規則。"""
+        cols = self._cols(segments or self.segments)
+        return self.present[:, cols].all(axis=1)
+
+    def unique_to(self, segment):
+        """只出現在指定區段的規則。"""
+        col = self.segments.index(segment)
+        return self.present[:, col] & (self.present.sum(axis=1) == 1)
+
+    def exactly_in(self, segments):
+        """恰好出現在指定區段組合 (其他區段都沒有) 的規則。"""
+        mask = np.zeros(len(self.segments), dtype=bool)
+        mask[self._cols(segments)] = True
+        return (self.present == mask[None, :]).all(axis=1)
+
+    def metric_delta(self, seg_a, seg_b, metric='lift'):
+        """兩區段都有的規則，回傳 metric(b) - metric(a) 的規則表 (依差異絕對值排序)。"""
+        a, b = self._cols([seg_a, seg_b])
+        mat = self.metrics[metric]
+        both = self.present[:, a] & self.present[:, b]
+        table = self.to_frame(both)
+        table[f'{metric}_{seg_a}'] = mat[both, a]
+        table[f'{metric}_{seg_b}'] = mat[both, b]
+        table[f'{metric}_delta'] = mat[both, b] - mat[both, a]
+        return table.reindex(table[f'{metric}_delta'].abs().sort_values(ascending=False).index)
+
+    def rule_text(self, i, sep=', '):
+        ant = sep.join(sorted(self.items[self.ant[i]]))
+        con = sep.join(sorted(self.items[self.con[i]]))
+        return f"{ant} → {con}"
+
+    def to_frame(self, mask=None):
+        """把符合 mask 的規則轉成含 rule_hash、規則文字與各區段指標的表格。"""
+        rows = np.flatnonzero(mask) if mask is not None else np.arange(len(self.hashes))
+        table = pd.DataFrame({
+            'rule_hash': self.hashes[rows],
+            'rule': [self.rule_text(i) for i in rows],
+        }, index=rows)
+        for m, mat in self.metrics.items():
+            for j, seg in enumerate(self.segments):
+                table[f'{m}_{seg}'] = mat[rows, j]
+        return table.sort_values('rule')
+
+    def compare(self):
+        """
+        回傳所有區段組合的規則分布摘要：共同規則、各區段獨有、以及每一對區段
+        共有但其他區段沒有的規則數。
+        """
+        summary = [{'類別': '共同規則', '區段': '、'.join(map(str, self.segments)),
+                    '規則數': int(self.common().sum())}]
+        for s in self.segments:
+            summary.append({'類別': '獨有規則', '區段': s, '規則數': int(self.unique_to(s).sum())})
+        for pair in combinations(self.segments, 2):
+            if len(self.segments) > 2:
+                count = int((self.common(list(pair)) & ~self.common()).sum())
+                summary.append({'類別': '兩兩共同規則', '區段': '、'.join(map(str, pair)), '規則數': count})
+        return pd.DataFrame(summary)
@@ -0,0 +1,182 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '05'))
+from itemset_lattice import ItemsetLattice
+from itemset_miner import pack_columns, popcount, segment_masks
+from service_recommender import SERVICE_COLUMNS, age_group_of
+
+# 由共現矩陣推得的兩兩服務指標
+METRICS = ['count', 'support', 'confidence', 'lift', 'jaccard']
+ALL = '全部'
+
+
+class ServiceCooccurrence:
+    """
+    各區段的服務共現矩陣 XᵀX。
+
+    counts[s, i, j] 為區段 s 中同時持有服務 i 與 j 的顧客數 (對角線為各服務的持有數)，
+    以 packed uint64 位元集合的 AND 與 popcount 計算，不需展開顧客 × 服務的密集矩陣。
+    支持度、信賴度 P(j|i)、提升度與 Jaccard 係數都由計數導出並快取；新增顧客時只把
+    新顧客的 XᵀX 加到所屬區段 (rank-k 更新)，並讓快取失效。
+    """
+
+    def __init__(self, services, segments, counts, sizes):
+        self.services = list(services)
+        self.segments = list(segments)
+        self.counts = np.asarray(counts, dtype=np.int64)   # (區段數, 服務數, 服務數)
+        self.sizes = np.asarray(sizes, dtype=np.int64)     # 各區段顧客數
+        self._cache = {}
+
+    # ---------- 建立 ----------
+    @classmethod
+    def from_holdings(cls, holdings, segments, services=SERVICE_COLUMNS):
+        """holdings 為 (顧客數, 服務數) 的布林矩陣，segments 為每位顧客的區段 (Series)。"""
+        keys, masks = segment_masks(pd.Series(np.asarray(segments)))
+        bits = pack_columns(holdings)                                # (服務數, 字組數)
+        pairs = bits[:, None, :] & bits[None, :, :]                  # 兩兩服務同時持有的顧客
+        counts = np.stack([popcount(pairs & mask) for mask in masks])
+        return cls(services, keys, counts, popcount(masks))
+
+    @classmethod
+    def from_frame(cls, df, segment_col=None, services=SERVICE_COLUMNS):
+        """由顧客資料建立；segment_col 為 None 時依 06.py 的年齡群組分段。"""
+        segments = age_group_of(df['年齡']) if segment_col is None else df[segment_col].to_numpy()
+        holdings = np.stack([(df[s] == 'Yes').to_numpy() for s in services], axis=1)
+        return cls.from_holdings(holdings, segments, services)
+
+    # ---------- 增量更新 ----------
+    def update(self, holdings, segments):
+        """
+        加入新顧客：各區段加上新顧客的 XᵀX (k 位顧客即 rank-k 更新)，成本與既有顧客數無關。
+        新出現的區段會附加在最後。
+        """
+        x = np.asarray(holdings, dtype=np.int64)
+        segments = np.asarray(segments)
+        for key in pd.unique(segments):
+            if key not in self.segments:
+                self.segments.append(key)
+                self.counts = np.concatenate([self.counts, np.zeros((1,) + self.counts.shape[1:], dtype=np.int64)])
+                self.sizes = np.append(self.sizes, 0)
+            s = self.segments.index(key)
+            rows = x[segments == key]
+            self.counts[s] += rows.T @ rows
+            self.sizes[s] += len(rows)
+        self._cache.clear()
+        return self
+
+    def merge(self, other):
+        """合併另一個共現矩陣 (服務需相同)，回傳新的物件。"""
+        if other.services != self.services:
+            raise ValueError("合併的共現矩陣服務不一致")
+        segments = self.segments + [s for s in other.segments if s not in self.segments]
+        counts = np.zeros((len(segments),) + self.counts.shape[1:], dtype=np.int64)
+        sizes = np.zeros(len(segments), dtype=np.int64)
+        for source in (self, other):
+            idx = [segments.index(s) for s in source.segments]
+            counts[idx] += source.counts
+            sizes[idx] += source.sizes
+        return ServiceCooccurrence(self.services, segments, counts, sizes)
+
+    # ---------- 指標 ----------
+    def _segment(self, segment):
+        """回傳區段的 (共現計數, 顧客數)；segment 為 None 或 ALL 時為全部顧客。"""
+        if segment is None or segment == ALL:
+            return self.counts.sum(axis=0), self.sizes.sum()
+        if segment not in self.segments:
+            raise KeyError(f"找不到區段 {segment}")
+        s = self.segments.index(segment)
+        return self.counts[s], self.sizes[s]
+
+    def metric(self, name, segment=None):
+        """
+        兩兩服務指標矩陣 (第 i 列第 j 欄)：count、support = C_ij / n、
+        confidence = P(j | i) = C_ij / C_ii、lift = C_ij · n / (C_ii · C_jj)、
+        jaccard = C_ij / (C_ii + C_jj − C_ij)。分母為 0 時為 NaN。
+        """
+        if name not in METRICS:
+            raise ValueError(f"未知的指標 {name}，可用: {METRICS}")
+        key = (name, ALL if segment is None else segment)
+        if key not in self._cache:
+            c, n = self._segment(segment)
+            c = c.astype(float)
+            diag = np.diag(c)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                value = {
+                    'count': lambda: c,
+                    'support': lambda: c / n,
+                    'confidence': lambda: c / diag[:, None],
+                    'lift': lambda: c * n / (diag[:, None] * diag[None, :]),
+                    'jaccard': lambda: c / (diag[:, None] + diag[None, :] - c),
+                }[name]()
+            self._cache[key] = np.where(np.isfinite(value), value, np.nan)
+        return self._cache[key]
+
+    def table(self, name, segment=None):
+        return pd.DataFrame(self.metric(name, segment), index=self.services, columns=self.services)
+
+    def top_pairs(self, segment=None, by='lift', n=10, min_support=0.0):
+        """依指標排序的服務對 (i → j，不含 i = j)，附上其他指標。"""
+        m = len(self.services)
+        i, j = np.nonzero(~np.eye(m, dtype=bool))
+        table = pd.DataFrame({'前項': np.array(self.services)[i], '後項': np.array(self.services)[j]})
+        for name in METRICS:
+            table[name] = self.metric(name, segment)[i, j]
+        table['count'] = table['count'].astype(np.int64)
+        table = table[table['support'] >= min_support]
+        return table.sort_values(by, ascending=False).head(n).reset_index(drop=True)
+
+    # ---------- 讀寫 ----------
+    def save(self, path):
+        np.savez(path, services=np.array(self.services, dtype=str), segments=np.array(self.segments, dtype=str),
+                 counts=self.counts, sizes=self.sizes)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['services'].tolist(), data['segments'].tolist(), data['counts'], data['sizes'])
+
+
+if __name__ == "__main__":
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    customer_df = pd.read_csv(os.path.join(base_dir, '..', 'cleaned_customer_data.csv'), encoding='utf-8-sig')
+    holdings = np.stack([(customer_df[s] == 'Yes').to_numpy() for s in SERVICE_COLUMNS], axis=1)
+    segments = age_group_of(customer_df['年齡'])
+
+    start = time.perf_counter()
+    cooc = ServiceCooccurrence.from_holdings(holdings, segments)
+    print(f"位元集合計算 {len(cooc.segments)} 個區段的共現矩陣: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    # 與密集矩陣的 XᵀX 比對
+    x = holdings.astype(np.int64)
+    dense_ok = all(np.array_equal(cooc.counts[s], x[segments == g].T @ x[segments == g])
+                   for s, g in enumerate(cooc.segments))
+    print(f"與密集 XᵀX 一致: {dense_ok}")
+
+    # 先以前 80% 顧客建立，再以每批 500 位的 rank-k 更新加入其餘顧客
+    split = int(len(customer_df) * 0.8)
+    incremental = ServiceCooccurrence.from_holdings(holdings[:split], segments[:split])
+    start = time.perf_counter()
+    for s in range(split, len(customer_df), 500):
+        incremental.update(holdings[s:s + 500], segments[s:s + 500])
+    print(f"增量加入 {len(customer_df) - split} 位顧客: {(time.perf_counter() - start) * 1000:.1f} ms, "
+          f"與重新計算一致: {np.array_equal(incremental.counts, cooc.counts)}")
+
+    # 與頻繁項目集格的兩項規則提升度比對
+    lattice = ItemsetLattice.load(os.path.join(base_dir, 'age_group_中_lattice.npz'))
+    rules = lattice.rules(min_support=0.2, min_confidence=0.0)
+    pairs = rules[(rules['antecedents'].apply(len) == 1) & (rules['consequents'].apply(len) == 1)]
+    lift = cooc.metric('lift', '中')
+    idx = {s: j for j, s in enumerate(cooc.services)}
+    diff = max(abs(lift[idx[next(iter(a))], idx[next(iter(c))]] - l)
+               for a, c, l in zip(pairs['antecedents'], pairs['consequents'], pairs['lift']))
+    print(f"與【中】年齡群組 {len(pairs)} 條兩項規則的提升度最大差異: {diff:.2e}")
+
+    pd.options.display.float_format = '{:.3f}'.format
+    for segment in [None] + cooc.segments:
+        print(f"\n【{segment or ALL}】提升度最高的服務對 (支持度 ≥ 0.1):")
+        print(cooc.top_pairs(segment, min_support=0.1, n=5).to_string(index=False))
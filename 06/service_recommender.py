@@ -0,0 +1,240 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '05'))
+from rule_store import RuleStore
+from cluster_service import ClusterModel
+
+# 可推薦的服務欄位 (與 06.py 相同)，第 j 個服務對應位元 1 << j
+SERVICE_COLUMNS = [
+    '電話服務', '多線路服務', '網路服務',
+    '線上安全服務', '線上備份服務', '設備保護計劃',
+    '技術支援計劃', '電視節目', '電影節目', '音樂節目',
+    '無限資料下載', '無紙化計費'
+]
+AGE_GROUPS = ['青', '中', '老']
+
+# 規則不限定區段時的代碼
+ANY = -1
+
+
+def age_group_of(ages):
+    """與 06.py 相同的年齡分群 (<=40 青、<=65 中、其餘老)。"""
+    ages = np.asarray(ages)
+    return np.select([ages <= 40, ages <= 65], ['青', '中'], '老')
+
+
+def service_masks(df, services=SERVICE_COLUMNS):
+    """把顧客資料的服務欄位 ('Yes'/'No') 編碼成每位顧客一個 uint64 位元遮罩。"""
+    masks = np.zeros(len(df), dtype=np.uint64)
+    for j, col in enumerate(services):
+        masks |= (df[col].to_numpy() == 'Yes').astype(np.uint64) << np.uint64(j)
+    return masks
+
+
+class ServiceRecommender:
+    """
+    以關聯規則即時推薦顧客尚未擁有的服務。
+
+    每條規則的前項與後項都以服務位元遮罩表示；倒排索引把規則掛在其前項中最少見的
+    服務底下，查詢時只取出顧客已擁有服務的規則清單，再以 (前項 & ~持有) == 0 的位元
+    子集檢查確認，候選規則不會重複。推薦分數為信賴度 × 提升度，同一服務取最高分。
+    """
+
+    def __init__(self, services, ant, con, confidence, lift, age_group, region,
+                 age_groups=AGE_GROUPS, regions=()):
+        self.services = list(services)
+        self.ant = np.asarray(ant, dtype=np.uint64)              # 前項位元遮罩
+        self.con = np.asarray(con, dtype=np.uint64)              # 後項位元遮罩
+        self.confidence = np.asarray(confidence, dtype=float)
+        self.lift = np.asarray(lift, dtype=float)
+        self.score = self.confidence * self.lift
+        self.age_group = np.asarray(age_group, dtype=np.int64)   # 年齡群組代碼，ANY 為不限
+        self.region = np.asarray(region, dtype=np.int64)         # 區域代碼，ANY 為不限
+        self.age_groups = list(age_groups)
+        self.regions = list(regions)
+        self._build_index()
+
+    def __len__(self):
+        return len(self.ant)
+
+    # ---------- 建立 ----------
+    @classmethod
+    def from_stores(cls, sources, services=SERVICE_COLUMNS, age_groups=AGE_GROUPS):
+        """
+        由 [(RuleStore, 年齡群組或 None, 區域或 None), ...] 建立。
+        項目名稱可為服務名稱 (06.py) 或 one-hot 的「服務_Yes」(05_b.py)；
+        含有其他項目 (例如 '_No' 或人口特徵) 的規則無法以持有服務判斷，會被略過。
+        """
+        bit = {s: np.uint64(1) << np.uint64(j) for j, s in enumerate(services)}
+        bit.update({f'{s}_Yes': b for s, b in list(bit.items())})
+        regions = sorted({r for _, _, r in sources if r is not None})
+
+        columns = {k: [] for k in ['ant', 'con', 'confidence', 'lift', 'age_group', 'region']}
+        for store, age_group, region in sources:
+            for i in range(len(store)):
+                ant_items = store.items[store.antecedent_ids(i)]
+                con_items = store.items[store.consequent_ids(i)]
+                if not all(x in bit for x in ant_items) or not all(x in bit for x in con_items):
+                    continue
+                columns['ant'].append(np.bitwise_or.reduce([bit[x] for x in ant_items]))
+                columns['con'].append(np.bitwise_or.reduce([bit[x] for x in con_items]))
+                columns['confidence'].append(store.metrics['confidence'][i])
+                columns['lift'].append(store.metrics['lift'][i])
+                columns['age_group'].append(ANY if age_group is None else age_groups.index(age_group))
+                columns['region'].append(ANY if region is None else regions.index(region))
+        return cls(services, age_groups=age_groups, regions=regions, **columns)
+
+    def _build_index(self):
+        n_items = len(self.services)
+        item_bits = (self.ant[:, None] >> np.arange(n_items, dtype=np.uint64)) & np.uint64(1)
+        item_bits = item_bits.astype(bool)
+        # 以前項中最少見的服務作為索引鍵，縮短每個服務的規則清單
+        frequency = item_bits.sum(axis=0)
+        pivot = np.where(item_bits, frequency[None, :], np.iinfo(np.int64).max).argmin(axis=1)
+        order = np.argsort(pivot, kind='stable')
+        bounds = np.searchsorted(pivot[order], np.arange(n_items + 1))
+        self.postings = [order[bounds[j]:bounds[j + 1]] for j in range(n_items)]
+
+    # ---------- 查詢 ----------
+    def encode(self, held):
+        """把服務名稱清單轉成位元遮罩 (已是整數時直接回傳)。"""
+        if isinstance(held, (int, np.integer)):
+            return np.uint64(held)
+        mask = 0
+        for s in held:
+            mask |= 1 << self.services.index(s)
+        return np.uint64(mask)
+
+    def _segment_code(self, values, value):
+        if value is None:
+            return ANY
+        return values.index(value) if value in values else -2
+
+    def recommend(self, held, age_group=None, region=None, k=3):
+        """
+        單一顧客查詢，回傳 [(服務, 分數, 信賴度, 提升度), ...] 依分數由高到低的前 k 項。
+        age_group / region 為 None 時不限制規則的區段。
+        """
+        held = self.encode(held)
+        lists = [self.postings[j] for j in range(len(self.services)) if (int(held) >> j) & 1]
+        if not lists:
+            return []
+        cand = np.concatenate(lists)
+        ok = ((self.ant[cand] & ~held) == 0) & ((self.con[cand] & ~held) != 0)
+        a = self._segment_code(self.age_groups, age_group)
+        r = self._segment_code(self.regions, region)
+        if a != ANY:
+            ok &= (self.age_group[cand] == ANY) | (self.age_group[cand] == a)
+        if r != ANY:
+            ok &= (self.region[cand] == ANY) | (self.region[cand] == r)
+        cand = cand[ok]
+        if len(cand) == 0:
+            return []
+
+        best = {}
+        for c in cand[np.argsort(-self.score[cand], kind='stable')]:
+            new = int(self.con[c] & ~held)
+            while new:
+                j = (new & -new).bit_length() - 1
+                new &= new - 1
+                if j not in best:
+                    best[j] = c
+            if len(best) >= k:
+                break
+        return [(self.services[j], self.score[c], self.confidence[c], self.lift[c])
+                for j, c in sorted(best.items(), key=lambda x: -self.score[x[1]])][:k]
+
+    def recommend_batch(self, held, age_groups=None, regions=None, k=3, chunk_size=4096):
+        """
+        批次查詢整份名單。held 為位元遮罩陣列，age_groups / regions 為各顧客的區段
+        (可為 None)。回傳 (n, k) 的服務索引 (無推薦為 -1) 與對應分數。
+        """
+        held = np.asarray(held, dtype=np.uint64)
+        n, n_items = len(held), len(self.services)
+        a = np.full(n, ANY) if age_groups is None else \
+            np.array([self._segment_code(self.age_groups, g) for g in age_groups])
+        r = np.full(n, ANY) if regions is None else \
+            np.array([self._segment_code(self.regions, g) for g in regions])
+
+        # 每個服務出現在哪些規則的後項
+        con_bits = ((self.con[:, None] >> np.arange(n_items, dtype=np.uint64)) & np.uint64(1)).astype(bool)
+        top_idx = np.full((n, k), -1, dtype=np.int64)
+        top_score = np.zeros((n, k))
+        for start in range(0, n, chunk_size):
+            h = held[start:start + chunk_size, None]
+            ok = (self.ant[None, :] & ~h) == 0
+            ga, gr = a[start:start + chunk_size, None], r[start:start + chunk_size, None]
+            ok &= (ga == ANY) | (self.age_group[None, :] == ANY) | (self.age_group[None, :] == ga)
+            ok &= (gr == ANY) | (self.region[None, :] == ANY) | (self.region[None, :] == gr)
+            scored = np.where(ok, self.score[None, :], 0.0)
+
+            # (顧客, 服務) 分數：持有者為 0，其餘取後項含該服務之規則的最高分
+            service_score = np.zeros((len(h), n_items))
+            for j in range(n_items):
+                if con_bits[:, j].any():
+                    service_score[:, j] = scored[:, con_bits[:, j]].max(axis=1)
+            held_bits = ((h >> np.arange(n_items, dtype=np.uint64)) & np.uint64(1)).astype(bool)
+            service_score[held_bits] = 0.0
+
+            kk = min(k, n_items)
+            idx = np.argsort(-service_score, axis=1, kind='stable')[:, :kk]
+            score = np.take_along_axis(service_score, idx, axis=1)
+            top_idx[start:start + len(h), :kk] = np.where(score > 0, idx, -1)
+            top_score[start:start + len(h), :kk] = score
+        return top_idx, top_score
+
+    def recommend_frame(self, customers, k=3):
+        """對含服務欄位、年齡與區域的顧客表批次推薦，回傳長表 (客戶編號, 名次, 推薦服務, 分數)。"""
+        held = service_masks(customers, self.services)
+        age_groups = age_group_of(customers['年齡']) if '年齡' in customers else None
+        regions = customers['區域'].to_numpy() if '區域' in customers else None
+        idx, score = self.recommend_batch(held, age_groups, regions, k=k)
+        rows, ranks = np.nonzero(idx >= 0)
+        return pd.DataFrame({
+            '客戶編號': customers['客戶編號'].to_numpy()[rows],
+            '名次': ranks + 1,
+            '推薦服務': np.array(self.services)[idx[rows, ranks]],
+            '分數': score[rows, ranks],
+        })
+
+
+if __name__ == "__main__":
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    root = os.path.join(base_dir, '..')
+
+    # 年齡群組規則 (06.py) 不限區域；東部規則 (05_b.py) 不限年齡
+    sources = [(RuleStore.load(os.path.join(base_dir, f'age_group_{g}_rules.npz')), g, None)
+               for g in AGE_GROUPS]
+    sources.append((RuleStore.load(os.path.join(root, '05', 'east_customer_rules.npz')), None, '東部'))
+    recommender = ServiceRecommender.from_stores(sources)
+    print(f"載入 {len(recommender)} 條可用於推薦的規則")
+
+    df = pd.read_csv(os.path.join(root, 'cleaned_customer_data.csv'), encoding='utf-8-sig')
+    model = ClusterModel.load(os.path.join(root, '05', 'cluster_model.npz'))
+    df['區域'] = model.assign(df)
+
+    # 單筆查詢延遲
+    customer = df.iloc[0]
+    held = [s for s in SERVICE_COLUMNS if customer[s] == 'Yes']
+    group = str(age_group_of([customer['年齡']])[0])
+    recommender.recommend(held, group, customer['區域'])
+    start = time.perf_counter()
+    repeats = 1000
+    for _ in range(repeats):
+        result = recommender.recommend(held, group, customer['區域'])
+    elapsed = (time.perf_counter() - start) / repeats
+    print(f"顧客 {customer['客戶編號']} ({group}, {customer['區域']}) 持有 {held}")
+    print(f"  推薦: {[(s, round(v, 3)) for s, v, _, _ in result]}  單筆查詢 {elapsed * 1e6:.0f} µs")
+
+    # 整份名單批次查詢
+    start = time.perf_counter()
+    campaign = recommender.recommend_frame(df, k=3)
+    print(f"批次推薦 {len(df)} 位顧客: {time.perf_counter() - start:.3f}s, 共 {len(campaign)} 筆推薦")
+    output = os.path.join(base_dir, 'service_recommendations.csv')
+    campaign.to_csv(output, index=False, encoding='utf-8-sig')
+    print(f"✓ 已儲存推薦名單至 {output}")
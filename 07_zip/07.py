@@ -1,11 +1,22 @@
 import pandas as pd
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from zip_index import ZipIndex, read_zip_population
+from zip_aggregates import ZipAggregates
+from market_query import MarketQuery
+from zip_consistency import MAX_DISTANCE_KM, check_coordinates
+from penetration_surface import BANDWIDTH_KM, PenetrationSurface
+from geo_rollup import GeoRollup
 
 # --- 檔案與路徑設定 ---
 base_dir = os.path.dirname(os.path.abspath(__file__))
 customer_data_path = os.path.join(base_dir, '..', 'cleaned_customer_data.csv')
 zip_data_path = os.path.join(base_dir, '..', 'customer_zip.csv')
 output_path = os.path.join(base_dir, 'customer_penetration_rate_with_city.csv')
+aggregates_path = os.path.join(base_dir, 'zip_aggregates.npz')
+issues_path = os.path.join(base_dir, 'zip_coordinate_issues.csv')
 
 # --- 步驟 1: 資料讀取 ---
 print("步驟 1/5: 正在讀取資料...")
@@ -13,51 +24,42 @@ try:
     customer_df = pd.read_csv(customer_data_path, encoding='utf-8-sig')
     print("  - 'cleaned_customer_data.csv' 讀取成功。")
     
-    zip_df = pd.read_csv(zip_data_path, encoding='big5')
-    # 手動修正 big5 編碼讀取時產生的亂碼欄位名稱
-    zip_df.columns = ['郵遞區號', '人口數']
+    # 讀取時統一修正 big5 編碼的欄位名稱
+    zip_df = read_zip_population(zip_data_path)
     print("  - 'customer_zip.csv' 讀取並修正欄位成功。")
 except Exception as e:
     print(f"  - 錯誤：讀取檔案失敗: {e}")
     exit()
 
-# --- 步驟 2: 處理資料 ---
-print("\n步驟 2/5: 正在計算客戶數及建立城市對應...")
-# 計算每個郵遞區號的客戶數量
-customer_counts = customer_df.groupby('郵遞區號').size().reset_index(name='客戶數量')
-print(f"  - 計算出 {len(customer_counts)} 個地區的客戶數。")
-
-# 建立郵遞區號到城市的對應表，並移除重複項
-zip_city_map = customer_df[['郵遞區號', '城市']].drop_duplicates().reset_index(drop=True)
-print(f"  - 成功建立 {len(zip_city_map)} 筆郵遞區號與城市的對應關係。")
+# --- 步驟 2: 建立郵遞區號索引 ---
+print("\n步驟 2/5: 正在建立以郵遞區號直接定址的索引...")
+# 人口數、城市、座標與客戶數都存成以郵遞區號為索引的陣列，合併只需向量化取值
+zip_index = ZipIndex.from_frames(zip_df, customer_df)
+print(f"  - 計算出 {int((zip_index.customers > 0).sum())} 個地區的客戶數。")
+print(f"  - 成功建立 {int((zip_index.city_codes >= 0).sum())} 筆郵遞區號與城市的對應關係。")
+
+# 資料品質檢查：顧客座標與其郵遞區號中心點 (中位數座標) 的距離，過遠者列出並建議最近的郵遞區號
+coordinate_report = check_coordinates(customer_df, (zip_index.lat, zip_index.lon))
+coordinate_issues = coordinate_report[coordinate_report['異常']]
+print(f"  - 座標檢查：{len(coordinate_issues)} 位顧客距離郵遞區號中心點超過 {MAX_DISTANCE_KM:g} km。")
+if len(coordinate_issues):
+    coordinate_issues.to_csv(issues_path, encoding='utf-8-sig', index=False)
+    print(f"    異常清單與建議郵遞區號已儲存至 {os.path.basename(issues_path)}。")
+
+# 各郵遞區號的顧客數、流失數、總收入與每月費用彙總；之後的顧客異動以事件增量更新 (ZipAggregates.apply_events)
+zip_aggregates = ZipAggregates.from_frame(customer_df)
+zip_aggregates.save(aggregates_path)
+print(f"  - 已建立郵遞區號彙總並儲存至 {os.path.basename(aggregates_path)}。")
 
 # --- 步驟 3: 合併資料 ---
 print("\n步驟 3/5: 正在合併資料...")
-# 確保合併鍵的資料型態一致
-customer_counts['郵遞區號'] = customer_counts['郵遞區號'].astype(int)
-zip_df['郵遞區號'] = zip_df['郵遞區號'].astype(int)
-zip_city_map['郵遞區號'] = zip_city_map['郵遞區號'].astype(int)
-
-# 1. 合併人口資料與客戶計數資料
-penetration_df = pd.merge(zip_df, customer_counts, on='郵遞區號', how='left')
-# 2. 再次合併，加入城市名稱
-penetration_df = pd.merge(penetration_df, zip_city_map, on='郵遞區號', how='left')
+# 以人口資料的郵遞區號直接取出客戶數與城市，沒有客戶的地區客戶數為 0、城市為 '未知城市'
+penetration_df = zip_aggregates.to_frame(zip_index, zip_df['郵遞區號'])
 print("  - 資料合併完成。")
 
 # --- 步驟 4: 計算滲透率與整理 ---
 print("\n步驟 4/5: 正在計算滲透率並整理資料...")
-# 對於沒有客戶的地區，其 '客戶數量' 會是 NaN，在此填充為 0
-penetration_df['客戶數量'] = penetration_df['客戶數量'].fillna(0).astype(int)
-# 對於 customer_zip.csv 中存在但客戶資料中沒有的郵遞區號，給定一個預設城市名
-penetration_df['城市'] = penetration_df['城市'].fillna('未知城市')
-
-# 計算滲透率，並處理人口數為 0 的情況 (避免除以零的錯誤)
-penetration_df['客戶滲透率 (%)'] = 0.0
-mask = penetration_df['人口數'] > 0
-penetration_df.loc[mask, '客戶滲透率 (%)'] = \
-    (penetration_df.loc[mask, '客戶數量'] / penetration_df.loc[mask, '人口數']) * 100
-    
-# 重新排列欄位順序，讓表格更易讀
+# 滲透率已由彙總表計算 (人口數為 0 時為 0)，重新排列欄位順序，讓表格更易讀
 penetration_df = penetration_df[['郵遞區號', '城市', '人口數', '客戶數量', '客戶滲透率 (%)']]
 print("  - 計算與整理完成。")
 
@@ -74,17 +76,42 @@ pd.options.display.float_format = '{:.4f}'.format
 print("\n--- [分析洞察] 客戶滲透率最高的 20 個地區 ---")
 print(penetration_df_sorted.head(20).to_string())
 
-# 顯示高人口但低滲透率的潛力市場
+# 顯示高人口但低滲透率的潛力市場：門檻與排名可調整 (亦可使用 market_query.py 的 CLI)
 print("\n--- [分析洞察] 高人口、低滲透率的潛力市場 (顯示前 20) ---")
-potential_market = penetration_df_sorted[
-    (penetration_df_sorted['人口數'] > 20000) & 
-    (penetration_df_sorted['客戶滲透率 (%)'] < 0.5) # 條件設定為小於 0.5%
-].tail(20)
+market_table = zip_aggregates.to_frame(zip_index)
+# 小人口郵遞區號的滲透率雜訊很大，另以高斯平滑 (FFT 卷積) 後的滲透率曲面在中心點取值
+penetration_surface = PenetrationSurface.from_index(zip_index, bandwidth_km=BANDWIDTH_KM)
+market_table['平滑滲透率 (%)'] = penetration_surface.sample_zips(zip_index, market_table['郵遞區號'].to_numpy())
+market_query = MarketQuery(market_table)
+potential_market = market_query.top_k(
+    min_population=20000,
+    max_penetration=0.5, # 條件設定為小於 0.5%
+    rank='-penetration', # 滲透率最低的地區優先
+    k=20,
+)[penetration_df.columns].iloc[::-1]
 print(potential_market.to_string())
 
+# 以平滑滲透率篩選與排序，較不受小樣本郵遞區號影響
+print(f"\n--- [分析洞察] 高人口、平滑滲透率 (頻寬 {BANDWIDTH_KM:g} km) 低的潛力市場 (顯示前 20) ---")
+smoothed_market = market_query.top_k(
+    min_population=20000,
+    max_penetration=0.5,
+    rank='-smoothed_penetration',
+    k=20,
+    penetration_var='smoothed_penetration', # 門檻也以平滑滲透率判斷
+)[list(penetration_df.columns) + ['平滑滲透率 (%)']].iloc[::-1]
+print(smoothed_market.to_string())
+
+# 郵遞區號 → 前三碼 / 城市 → 州 的階層彙總 (一次建立，各層直接查詢)
+geo_rollup = GeoRollup.build(zip_index, zip_aggregates)
+print("\n--- [分析洞察] 州層級的滲透率、收入與流失 ---")
+print(geo_rollup.table('state').to_string(index=False))
+print("\n--- [分析洞察] 總收入最高的 10 個郵遞區號前三碼 ---")
+print(geo_rollup.table('zip3').nlargest(10, '總收入').to_string(index=False))
+
 
 # 將完整的分析結果儲存到新的 CSV 檔案
 # penetration_df_sorted.to_csv(output_path, encoding='utf-8-sig', index=False)
 # print(f"\n完整的滲透率分析結果已儲存至: {output_path}")
 
-# print("\n--- 所有步驟已順利完成！ ---")
\ No newline at end of file
+# print("\n--- 所有步驟已順利完成！ ---")
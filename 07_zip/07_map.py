@@ -1,115 +1,167 @@
 import pandas as pd
 import plotly.express as px
 import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from zip_index import ZipIndex
+from map_export import export_layered_map
+from hex_grid import aggregate_hex, write_hex_map
+from state_geometry import StateBoundaries
+
+# --- 輸出模式 ---
+# single: 單一 HTML、可切換圖層、plotly.js 與點資料各只存一份 (預設)
+# separate: 原本的四個獨立 HTML 檔
+# hex: 顧客依多解析度六角形格網彙總後繪製，繪製成本只與格子數有關
+parser = argparse.ArgumentParser(description="產生客戶地理分佈地圖")
+parser.add_argument('--export', choices=['single', 'separate', 'hex'], default='single')
+parser.add_argument('--plotlyjs', choices=['inline', 'directory', 'cdn'], default='inline',
+                    help="single 模式下 plotly.js 的載入方式")
+args = parser.parse_args()
 
 # --- 檔案與路徑設定 ---
 base_dir = os.path.dirname(os.path.abspath(__file__))
-penetration_data_path = os.path.join(base_dir, 'customer_penetration_rate_with_city.csv')
 coords_data_path = os.path.join(base_dir, '..', 'cleaned_customer_data.csv')
+zip_data_path = os.path.join(base_dir, '..', 'customer_zip.csv')
 
 # --- 步驟 1: 資料讀取與合併 ---
 print("步驟 1/3: 正在讀取並合併資料...")
 try:
-    penetration_df = pd.read_csv(penetration_data_path, encoding='utf-8-sig')
-    coords_df = pd.read_csv(coords_data_path, encoding='utf-8-sig')
-    # 為每個郵遞區號提取一筆不重複的經緯度資料
-    zip_coords = coords_df[['郵遞區號', '緯度', '經度']].drop_duplicates(subset=['郵遞區號'])
-    
-    # 將經緯度資料合併到主分析檔案
-    final_df = pd.merge(penetration_df, zip_coords, on='郵遞區號', how='left')
+    # 郵遞區號索引同時保存滲透率與每個郵遞區號的經緯度，直接取值即可，不需再合併
+    zip_index = ZipIndex.from_files(coords_data_path, zip_data_path)
+    final_df = zip_index.to_frame(coords=True)
     final_df.dropna(subset=['緯度', '經度'], inplace=True)
     
     # 為了地圖清晰，只繪製有客戶的地區
     df_to_plot = final_df[final_df['客戶數量'] > 0].copy()
+
+    # 以州界多邊形判斷每個郵遞區號中心點所屬的州，地圖範圍取這些州的外接矩形
+    boundaries = StateBoundaries.load_cached()
+    df_to_plot['州'] = boundaries.state_codes(df_to_plot['緯度'].to_numpy(), df_to_plot['經度'].to_numpy(), outside='(州外)')
+    states = df_to_plot.loc[df_to_plot['州'] != '(州外)', '州'].value_counts()
+    focus_bounds = boundaries.bbox(states.index.to_numpy()) if len(states) else None
+    outside = df_to_plot[df_to_plot['州'] == '(州外)']
+    print(f"  - 郵遞區號所屬州: {states.to_dict()}")
+    if len(outside):
+        print(f"  - 警告：{len(outside)} 個郵遞區號的座標不在任何州界內: {outside['郵遞區號'].tolist()}")
     print("  - 資料準備完成。")
 except FileNotFoundError:
-    print(f"  - 錯誤：找不到必要的資料檔案。請確認 'customer_penetration_rate_with_city.csv' 和 'cleaned_customer_data.csv' 都存在。")
+    print(f"  - 錯誤：找不到必要的資料檔案。請確認 'customer_zip.csv' 和 'cleaned_customer_data.csv' 都存在。")
     exit()
 except Exception as e:
     print(f"  - 錯誤：資料準備失敗: {e}")
     exit()
 
-# --- 步驟 2: 產生三張獨立的地圖 ---
-print("\n步驟 2/3: 正在產生三張不同的地理分佈圖...")
+# --- 步驟 2: 產生地圖 ---
+def write_separate_maps(df_to_plot):
+    """原本的輸出方式：每張地圖各自一個 HTML (各含一份 plotly.js 與點資料)。"""
+    # 通用的地圖更新函式，讓地圖聚焦在客戶所在州的範圍 (無法判斷州時退回點的範圍)
+    def focus_on_california(fig, df):
+        lon_min, lat_min, lon_max, lat_max = focus_bounds if focus_bounds is not None else (
+            df['經度'].min(), df['緯度'].min(), df['經度'].max(), df['緯度'].max())
+        fig.update_geos(
+            lataxis_range=[lat_min - 1, lat_max + 1],
+            lonaxis_range=[lon_min - 1, lon_max + 1],
+            oceancolor="#d2f9ff",
+            showocean=True,
+        )
+        return fig
 
-# 通用的地圖更新函式，讓地圖聚焦在加州區域
-def focus_on_california(fig, df):
-    fig.update_geos(
-        lataxis_range=[df['緯度'].min() - 1, df['緯度'].max() + 1],
-        lonaxis_range=[df['經度'].min() - 1, df['經度'].max() + 1],
-        oceancolor="#d2f9ff",
-        showocean=True,
+    # 地圖 1: 依據「人口數」渲染
+    print("  - 正在處理: map_by_population.html (依人口數渲染)")
+    fig_pop = px.scatter_geo(
+        df_to_plot,
+        lat='緯度', lon='經度', scope='usa',
+        color="人口數",
+        size="客戶數量",
+        hover_name="城市",
+        hover_data=["郵遞區號", "客戶滲透率 (%)"],
+        projection="albers usa",
+        title="客戶地理分佈 - 依 '人口數' 渲染",
+        color_continuous_scale="Plasma",
+        size_max=25
     )
-    return fig
+    fig_pop = focus_on_california(fig_pop, df_to_plot)
+    fig_pop.write_html(os.path.join(base_dir, "map_by_population.html"))
 
-# 地圖 1: 依據「人口數」渲染
-print("  - 正在處理: map_by_population.html (依人口數渲染)")
-fig_pop = px.scatter_geo(
-    df_to_plot,
-    lat='緯度', lon='經度', scope='usa',
-    color="人口數",
-    size="客戶數量",
-    hover_name="城市",
-    hover_data=["郵遞區號", "客戶滲透率 (%)"],
-    projection="albers usa",
-    title="客戶地理分佈 - 依 '人口數' 渲染",
-    color_continuous_scale="Plasma",
-    size_max=25
-)
-fig_pop = focus_on_california(fig_pop, df_to_plot)
-fig_pop.write_html(os.path.join(base_dir, "map_by_population.html"))
+    # 地圖 2: 依據「客戶數」渲染
+    print("  - 正在處理: map_by_customer_count.html (依客戶數渲染)")
+    fig_cust = px.scatter_geo(
+        df_to_plot,
+        lat='緯度', lon='經度', scope='usa',
+        color="客戶數量",
+        size="客戶數量",
+        hover_name="城市",
+        hover_data=["郵遞區號", "人口數"],
+        projection="albers usa",
+        title="客戶地理分佈 - 依 '客戶數量' 渲染",
+        color_continuous_scale="Viridis",
+        size_max=25
+    )
+    fig_cust = focus_on_california(fig_cust, df_to_plot)
+    fig_cust.write_html(os.path.join(base_dir, "map_by_customer_count.html"))
 
-# 地圖 2: 依據「客戶數」渲染
-print("  - 正在處理: map_by_customer_count.html (依客戶數渲染)")
-fig_cust = px.scatter_geo(
-    df_to_plot,
-    lat='緯度', lon='經度', scope='usa',
-    color="客戶數量",
-    size="客戶數量",
-    hover_name="城市",
-    hover_data=["郵遞區號", "人口數"],
-    projection="albers usa",
-    title="客戶地理分佈 - 依 '客戶數量' 渲染",
-    color_continuous_scale="Viridis",
-    size_max=25
-)
-fig_cust = focus_on_california(fig_cust, df_to_plot)
-fig_cust.write_html(os.path.join(base_dir, "map_by_customer_count.html"))
+    # 地圖 3: 依據「客戶滲透率」渲染
+    print("  - 正在處理: map_by_penetration_rate.html (依客戶滲透率渲染)")
+    fig_pen = px.scatter_geo(
+        df_to_plot,
+        lat='緯度', lon='經度', scope='usa',
+        color="客戶滲透率 (%)",
+        size="客戶數量",
+        hover_name="城市",
+        hover_data={"郵遞區號": True, "人口數": True, "客戶滲透率 (%)":':.2f%'},
+        projection="albers usa",
+        title="客戶地理分佈 - 依 '客戶滲透率 (%)' 渲染",
+        color_continuous_scale="Cividis_r",
+        size_max=25
+    )
+    fig_pen = focus_on_california(fig_pen, df_to_plot)
+    fig_pen.write_html(os.path.join(base_dir, "map_by_penetration_rate.html"))
 
-# 地圖 3: 依據「客戶滲透率」渲染
-print("  - 正在處理: map_by_penetration_rate.html (依客戶滲透率渲染)")
-fig_pen = px.scatter_geo(
-    df_to_plot,
-    lat='緯度', lon='經度', scope='usa',
-    color="客戶滲透率 (%)",
-    size="客戶數量",
-    hover_name="城市",
-    hover_data={"郵遞區號": True, "人口數": True, "客戶滲透率 (%)":':.2f%'},
-    projection="albers usa",
-    title="客戶地理分佈 - 依 '客戶滲透率 (%)' 渲染",
-    color_continuous_scale="Cividis_r",
-    size_max=25
-)
-fig_pen = focus_on_california(fig_pen, df_to_plot)
-fig_pen.write_html(os.path.join(base_dir, "map_by_penetration_rate.html"))
+    # 地圖 4: 客戶數與人口數交疊對比
+    print("  - 正在處理: map_pop_vs_cust.html (客戶數 vs 人口數)")
+    fig_comp = px.scatter_geo(
+        df_to_plot,
+        lat='緯度', lon='經度', scope='usa',
+        color="人口數",
+        size="客戶數量",
+        hover_name="城市",
+        hover_data=["郵遞區號", "客戶滲透率 (%)"],
+        projection="albers usa",
+        title="客戶與人口數量疊加對比圖 (顏色:人口, 大小:客戶)",
+        color_continuous_scale="Plasma",
+        size_max=30
+    )
+    fig_comp = focus_on_california(fig_comp, df_to_plot)
+    fig_comp.write_html(os.path.join(base_dir, "map_pop_vs_cust.html"))
+    return [os.path.join(base_dir, name) for name in
+            ["map_by_population.html", "map_by_customer_count.html", "map_by_penetration_rate.html", "map_pop_vs_cust.html"]]
 
-# 地圖 4: 客戶數與人口數交疊對比
-print("  - 正在處理: map_pop_vs_cust.html (客戶數 vs 人口數)")
-fig_comp = px.scatter_geo(
-    df_to_plot,
-    lat='緯度', lon='經度', scope='usa',
-    color="人口數",
-    size="客戶數量",
-    hover_name="城市",
-    hover_data=["郵遞區號", "客戶滲透率 (%)"],
-    projection="albers usa",
-    title="客戶與人口數量疊加對比圖 (顏色:人口, 大小:客戶)",
-    color_continuous_scale="Plasma",
-    size_max=30
-)
-fig_comp = focus_on_california(fig_comp, df_to_plot)
-fig_comp.write_html(os.path.join(base_dir, "map_pop_vs_cust.html"))
 
+start = time.perf_counter()
+n_drawn = f"{len(df_to_plot)} 個點"
+if args.export == 'single':
+    print("\n步驟 2/3: 正在產生單一檔案、可切換圖層的地理分佈圖...")
+    output_files = [os.path.join(base_dir, "map_layers.html")]
+    print("  - 正在處理: map_layers.html (人口數 / 客戶數量 / 客戶滲透率 / 客戶 vs 人口)")
+    export_layered_map(df_to_plot, output_files[0], plotlyjs=args.plotlyjs, bounds=focus_bounds)
+elif args.export == 'hex':
+    print("\n步驟 2/3: 正在產生多解析度六角形格網地圖...")
+    customers = pd.read_csv(coords_data_path, encoding='utf-8-sig', usecols=['緯度', '經度', '總收入', '客戶狀態'])
+    hex_table = aggregate_hex(customers, zip_index)
+    hex_table.to_csv(os.path.join(base_dir, "hex_cells.csv"), index=False, encoding='utf-8-sig')
+    output_files = [os.path.join(base_dir, "map_hex_layers.html")]
+    print(f"  - 正在處理: map_hex_layers.html ({len(customers)} 位顧客 → {len(hex_table)} 個格子)")
+    write_hex_map(hex_table, output_files[0])
+    n_drawn = f"{len(hex_table)} 個格子"
+else:
+    print("\n步驟 2/3: 正在產生四張不同的地理分佈圖...")
+    output_files = write_separate_maps(df_to_plot)
+elapsed = time.perf_counter() - start
+total_size = sum(os.path.getsize(f) for f in output_files)
+print(f"  - 共 {n_drawn}, 產生時間 {elapsed:.2f}s, 輸出大小 {total_size / 1e6:.2f} MB ({len(output_files)} 個檔案)")
 
 # # --- 步驟 3: 開啟地圖並總結 ---
 # print("\n步驟 3/3: 正在開啟地圖...")
@@ -0,0 +1,20 @@
+import numpy as np
+
+# 地球平均半徑 (公里)
+EARTH_RADIUS_KM = 6371.0088
+# 正弦投影的中央經線 (加州附近)，距離中央經線越遠形狀越斜，但面積不變
+CENTRAL_LON = -119.0
+
+
+def project(lat, lon, central_lon=CENTRAL_LON):
+    """正弦 (等面積) 投影，回傳公里為單位的平面座標。"""
+    phi = np.radians(lat)
+    lam = np.radians(np.asarray(lon, dtype=float) - central_lon)
+    return EARTH_RADIUS_KM * lam * np.cos(phi), EARTH_RADIUS_KM * phi
+
+
+def unproject(x, y, central_lon=CENTRAL_LON):
+    """project 的反轉換，回傳 (緯度, 經度)。"""
+    phi = y / EARTH_RADIUS_KM
+    lam = x / (EARTH_RADIUS_KM * np.cos(phi))
+    return np.degrees(phi), np.degrees(lam) + central_lon
@@ -0,0 +1,165 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from state_geometry import StateBoundaries
+from zip_aggregates import ZipAggregates
+from zip_index import ZipIndex, _as_zip
+
+# 層級由細到粗；zip3 與 city 並非互相包含 (同一城市可能跨多個前三碼)，兩者都直接屬於 state
+LEVELS = ['zip', 'zip3', 'city', 'state']
+KEY_COLUMNS = {'zip': '郵遞區號', 'zip3': '郵遞區號前三碼', 'city': '城市', 'state': '州'}
+MEASURES = ['人口數', '客戶數量', '流失數量', '總收入']
+UNKNOWN_STATE = '(未知)'
+
+
+def _reduce(values, parent, n_parent):
+    """依 parent 排序後以 np.add.reduceat 加總各欄位，回傳長度 n_parent 的陣列。"""
+    order = np.argsort(parent, kind='stable')
+    sorted_parent = parent[order]
+    starts = np.flatnonzero(np.r_[True, sorted_parent[1:] != sorted_parent[:-1]]) if len(parent) else []
+    result = {}
+    for name, v in values.items():
+        out = np.zeros(n_parent, dtype=v.dtype)
+        if len(starts):
+            out[sorted_parent[starts]] = np.add.reduceat(v[order], starts)
+        result[name] = out
+    return result
+
+
+def _majority(child_parent, labels, n_children, n_labels):
+    """每個子節點取其成員中最多的標籤 (labels < 0 的成員不計)，沒有任何標籤時為 -1。"""
+    known = labels >= 0
+    counts = np.bincount(child_parent[known] * n_labels + labels[known],
+                         minlength=n_children * n_labels).reshape(n_children, n_labels)
+    return np.where(counts.sum(axis=1) > 0, counts.argmax(axis=1), -1)
+
+
+class GeoRollup:
+    """
+    郵遞區號 → 前三碼 / 城市 → 州 的階層彙總。
+
+    建立時以整數父節點指標描述階層 (zip_parent[level][i] 為第 i 個郵遞區號在該層的節點)，
+    由下而上以排序後的 np.add.reduceat 加總人口、客戶、流失與收入；比率在查詢時由加總值計算。
+    州由郵遞區號中心點落在哪個州界內決定，前三碼取其郵遞區號的多數州，郵遞區號再繼承前三碼的州。
+    """
+
+    def __init__(self, keys, zip_parent, parent, values):
+        self.keys = keys                  # 各層節點的標籤
+        self.zip_parent = zip_parent      # 各層：每個郵遞區號所屬節點
+        self.parent = parent              # zip3 / city → state 節點
+        self.values = values              # 各層：欄位 → 加總值陣列
+
+    @classmethod
+    def build(cls, zip_index, aggregates, boundaries=None):
+        zips = np.flatnonzero((zip_index.population >= 0) | (aggregates.count > 0))
+        base = {
+            '人口數': np.maximum(zip_index.population[zips], 0),
+            '客戶數量': aggregates.count[zips],
+            '流失數量': aggregates.churned[zips],
+            '總收入': aggregates.revenue[zips],
+        }
+        keys = {'zip': zips}
+        zip_parent = {'zip': np.arange(len(zips))}
+        keys['zip3'], zip_parent['zip3'] = np.unique(zips // 100, return_inverse=True)
+        keys['city'], zip_parent['city'] = np.unique(zip_index.city(zips), return_inverse=True)
+
+        boundaries = StateBoundaries.load_cached() if boundaries is None else boundaries
+        located = boundaries.assign_zips(zip_index, zips)
+        n_states = len(boundaries.codes)
+        zip3_state = _majority(zip_parent['zip3'], located, len(keys['zip3']), n_states)
+        zip_state = zip3_state[zip_parent['zip3']]
+        city_state = _majority(zip_parent['city'], zip_state, len(keys['city']), n_states)
+        state_labels = np.append(boundaries.codes, UNKNOWN_STATE)
+        used, compact = np.unique(np.where(zip_state >= 0, zip_state, n_states), return_inverse=True)
+        remap = np.full(n_states + 1, -1)
+        remap[used] = np.arange(len(used))
+        keys['state'] = state_labels[used]
+        zip_parent['state'] = compact
+        parent = {'zip3': remap[np.where(zip3_state >= 0, zip3_state, n_states)],
+                  'city': remap[np.where(city_state >= 0, city_state, n_states)]}
+
+        # 由下而上：zip → zip3、zip → city、zip3 → state
+        values = {'zip': base}
+        values['zip3'] = _reduce(base, zip_parent['zip3'], len(keys['zip3']))
+        values['city'] = _reduce(base, zip_parent['city'], len(keys['city']))
+        values['state'] = _reduce(values['zip3'], parent['zip3'], len(keys['state']))
+        return cls(keys, zip_parent, parent, values)
+
+    # ---------- 查詢 ----------
+    def _node(self, level, key):
+        keys = self.keys[level]
+        pos = np.searchsorted(keys, key)
+        if pos >= len(keys) or keys[pos] != key:
+            raise KeyError(f"{KEY_COLUMNS[level]} 中找不到 {key}")
+        return pos
+
+    def table(self, level, nodes=None):
+        """回傳某層 (或其中部分節點) 的加總與比率表。"""
+        nodes = np.arange(len(self.keys[level])) if nodes is None else np.asarray(nodes, dtype=np.int64)
+        v = {name: self.values[level][name][nodes] for name in MEASURES}
+        table = pd.DataFrame({KEY_COLUMNS[level]: self.keys[level][nodes], **v})
+        if level in self.parent:
+            table['州'] = self.keys['state'][self.parent[level][nodes]]
+        pop, cust = v['人口數'].astype(float), v['客戶數量'].astype(float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            table['客戶滲透率 (%)'] = np.where(pop > 0, cust / np.where(pop > 0, pop, 1) * 100, 0.0)
+            table['流失率'] = np.where(cust > 0, v['流失數量'] / np.where(cust > 0, cust, 1), 0.0)
+            table['人均收入'] = np.where(pop > 0, v['總收入'] / np.where(pop > 0, pop, 1), 0.0)
+        return table
+
+    def drill_down(self, level, key, to='zip'):
+        """
+        列出 level 層節點 key 之下、to 層的節點。zip3 與 city 不互相包含，此時列出與該節點
+        共有郵遞區號的節點 (其數值仍為整個節點的加總)。
+        """
+        if level == 'zip' or to in (level, 'state'):
+            raise ValueError(f"無法由 {level} 往下展開到 {to}")
+        members = self.zip_parent[level] == self._node(level, key)
+        return self.table(to, np.unique(self.zip_parent[to][members]))
+
+    def roll_up(self, level, key):
+        """列出節點 key 所屬的上層節點 (zip → zip3, city, state；zip3 / city → state)。"""
+        node = self._node(level, key if level != 'zip' else _as_zip(key))
+        if level == 'zip':
+            return {up: self.table(up, [self.zip_parent[up][node]]) for up in LEVELS[1:]}
+        if level in self.parent:
+            return {'state': self.table('state', [self.parent[level][node]])}
+        return {}
+
+
+if __name__ == "__main__":
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    customer_df = pd.read_csv(os.path.join(base_dir, '..', 'cleaned_customer_data.csv'), encoding='utf-8-sig')
+    zip_index = ZipIndex.from_files()
+    aggregates = ZipAggregates.from_frame(customer_df)
+    boundaries = StateBoundaries.load_cached()
+
+    start = time.perf_counter()
+    rollup = GeoRollup.build(zip_index, aggregates, boundaries)
+    print(f"建立階層: {(time.perf_counter() - start) * 1000:.1f} ms, "
+          + ", ".join(f"{level} {len(rollup.keys[level])} 個" for level in LEVELS))
+
+    # 與直接 groupby 的結果比對
+    df = customer_df.assign(流失=customer_df['客戶狀態'] == 'Churned', 前三碼=customer_df['郵遞區號'] // 100)
+    for level, column in [('zip3', '前三碼'), ('city', '城市')]:
+        expected = df.groupby(column).agg(客戶數量=('客戶編號', 'size'), 流失數量=('流失', 'sum'), 總收入=('總收入', 'sum'))
+        got = rollup.table(level).set_index(KEY_COLUMNS[level]).loc[expected.index]
+        print(f"{level} 與 groupby 一致: {all(np.allclose(got[c], expected[c]) for c in expected.columns)}")
+
+    pd.options.display.float_format = '{:.4f}'.format
+    print("\n州層級:")
+    print(rollup.table('state').to_string(index=False))
+    print("\n前三碼層級 (客戶數量前 5):")
+    print(rollup.table('zip3').nlargest(5, '客戶數量').to_string(index=False))
+    print("\n往上彙總 94550:")
+    for level, row in rollup.roll_up('zip', 94550).items():
+        print(row.to_string(index=False))
+    print("\n展開 San Diego 的郵遞區號 (客戶數量前 5):")
+    print(rollup.drill_down('city', 'San Diego').nlargest(5, '客戶數量').to_string(index=False))
+    print("\n展開前三碼 945 的城市 (前 5):")
+    print(rollup.drill_down('zip3', 945, to='city').head().to_string(index=False))
@@ -0,0 +1,205 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from geo import CENTRAL_LON, project, unproject
+from zip_index import ZipIndex
+
+# 預設的多解析度：六角形中心到頂點的距離 (公里)，由粗到細
+RESOLUTIONS_KM = [80, 40, 20, 10, 5]
+
+_SQRT3 = np.sqrt(3.0)
+
+
+# ---------- 座標轉換 ----------
+def _cube_round(q, r):
+    """把分數軸座標四捨五入到最近的六角形 (cube rounding)。"""
+    s = -q - r
+    rq, rr, rs = np.round(q), np.round(r), np.round(s)
+    dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    rq = np.where(fix_q, -rr - rs, rq)
+    rr = np.where(fix_r, -rq - rs, rr)
+    return rq.astype(np.int64), rr.astype(np.int64)
+
+
+def pack_cell(q, r):
+    """把六角形軸座標 (q, r) 合併成一個 int64 格子編號。"""
+    return (np.asarray(q, dtype=np.int64) << 32) | (np.asarray(r, dtype=np.int64) & 0xFFFFFFFF)
+
+
+def unpack_cell(cell):
+    cell = np.asarray(cell, dtype=np.int64)
+    return cell >> 32, (cell & 0xFFFFFFFF).astype(np.uint32).view(np.int32).astype(np.int64)
+
+
+def _axial(x, y, size_km):
+    """平面座標 → 六角形軸座標 (q, r)。"""
+    return _cube_round((_SQRT3 / 3 * x - y / 3) / size_km, (2 / 3 * y) / size_km)
+
+
+def latlon_to_hex(lat, lon, size_km, central_lon=CENTRAL_LON):
+    """
+    把經緯度轉成尖頂六角形格子編號 (向量化)。
+    size_km 為六角形中心到頂點的距離；先以正弦投影轉成等面積平面，再換算軸座標。
+    """
+    return pack_cell(*_axial(*project(lat, lon, central_lon), size_km))
+
+
+def _dense_cells(q, r, max_cells=50_000_000):
+    """
+    把軸座標轉成 0..m-1 的連續格子索引。範圍不大時直接以 (q, r) 的外接矩形定址 (不需排序)，
+    否則退回 np.unique。回傳 (每個點的索引, 各索引的格子編號)。
+    """
+    if len(q) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    q0, r0 = q.min(), r.min()
+    nq, nr = int(q.max() - q0 + 1), int(r.max() - r0 + 1)
+    if nq * nr > max_cells:
+        cells, inverse = np.unique(pack_cell(q, r), return_inverse=True)
+        return inverse, cells
+    flat = (q - q0) * nr + (r - r0)
+    occupied = np.flatnonzero(np.bincount(flat, minlength=nq * nr))
+    lookup = np.empty(nq * nr, dtype=np.int64)
+    lookup[occupied] = np.arange(len(occupied))
+    return lookup[flat], pack_cell(occupied // nr + q0, occupied % nr + r0)
+
+
+def hex_center(cell, size_km, central_lon=CENTRAL_LON):
+    """回傳格子中心的 (緯度, 經度)。"""
+    q, r = unpack_cell(cell)
+    x = size_km * (_SQRT3 * q + _SQRT3 / 2 * r)
+    y = size_km * 1.5 * r
+    return unproject(x, y, central_lon)
+
+
+def hex_boundary(cell, size_km, central_lon=CENTRAL_LON):
+    """回傳 (格子數, 7, 2) 的封閉多邊形頂點 (經度, 緯度)，可直接寫成 GeoJSON。"""
+    q, r = unpack_cell(cell)
+    cx = size_km * (_SQRT3 * q + _SQRT3 / 2 * r)
+    cy = size_km * 1.5 * r
+    angles = np.radians(60 * np.arange(7) - 30)
+    x = cx[:, None] + size_km * np.cos(angles)[None, :]
+    y = cy[:, None] + size_km * np.sin(angles)[None, :]
+    lat, lon = unproject(x, y, central_lon)
+    return np.stack([lon, lat], axis=-1)
+
+
+# ---------- 彙總 ----------
+def aggregate_hex(customers, zip_index=None, resolutions=RESOLUTIONS_KM, central_lon=CENTRAL_LON):
+    """
+    把顧客依各解析度的六角形格子彙總：顧客數、總收入、流失數 (與流失率)；
+    若提供 ZipIndex，另以郵遞區號中心點把人口分配到格子並計算滲透率。
+    customers 需含 緯度、經度、總收入、客戶狀態 欄位。回傳多解析度的長表。
+    """
+    x, y = project(customers['緯度'].to_numpy(dtype=float), customers['經度'].to_numpy(dtype=float), central_lon)
+    revenue = customers['總收入'].to_numpy(dtype=float)
+    churned = (customers['客戶狀態'] == 'Churned').to_numpy()
+    n = len(x)
+
+    if zip_index is not None:
+        zips = zip_index.zips
+        zips = zips[~np.isnan(zip_index.lat[zips])]
+        zip_x, zip_y = project(zip_index.lat[zips], zip_index.lon[zips], central_lon)
+        zip_pop = zip_index.population[zips].astype(float)
+        x, y = np.concatenate([x, zip_x]), np.concatenate([y, zip_y])
+
+    layers = []
+    for size in resolutions:
+        inverse, cells = _dense_cells(*_axial(x, y, size))
+        cust_inv, zip_inv = inverse[:n], inverse[n:]
+        m = len(cells)
+        count = np.bincount(cust_inv, minlength=m)
+        layer = pd.DataFrame({
+            '解析度 (km)': size,
+            '格子': cells,
+            '客戶數量': count,
+            '總收入': np.bincount(cust_inv, weights=revenue, minlength=m),
+            '流失數量': np.bincount(cust_inv, weights=churned, minlength=m).astype(np.int64),
+        })
+        with np.errstate(divide='ignore', invalid='ignore'):
+            layer['流失率'] = np.where(count > 0, layer['流失數量'] / np.maximum(count, 1), 0.0)
+            if zip_index is not None:
+                population = np.bincount(zip_inv, weights=zip_pop, minlength=m)
+                layer['人口數'] = population.astype(np.int64)
+                layer['客戶滲透率 (%)'] = np.where(population > 0, count / np.maximum(population, 1) * 100, 0.0)
+        layer['緯度'], layer['經度'] = hex_center(cells, size, central_lon)
+        layers.append(layer)
+    return pd.concat(layers, ignore_index=True)
+
+
+def hex_geojson(cells, size_km, central_lon=CENTRAL_LON):
+    """把格子轉成 GeoJSON FeatureCollection (feature id 為格子編號字串)。"""
+    rings = hex_boundary(cells, size_km, central_lon).round(5).tolist()
+    return {'type': 'FeatureCollection', 'features': [
+        {'type': 'Feature', 'id': str(c), 'properties': {},
+         'geometry': {'type': 'Polygon', 'coordinates': [ring]}}
+        for c, ring in zip(np.asarray(cells).tolist(), rings)
+    ]}
+
+
+def write_hex_map(table, path, value='客戶數量', colorscale='Viridis', title='客戶六角形格網分佈'):
+    """
+    以 plotly 畫出多解析度六角形格網 (每個解析度一個圖層，可用按鈕切換)，
+    繪製成本只與格子數有關，與顧客數無關。
+    """
+    import plotly.graph_objects as go
+
+    resolutions = list(dict.fromkeys(table['解析度 (km)']))
+    fig = go.Figure()
+    for i, size in enumerate(resolutions):
+        layer = table[(table['解析度 (km)'] == size) & (table['客戶數量'] > 0)]
+        fig.add_trace(go.Choropleth(
+            geojson=hex_geojson(layer['格子'].to_numpy(), size),
+            locations=layer['格子'].astype(str), z=layer[value],
+            colorscale=colorscale, marker_line_width=0.3, colorbar_title=value,
+            text=[f"客戶 {c}<br>總收入 {v:,.0f}<br>流失率 {p:.1%}"
+                  for c, v, p in zip(layer['客戶數量'], layer['總收入'], layer['流失率'])],
+            hoverinfo='text+z', visible=(i == 0), name=f"{size} km",
+        ))
+    fig.update_layout(
+        title=title, margin={'l': 0, 'r': 0, 't': 40, 'b': 0},
+        updatemenus=[{'type': 'buttons', 'direction': 'right', 'x': 0, 'y': 1.06, 'xanchor': 'left',
+                      'buttons': [{'label': f"{size} km", 'method': 'update',
+                                   'args': [{'visible': [j == i for j in range(len(resolutions))]}]}
+                                  for i, size in enumerate(resolutions)]}],
+    )
+    fig.update_geos(scope='usa', projection_type='albers usa', fitbounds='locations',
+                    showocean=True, oceancolor="#d2f9ff")
+    fig.write_html(path, include_plotlyjs=True)
+
+
+if __name__ == "__main__":
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    customer_df = pd.read_csv(os.path.join(base_dir, '..', 'cleaned_customer_data.csv'), encoding='utf-8-sig')
+    zip_index = ZipIndex.from_files()
+
+    start = time.perf_counter()
+    table = aggregate_hex(customer_df, zip_index)
+    print(f"{len(customer_df)} 位顧客彙總成 {len(table)} 個格子 ({len(RESOLUTIONS_KM)} 種解析度): "
+          f"{(time.perf_counter() - start) * 1000:.1f} ms")
+    print(table.groupby('解析度 (km)', sort=False).agg(格子數=('格子', 'size'), 客戶數量=('客戶數量', 'sum'),
+                                                     人口數=('人口數', 'sum')).to_string())
+
+    # 模擬 500 萬位顧客 (以實際座標加上抖動) 測試彙總時間
+    rng = np.random.default_rng(0)
+    n = 5_000_000
+    pick = rng.integers(0, len(customer_df), n)
+    synthetic = pd.DataFrame({
+        '緯度': customer_df['緯度'].to_numpy()[pick] + rng.normal(0, 0.05, n),
+        '經度': customer_df['經度'].to_numpy()[pick] + rng.normal(0, 0.05, n),
+        '總收入': customer_df['總收入'].to_numpy()[pick],
+        '客戶狀態': customer_df['客戶狀態'].to_numpy()[pick],
+    })
+    start = time.perf_counter()
+    big = aggregate_hex(synthetic, zip_index)
+    print(f"{n:,} 位模擬顧客 → {len(big)} 個格子: {time.perf_counter() - start:.2f}s")
+
+    table.to_csv(os.path.join(base_dir, 'hex_cells.csv'), index=False, encoding='utf-8-sig')
+    write_hex_map(table, os.path.join(base_dir, 'map_hex_layers.html'))
+    print("✓ 已儲存 hex_cells.csv 與 map_hex_layers.html")
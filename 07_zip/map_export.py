@@ -0,0 +1,230 @@
+import base64
+import json
+import os
+import time
+
+import numpy as np
+import plotly.colors
+import plotly.offline
+
+# 超過此點數時改用 WebGL 的 scattermap，SVG 的 scattergeo 在大量點時會明顯變慢
+WEBGL_THRESHOLD = 20000
+
+# 07_map.py 原本四張地圖的圖層設定
+DEFAULT_LAYERS = [
+    {'key': 'population', 'label': '人口數', 'title': "客戶地理分佈 - 依 '人口數' 渲染",
+     'color': '人口數', 'colorscale': 'Plasma', 'size': '客戶數量', 'size_max': 25},
+    {'key': 'customers', 'label': '客戶數量', 'title': "客戶地理分佈 - 依 '客戶數量' 渲染",
+     'color': '客戶數量', 'colorscale': 'Viridis', 'size': '客戶數量', 'size_max': 25},
+    {'key': 'penetration', 'label': '客戶滲透率 (%)', 'title': "客戶地理分佈 - 依 '客戶滲透率 (%)' 渲染",
+     'color': '客戶滲透率 (%)', 'colorscale': 'Cividis_r', 'size': '客戶數量', 'size_max': 25},
+    {'key': 'overlay', 'label': '客戶 vs 人口', 'title': "客戶與人口數量疊加對比圖 (顏色:人口, 大小:客戶)",
+     'color': '人口數', 'colorscale': 'Plasma', 'size': '客戶數量', 'size_max': 30},
+]
+# 每個點的懸停文字欄位 (城市放在標題)
+HOVER_COLUMNS = ['郵遞區號', '人口數', '客戶數量', '客戶滲透率 (%)']
+
+
+def _encode(values, dtype):
+    """把陣列編碼成 little-endian typed array 的 base64 字串。"""
+    return base64.b64encode(np.ascontiguousarray(values, dtype=np.dtype(dtype).newbyteorder('<')).tobytes()).decode()
+
+
+def _column_dtype(values):
+    if np.issubdtype(values.dtype, np.integer):
+        return ('<i4', 'Int32Array') if np.abs(values).max(initial=0) < 2 ** 31 else ('<f8', 'Float64Array')
+    return ('<f4', 'Float32Array')
+
+
+_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+{plotlyjs}
+<style>
+  body {{ margin: 0; font-family: sans-serif; }}
+  #layers {{ padding: 8px; }}
+  #layers button {{ margin-right: 4px; padding: 4px 10px; }}
+  #layers button.active {{ font-weight: bold; }}
+  #map {{ width: 100vw; height: calc(100vh - 48px); }}
+</style>
+</head>
+<body>
+<div id="layers"></div>
+<div id="map"></div>
+<script>
+(function() {{
+  var payload = {payload};
+  function decode(b64, Type) {{
+    var bin = atob(b64), bytes = new Uint8Array(bin.length);
+    for (var i = 0; i < bin.length; i++) bytes[i] = bin.charCodeAt(i);
+    return new Type(bytes.buffer);
+  }}
+  // 點資料只儲存與解碼一次，所有圖層共用同一組 typed array
+  var cols = {{}};
+  Object.keys(payload.columns).forEach(function(name) {{
+    var c = payload.columns[name];
+    cols[name] = decode(c.data, window[c.type]);
+  }});
+  var cityCode = decode(payload.city.data, window[payload.city.type]);
+  var n = cols.lat.length, text = new Array(n);
+  for (var i = 0; i < n; i++) {{
+    var parts = ['<b>' + payload.city.names[cityCode[i]] + '</b>'];
+    payload.hover.forEach(function(h) {{
+      var v = cols[h.column][i];
+      parts.push(h.column + ': ' + (h.digits === null ? v : v.toFixed(h.digits)));
+    }});
+    text[i] = parts.join('<br>');
+  }}
+
+  function trace(layer) {{
+    var size = cols[layer.size], maxSize = 0;
+    for (var i = 0; i < size.length; i++) if (size[i] > maxSize) maxSize = size[i];
+    var t = {{
+      type: payload.traceType, lat: cols.lat, lon: cols.lon, text: text, hoverinfo: 'text',
+      marker: {{
+        color: cols[layer.color], colorscale: layer.colorscale, showscale: true,
+        colorbar: {{title: {{text: layer.color}}}},
+        size: size, sizemode: 'area', sizeref: 2 * maxSize / (layer.size_max * layer.size_max), sizemin: 1
+      }}
+    }};
+    if (payload.traceType === 'scattergeo') t.marker.line = {{width: 0.5, color: 'white'}};
+    return t;
+  }}
+  function show(k) {{
+    var layer = payload.layers[k];
+    var layout = JSON.parse(JSON.stringify(payload.layout));
+    layout.title = {{text: layer.title}};
+    Plotly.react('map', [trace(layer)], layout, {{responsive: true}});
+    document.querySelectorAll('#layers button').forEach(function(b, j) {{
+      b.className = j === k ? 'active' : '';
+    }});
+  }}
+  payload.layers.forEach(function(layer, k) {{
+    var b = document.createElement('button');
+    b.textContent = layer.label;
+    b.onclick = function() {{ show(k); }};
+    document.getElementById('layers').appendChild(b);
+  }});
+  show(0);
+}})();
+</script>
+</body>
+</html>
+"""
+
+
+def export_layered_map(points, path, layers=DEFAULT_LAYERS, title='客戶地理分佈', plotlyjs='inline',
+                       renderer='auto', map_style='carto-positron', padding=1.0, bounds=None):
+    """
+    把多個圖層寫成單一 HTML。
+
+    points 需含 緯度、經度、城市 以及圖層與懸停文字用到的數值欄位；點資料以 typed array 的
+    base64 二進位只存一次，圖層切換時以 Plotly.react 重繪同一份資料。plotlyjs 可為
+    'inline' (內嵌一次)、'directory' (在輸出資料夾寫一份 plotly.min.js 並引用) 或 'cdn'。
+    回傳 {'seconds', 'bytes', 'points'}。
+    """
+    start = time.perf_counter()
+    points = points.reset_index(drop=True)
+    n = len(points)
+    if renderer == 'auto':
+        renderer = 'map' if n > WEBGL_THRESHOLD else 'geo'
+
+    numeric = {'lat': points['緯度'].to_numpy(), 'lon': points['經度'].to_numpy()}
+    for layer in layers:
+        numeric[layer['color']] = points[layer['color']].to_numpy()
+        numeric[layer['size']] = points[layer['size']].to_numpy()
+    for col in HOVER_COLUMNS:
+        if col in points:
+            numeric[col] = points[col].to_numpy()
+    columns = {}
+    for name, values in numeric.items():
+        dtype, js_type = _column_dtype(values)
+        columns[name] = {'data': _encode(values, dtype), 'type': js_type}
+
+    city_names, city_codes = np.unique(points['城市'].astype(str).to_numpy(), return_inverse=True)
+    city_dtype, city_js = ('<u2', 'Uint16Array') if len(city_names) < 2 ** 16 else ('<u4', 'Uint32Array')
+
+    if bounds is None:
+        lat, lon = numeric['lat'], numeric['lon']
+        bounds = (lon.min(), lat.min(), lon.max(), lat.max())
+    lon_min, lat_min, lon_max, lat_max = (float(b) for b in bounds)
+    if renderer == 'geo':
+        trace_type = 'scattergeo'
+        layout = {'geo': {
+            'scope': 'usa', 'projection': {'type': 'albers usa'},
+            'lataxis': {'range': [lat_min - padding, lat_max + padding]},
+            'lonaxis': {'range': [lon_min - padding, lon_max + padding]},
+            'showocean': True, 'oceancolor': '#d2f9ff',
+        }}
+    else:
+        trace_type = 'scattermap'
+        span = max(lat_max - lat_min, lon_max - lon_min, 1e-6) + 2 * padding
+        layout = {'map': {
+            'style': map_style,
+            'center': {'lat': (lat_min + lat_max) / 2, 'lon': (lon_min + lon_max) / 2},
+            'zoom': float(np.clip(np.log2(360 / span), 0, 12)),
+        }}
+    layout['margin'] = {'l': 0, 'r': 0, 't': 40, 'b': 0}
+
+    payload = {
+        'traceType': trace_type,
+        'layout': layout,
+        'columns': columns,
+        'city': {'names': city_names.tolist(), 'data': _encode(city_codes, city_dtype), 'type': city_js},
+        'hover': [{'column': c, 'digits': None if np.issubdtype(numeric[c].dtype, np.integer) else 4}
+                  for c in HOVER_COLUMNS if c in numeric],
+        'layers': [dict(layer, colorscale=plotly.colors.get_colorscale(layer['colorscale'])) for layer in layers],
+    }
+
+    out_dir = os.path.dirname(os.path.abspath(path))
+    if plotlyjs == 'inline':
+        script = f'<script type="text/javascript">{plotly.offline.get_plotlyjs()}</script>'
+    elif plotlyjs == 'directory':
+        # 既有的 plotly.min.js 版本不同 (例如升級 plotly 之後) 時重新寫入
+        bundle = os.path.join(out_dir, 'plotly.min.js')
+        header = f'plotly.js v{plotly.offline.get_plotlyjs_version()}\n'
+        current = ''
+        if os.path.exists(bundle):
+            with open(bundle, encoding='utf-8') as f:
+                current = f.read(200)
+        if header not in current:
+            with open(bundle, 'w', encoding='utf-8') as f:
+                f.write(plotly.offline.get_plotlyjs())
+        script = '<script src="plotly.min.js"></script>'
+    elif plotlyjs == 'cdn':
+        # plotly-latest 停在 v1.58.5 (沒有 scattermap)，需指定與本機 plotly 相同的版本
+        script = f'<script src="https://cdn.plot.ly/plotly-{plotly.offline.get_plotlyjs_version()}.min.js"></script>'
+    else:
+        raise ValueError(f"未知的 plotlyjs 模式: {plotlyjs}")
+
+    html = _TEMPLATE.format(title=title, plotlyjs=script,
+                            payload=json.dumps(payload, ensure_ascii=False, separators=(',', ':')).replace('</', '<\\/'))
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(html)
+    return {'seconds': time.perf_counter() - start, 'bytes': os.path.getsize(path), 'points': n}
+
+
+if __name__ == "__main__":
+    import sys
+    import tempfile
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from zip_index import ZipIndex
+
+    index = ZipIndex.from_files()
+    points = index.to_frame(coords=True).dropna(subset=['緯度', '經度'])
+    points = points[points['客戶數量'] > 0]
+
+    # 以實際郵遞區號加上微小抖動模擬 10 萬個點，測試檔案大小與產生時間
+    rng = np.random.default_rng(0)
+    synthetic = points.sample(100000, replace=True, random_state=0).reset_index(drop=True)
+    synthetic['緯度'] += rng.normal(0, 0.05, len(synthetic))
+    synthetic['經度'] += rng.normal(0, 0.05, len(synthetic))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, data in [('實際郵遞區號', points), ('模擬 10 萬點', synthetic)]:
+            for mode in ['inline', 'directory']:
+                info = export_layered_map(data, os.path.join(tmp, f'map_{mode}.html'), plotlyjs=mode)
+                print(f"{name} ({info['points']} 點, plotly.js={mode}): "
+                      f"{info['seconds']:.2f}s, {info['bytes'] / 1e6:.2f} MB")
@@ -0,0 +1,162 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from penetration_surface import PenetrationSurface
+from zip_aggregates import ZipAggregates
+from zip_index import ZipIndex
+
+# 排名運算式可使用的變數 → 彙總表欄位
+VARIABLES = {
+    'population': '人口數',
+    'customers': '客戶數量',
+    'churned': '流失數量',
+    'revenue': '總收入',
+    'mean_fee': '平均每月費用',
+    'penetration': '客戶滲透率 (%)',
+    'churn_rate': '流失率',
+    'revenue_per_capita': '人均收入',
+    'smoothed_penetration': '平滑滲透率 (%)',
+}
+# 預設排名：把滲透率提升到目標值 (%) 可新增的顧客數
+DEFAULT_RANK = 'population * (target - penetration) / 100'
+
+
+class MarketQuery:
+    """
+    在郵遞區號彙總表上查詢潛力市場。
+
+    門檻與排名運算式都是參數；只對符合門檻的郵遞區號以 argpartition 取出前 k 名再排序，
+    不需要排序整張表。多組門檻情境可一次以 (情境數, 郵遞區號數) 的矩陣批次計算。
+    """
+
+    def __init__(self, table):
+        self.table = table.reset_index(drop=True)
+        self.values = {name: self.table[col].to_numpy(dtype=float)
+                       for name, col in VARIABLES.items() if col in self.table}
+
+    @classmethod
+    def from_sources(cls, aggregates_path=None):
+        """由顧客資料 (或已儲存的 zip_aggregates.npz) 與人口資料建立，並加上平滑滲透率欄位。"""
+        index = ZipIndex.from_files()
+        if aggregates_path and os.path.exists(aggregates_path):
+            aggregates = ZipAggregates.load(aggregates_path)
+        else:
+            customer_df = pd.read_csv(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                                                   'cleaned_customer_data.csv'), encoding='utf-8-sig')
+            aggregates = ZipAggregates.from_frame(customer_df)
+        table = aggregates.to_frame(index)
+        table['平滑滲透率 (%)'] = PenetrationSurface.from_index(index).sample_zips(index, table['郵遞區號'].to_numpy())
+        return cls(table)
+
+    def score(self, rank=DEFAULT_RANK, target=0.5):
+        """計算排名運算式；target 可為純量或 (情境數, 1) 陣列。"""
+        local = dict(self.values, target=target)
+        return np.asarray(pd.eval(rank, local_dict=local, engine='python'), dtype=float)
+
+    def _mask(self, min_population, max_penetration, max_population=None, min_penetration=None,
+              penetration_var='penetration'):
+        pop, pen = self.values['population'], self.values[penetration_var]
+        mask = (pop > min_population) & (pen < max_penetration)
+        if max_population is not None:
+            mask &= pop <= max_population
+        if min_penetration is not None:
+            mask &= pen >= min_penetration
+        return mask
+
+    def top_k(self, min_population=20000, max_penetration=0.5, rank=DEFAULT_RANK, k=20, target=0.5,
+              max_population=None, min_penetration=None, penetration_var='penetration'):
+        """
+        回傳 人口數 > min_population 且 滲透率 < max_penetration (%) 的郵遞區號中，
+        排名運算式分數最高的 k 個 (依分數由高到低)。penetration_var 指定門檻所用的滲透率
+        變數 (例如 'smoothed_penetration')，該值為 NaN 的郵遞區號不會入選。
+        """
+        mask = self._mask(min_population, max_penetration, max_population, min_penetration, penetration_var)
+        score = np.broadcast_to(self.score(rank, target), mask.shape)
+        rows = np.flatnonzero(mask)
+        if len(rows) > k:
+            rows = rows[np.argpartition(-score[rows], k - 1)[:k]]
+        rows = rows[np.argsort(-score[rows], kind='stable')]
+        return self.table.iloc[rows].assign(分數=score[rows])
+
+    def batch(self, scenarios, rank=DEFAULT_RANK, k=20, penetration_var='penetration'):
+        """
+        一次計算多組情境。scenarios 為含 min_population、max_penetration、target 欄位的表，
+        回傳長表 (情境, 名次, 郵遞區號欄位..., 分數)。
+        """
+        scenarios = scenarios.reset_index(drop=True)
+        pop, pen = self.values['population'], self.values[penetration_var]
+        mask = ((pop[None, :] > scenarios['min_population'].to_numpy(dtype=float)[:, None])
+                & (pen[None, :] < scenarios['max_penetration'].to_numpy(dtype=float)[:, None]))
+        target = scenarios['target'].to_numpy(dtype=float)[:, None] if 'target' in scenarios else 0.5
+        score = np.broadcast_to(self.score(rank, target), mask.shape)
+        masked = np.where(mask, score, -np.inf)
+
+        kk = min(k, masked.shape[1])
+        top = np.argpartition(-masked, kk - 1, axis=1)[:, :kk] if kk < masked.shape[1] \
+            else np.tile(np.arange(masked.shape[1]), (len(masked), 1))
+        order = np.argsort(-np.take_along_axis(masked, top, axis=1), axis=1, kind='stable')
+        top = np.take_along_axis(top, order, axis=1)
+        top_score = np.take_along_axis(masked, top, axis=1)
+
+        scenario, rank_pos = np.nonzero(np.isfinite(top_score))
+        rows = top[scenario, rank_pos]
+        result = self.table.iloc[rows].reset_index(drop=True)
+        result.insert(0, '情境', scenario)
+        result.insert(1, '名次', rank_pos + 1)
+        result['分數'] = top_score[scenario, rank_pos]
+        return result
+
+
+def _scenario_grid(text):
+    return [float(x) for x in text.split(',')]
+
+
+if __name__ == "__main__":
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="高人口、低滲透率潛力市場的 top-k 查詢")
+    parser.add_argument('--min-population', type=float, default=20000, help="人口數下限 (不含)")
+    parser.add_argument('--max-penetration', type=float, default=0.5, help="滲透率上限 (%%，不含)")
+    parser.add_argument('--target', type=float, default=0.5, help="目標滲透率 (%%)，可用於排名運算式")
+    parser.add_argument('--rank', default=DEFAULT_RANK,
+                        help=f"排名運算式，可用變數: {', '.join(VARIABLES)}, target")
+    parser.add_argument('--k', type=int, default=20)
+    parser.add_argument('--scenarios', help="情境 CSV (min_population, max_penetration[, target])")
+    parser.add_argument('--grid', nargs=3, metavar=('POPULATIONS', 'PENETRATIONS', 'TARGETS'),
+                        type=_scenario_grid, help="以逗號分隔的值產生所有門檻組合，例如 10000,20000 0.2,0.5 0.5,1")
+    parser.add_argument('--penetration-var', default='penetration', choices=['penetration', 'smoothed_penetration'],
+                        help="門檻使用的滲透率 (原始或平滑)")
+    parser.add_argument('--output', help="結果輸出 CSV 路徑")
+    args = parser.parse_args()
+
+    query = MarketQuery.from_sources(os.path.join(base_dir, 'zip_aggregates.npz'))
+    pd.options.display.float_format = '{:.4f}'.format
+
+    start = time.perf_counter()
+    if args.scenarios or args.grid:
+        if args.scenarios:
+            scenarios = pd.read_csv(args.scenarios)
+        else:
+            scenarios = pd.MultiIndex.from_product(
+                args.grid, names=['min_population', 'max_penetration', 'target']).to_frame(index=False)
+        result = query.batch(scenarios, rank=args.rank, k=args.k, penetration_var=args.penetration_var)
+        elapsed = time.perf_counter() - start
+        print(f"{len(scenarios)} 組情境, 每組前 {args.k} 名, 耗時 {elapsed * 1000:.1f} ms")
+        summary = result.groupby('情境').agg(郵遞區號數=('郵遞區號', 'size'), 總分數=('分數', 'sum'))
+        print(scenarios.join(summary).to_string())
+    else:
+        result = query.top_k(args.min_population, args.max_penetration, args.rank, args.k, args.target,
+                             penetration_var=args.penetration_var)
+        elapsed = time.perf_counter() - start
+        print(f"人口數 > {args.min_population:g}、滲透率 < {args.max_penetration:g}% 的前 {args.k} 名 "
+              f"(排名: {args.rank}), 耗時 {elapsed * 1000:.2f} ms")
+        print(result.to_string(index=False))
+
+    if args.output:
+        result.to_csv(args.output, index=False, encoding='utf-8-sig')
+        print(f"\n結果已儲存至: {args.output}")
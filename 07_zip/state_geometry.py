@@ -0,0 +1,264 @@
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from zip_index import ZipIndex
+
+KML_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cb_2018_us_state_20m.kml')
+_KML_NS = {'kml': 'http://www.opengis.net/kml/2.2'}
+
+# 格網索引的格子大小 (度)
+CELL_DEG = 0.5
+
+
+class StateBoundaries:
+    """
+    美國各州邊界 (cb_2018_us_state_20m.kml) 的緊湊 NumPy 表示。
+
+    所有多邊形環的頂點存在一個 (頂點數, 2) 陣列，以 ring_offsets 切分，並保存每個環所屬的州
+    與外接矩形。點所屬州的判斷先查經緯度格網：完全沒有邊界經過的格子直接使用格子中心的
+    結果；其餘點只對同一緯度帶的邊做向量化射線法 (ray casting) 計數，奇數次即在該州內。
+    """
+
+    def __init__(self, codes, names, vertices, ring_offsets, ring_state, cell_deg=CELL_DEG):
+        self.codes = np.asarray(codes, dtype=str)          # 州代碼 (STUSPS)
+        self.names = np.asarray(names, dtype=str)
+        self.vertices = vertices                           # (頂點數, 2) 經度, 緯度
+        self.ring_offsets = ring_offsets                   # 第 i 個環為 vertices[ring_offsets[i]:ring_offsets[i+1]]
+        self.ring_state = ring_state                       # 每個環所屬州的索引
+        self.cell_deg = float(cell_deg)
+        self.ring_bbox = np.array([
+            [*vertices[a:b].min(axis=0), *vertices[a:b].max(axis=0)]
+            for a, b in zip(ring_offsets[:-1], ring_offsets[1:])
+        ]).reshape(-1, 4)                                  # (環數, 4) lon_min, lat_min, lon_max, lat_max
+        self._build_index()
+
+    # ---------- 建立 ----------
+    @classmethod
+    def from_kml(cls, path=KML_PATH, cell_deg=CELL_DEG):
+        """解析 KML 的州多邊形 (含 MultiGeometry 與內環)。"""
+        root = ET.parse(path).getroot()
+        codes, names, rings, ring_state = [], [], [], []
+        for placemark in root.iter('{%s}Placemark' % _KML_NS['kml']):
+            data = {d.get('name'): d.text for d in placemark.iter('{%s}SimpleData' % _KML_NS['kml'])}
+            state = len(codes)
+            codes.append(data['STUSPS'])
+            names.append(data['NAME'])
+            for coords in placemark.iter('{%s}coordinates' % _KML_NS['kml']):
+                ring = np.array([p.split(',')[:2] for p in coords.text.split()], dtype=float)
+                rings.append(ring)
+                ring_state.append(state)
+        lengths = np.array([len(r) for r in rings], dtype=np.int64)
+        offsets = np.zeros(len(rings) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return cls(codes, names, np.vstack(rings), offsets, np.array(ring_state, dtype=np.int64), cell_deg)
+
+    @classmethod
+    def load_cached(cls, kml_path=KML_PATH, cell_deg=CELL_DEG):
+        """第一次解析 KML 後存成同名 .npz，之後直接讀取陣列。"""
+        cache = os.path.splitext(kml_path)[0] + '.npz'
+        if os.path.exists(cache) and os.path.getmtime(cache) >= os.path.getmtime(kml_path):
+            return cls.load(cache, cell_deg)
+        boundaries = cls.from_kml(kml_path, cell_deg)
+        boundaries.save(cache)
+        return boundaries
+
+    def save(self, path):
+        np.savez(path, codes=self.codes, names=self.names, vertices=self.vertices,
+                 ring_offsets=self.ring_offsets, ring_state=self.ring_state)
+
+    @classmethod
+    def load(cls, path, cell_deg=CELL_DEG):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['codes'], data['names'], data['vertices'], data['ring_offsets'],
+                       data['ring_state'], cell_deg)
+
+    # ---------- 索引 ----------
+    def _build_index(self):
+        v = self.vertices
+        # 每個環的邊：起點到下一個頂點 (KML 的環已封閉，最後一點等於第一點)
+        start = np.ones(len(v), dtype=bool)
+        start[self.ring_offsets[1:] - 1] = False
+        idx = np.flatnonzero(start)
+        self.edges = np.hstack([v[idx], v[idx + 1]])                       # (邊數, 4) x1, y1, x2, y2
+        self.edge_ring = np.repeat(np.arange(len(self.ring_state)), np.diff(self.ring_offsets) - 1)
+        self.edge_state = self.ring_state[self.edge_ring]
+        self._edge_cache = {}
+
+        self.origin = v.min(axis=0) - self.cell_deg
+        self.shape = (np.ceil((v.max(axis=0) + self.cell_deg - self.origin) / self.cell_deg)).astype(int) + 1
+        nx, ny = self.shape
+
+        # 緯度帶 → 與該帶重疊的邊 (CSR)
+        y_lo = self._cell(self.edges[:, [1, 3]].min(axis=1), 1)
+        y_hi = self._cell(self.edges[:, [1, 3]].max(axis=1), 1)
+        rows = np.repeat(np.arange(len(self.edges)), y_hi - y_lo + 1)
+        bands = np.concatenate([np.arange(a, b + 1) for a, b in zip(y_lo, y_hi)])
+        order = np.argsort(bands, kind='stable')
+        self.band_edges = rows[order]
+        self.band_offsets = np.searchsorted(bands[order], np.arange(ny + 1))
+
+        # 有邊經過的格子 (以邊的外接矩形保守標記)
+        x_lo = self._cell(self.edges[:, [0, 2]].min(axis=1), 0)
+        x_hi = self._cell(self.edges[:, [0, 2]].max(axis=1), 0)
+        boundary = np.zeros((nx, ny), dtype=bool)
+        for a, b, c, d in zip(x_lo, x_hi, y_lo, y_hi):
+            boundary[a:b + 1, c:d + 1] = True
+        self.boundary_cell = boundary
+
+        # 沒有邊經過的格子整格屬於同一州 (或都不屬於任何州)，以格子中心判斷一次
+        gx, gy = np.nonzero(~boundary)
+        centers_lon = self.origin[0] + (gx + 0.5) * self.cell_deg
+        centers_lat = self.origin[1] + (gy + 0.5) * self.cell_deg
+        self.cell_state = np.full((nx, ny), -1, dtype=np.int64)
+        self.cell_state[gx, gy] = self._ray_cast(centers_lon, centers_lat, by_cell=False)
+
+    def _cell(self, values, axis):
+        return np.floor((values - self.origin[axis]) / self.cell_deg).astype(np.int64)
+
+    def _candidate_edges(self, j, i=None):
+        """
+        緯度帶 j 中可能被點的向右射線穿過的邊；給定格子欄 i 時，再只保留外接矩形涵蓋該格、
+        且在格子左緣右側的環的邊 (結果依格子快取)。
+        """
+        key = (j, i)
+        cached = self._edge_cache.get(key)
+        if cached is None:
+            ids = self.band_edges[self.band_offsets[j]:self.band_offsets[j + 1]]
+            if i is not None:
+                left = self.origin[0] + i * self.cell_deg
+                box = self.ring_bbox[self.edge_ring[ids]]
+                keep = ((self.edges[ids][:, [0, 2]].max(axis=1) >= left)
+                        & (box[:, 0] <= left + self.cell_deg) & (box[:, 2] >= left))
+                ids = ids[keep]
+            x1, y1, x2, y2 = self.edges[ids].T
+            states, local = np.unique(self.edge_state[ids], return_inverse=True)
+            onehot = np.zeros((len(ids), len(states)), dtype=np.int32)
+            onehot[np.arange(len(ids)), local] = 1
+            cached = self._edge_cache[key] = (x1, y1, x2, y2, states, onehot)
+        return cached
+
+    def _ray_cast(self, lon, lat, by_cell=True, chunk=4096):
+        """
+        射線法：每個點向右的射線與候選邊的交點數依州累計，奇數即在州內。
+        點依格子 (by_cell=False 時依緯度帶) 分組，每組只檢查該組的候選邊。
+        """
+        result = np.full(len(lon), -1, dtype=np.int64)
+        band = np.clip(self._cell(lat, 1), 0, self.shape[1] - 1)
+        column = np.clip(self._cell(lon, 0), 0, self.shape[0] - 1) if by_cell else np.zeros_like(band)
+        key = band * self.shape[0] + column
+        order = np.argsort(key, kind='stable')
+        starts = np.flatnonzero(np.r_[True, key[order][1:] != key[order][:-1]]) if len(key) else []
+        for start, stop in zip(starts, np.r_[starts[1:], len(key)]):
+            first = order[start]
+            x1, y1, x2, y2, states, onehot = self._candidate_edges(
+                band[first], column[first] if by_cell else None)
+            if len(states) == 0:
+                continue
+            pts = order[start:stop]
+            for s in range(0, len(pts), chunk):
+                p = pts[s:s + chunk]
+                px, py = lon[p, None], lat[p, None]
+                straddle = (y1 > py) != (y2 > py)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    x_cross = x1 + (py - y1) * (x2 - x1) / (y2 - y1)
+                inside = (((straddle & (px < x_cross)).astype(np.int32) @ onehot) & 1).astype(bool)
+                result[p] = np.where(inside.any(axis=1), states[inside.argmax(axis=1)], -1)
+        return result
+
+    # ---------- 查詢 ----------
+    def assign(self, lat, lon):
+        """回傳每個點所屬州的索引 (不在任何州內為 -1)。"""
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        result = np.full(len(lat), -1, dtype=np.int64)
+        finite = np.isfinite(lat) & np.isfinite(lon)
+        cx = self._cell(np.where(finite, lon, self.origin[0] - 1), 0)
+        cy = self._cell(np.where(finite, lat, self.origin[1] - 1), 1)
+        in_grid = (cx >= 0) & (cx < self.shape[0]) & (cy >= 0) & (cy < self.shape[1])
+        grid = np.flatnonzero(in_grid)
+        boundary = self.boundary_cell[cx[grid], cy[grid]]
+        interior = grid[~boundary]
+        result[interior] = self.cell_state[cx[interior], cy[interior]]
+        edge_pts = grid[boundary]
+        result[edge_pts] = self._ray_cast(lon[edge_pts], lat[edge_pts])
+        return result
+
+    def state_codes(self, lat, lon, outside=''):
+        idx = self.assign(lat, lon)
+        return np.where(idx >= 0, self.codes[np.maximum(idx, 0)], outside)
+
+    def assign_zips(self, zip_index, zips=None):
+        """回傳郵遞區號中心點 (ZipIndex 的經緯度) 所屬州的索引，沒有座標的為 -1。"""
+        zips = zip_index.zips if zips is None else np.asarray(zips, dtype=np.int64)
+        return self.assign(zip_index.lat[zips], zip_index.lon[zips])
+
+    def bbox(self, codes):
+        """回傳指定州 (一個或多個) 的外接矩形 (lon_min, lat_min, lon_max, lat_max)。"""
+        states = np.flatnonzero(np.isin(self.codes, np.atleast_1d(codes)))
+        boxes = self.ring_bbox[np.isin(self.ring_state, states)]
+        return (*boxes[:, :2].min(axis=0), *boxes[:, 2:].max(axis=0))
+
+    def aggregate(self, customers, expected=None):
+        """
+        依所屬州彙總顧客：顧客數、總收入、流失數；若給定 expected (州代碼)，
+        不在該州內的點另外計為「州外座標」。回傳 (彙總表, 每位顧客的州代碼)。
+        """
+        idx = self.assign(customers['緯度'].to_numpy(), customers['經度'].to_numpy())
+        k = len(self.codes) + 1                             # 最後一格代表不在任何州內
+        slot = np.where(idx >= 0, idx, k - 1)
+        count = np.bincount(slot, minlength=k)
+        table = pd.DataFrame({
+            '州': np.append(self.codes, '(州外)'),
+            '州名': np.append(self.names, '-'),
+            '客戶數量': count,
+            '總收入': np.bincount(slot, weights=customers['總收入'].to_numpy(dtype=float), minlength=k),
+            '流失數量': np.bincount(slot, weights=(customers['客戶狀態'] == 'Churned').to_numpy(),
+                                minlength=k).astype(np.int64),
+        })
+        table = table[table['客戶數量'] > 0].reset_index(drop=True)
+        codes = np.where(idx >= 0, self.codes[np.maximum(idx, 0)], '')
+        if expected is not None:
+            table['州外座標'] = np.where(table['州'] == expected, 0, table['客戶數量'])
+        return table, codes
+
+
+if __name__ == "__main__":
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    start = time.perf_counter()
+    boundaries = StateBoundaries.from_kml()
+    print(f"解析 KML: {len(boundaries.codes)} 州, {len(boundaries.ring_state)} 個環, "
+          f"{len(boundaries.vertices)} 個頂點, {time.perf_counter() - start:.2f}s")
+
+    customer_df = pd.read_csv(os.path.join(base_dir, '..', 'cleaned_customer_data.csv'), encoding='utf-8-sig')
+    start = time.perf_counter()
+    table, codes = boundaries.aggregate(customer_df, expected='CA')
+    print(f"{len(customer_df)} 位顧客判斷所屬州: {(time.perf_counter() - start) * 1000:.1f} ms")
+    print(table.to_string(index=False))
+    outside = customer_df.loc[codes != 'CA', ['客戶編號', '城市', '郵遞區號', '緯度', '經度']]
+    if len(outside):
+        print("\n座標不在加州內的顧客:")
+        print(outside.to_string(index=False))
+
+    zip_index = ZipIndex.from_files()
+    has_coords = ~np.isnan(zip_index.lat[zip_index.zips])
+    zip_states = boundaries.assign_zips(zip_index)[has_coords]
+    print(f"\n{has_coords.sum()} 個有座標的郵遞區號中心點: "
+          f"{pd.Series(np.where(zip_states >= 0, boundaries.codes[np.maximum(zip_states, 0)], '(州外)')).value_counts().to_dict()}")
+
+    # 以加州外接矩形內的隨機點測試大量資料
+    rng = np.random.default_rng(0)
+    lon_min, lat_min, lon_max, lat_max = boundaries.bbox('CA')
+    n = 2_000_000
+    lat = rng.uniform(lat_min, lat_max, n)
+    lon = rng.uniform(lon_min, lon_max, n)
+    start = time.perf_counter()
+    states = boundaries.assign(lat, lon)
+    elapsed = time.perf_counter() - start
+    share = pd.Series(np.where(states >= 0, boundaries.codes[np.maximum(states, 0)], '(州外)')).value_counts(normalize=True)
+    print(f"\n{n:,} 個隨機點: {elapsed:.2f}s, 分布 {share.round(3).to_dict()}")
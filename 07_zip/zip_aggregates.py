@@ -0,0 +1,241 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from zip_index import ZIP_SPACE, ZipIndex, _as_zip
+
+# 每位顧客對各郵遞區號累計值的貢獻欄位
+CUSTOMER_FIELDS = ['zip', 'churned', 'revenue', 'fee']
+# 事件表中對應的欄位 (依 insert / update 的參數順序)
+EVENT_COLUMNS = {'zip': '郵遞區號', 'revenue': '總收入', 'fee': '每月費用'}
+
+
+class ZipAggregates:
+    """
+    依郵遞區號直接定址、持續維護的彙總表：顧客數、流失數、總收入加總、每月費用加總。
+
+    另外保存每位顧客目前的 (郵遞區號, 是否流失, 總收入, 每月費用)，新增 / 更新 / 流失事件
+    只需扣掉舊貢獻、加上新貢獻，不必重新 groupby 全部顧客；滲透率、流失率、人均收入
+    隨時可在郵遞區號數量的成本內查詢。
+    """
+
+    def __init__(self, customer_ids=(), zips=(), churned=(), revenue=(), fee=()):
+        self.count = np.zeros(ZIP_SPACE, dtype=np.int64)
+        self.churned = np.zeros(ZIP_SPACE, dtype=np.int64)
+        self.revenue = np.zeros(ZIP_SPACE)
+        self.fee = np.zeros(ZIP_SPACE)
+
+        self._ids = np.empty(0, dtype=object)
+        self._state = {f: np.empty(0, dtype=dt) for f, dt in
+                       zip(CUSTOMER_FIELDS, [np.int64, bool, float, float])}
+        self._pos = {}
+        self._size = 0
+        if len(customer_ids):
+            self.insert(customer_ids, zips, revenue, fee, churned)
+
+    @classmethod
+    def from_frame(cls, df):
+        """由顧客資料 (客戶編號, 郵遞區號, 總收入, 每月費用, 客戶狀態) 一次建立。"""
+        return cls(df['客戶編號'].to_numpy(), df['郵遞區號'].to_numpy(),
+                   (df['客戶狀態'] == 'Churned').to_numpy(),
+                   df['總收入'].to_numpy(dtype=float), df['每月費用'].to_numpy(dtype=float))
+
+    def __len__(self):
+        return self._size
+
+    # ---------- 內部：貢獻的加減 ----------
+    def _apply(self, zips, churned, revenue, fee, sign):
+        """以 np.add.at 只更新事件涉及的郵遞區號，成本與批次大小成正比。"""
+        np.add.at(self.count, zips, sign)
+        np.add.at(self.churned, zips, sign * np.asarray(churned, dtype=np.int64))
+        np.add.at(self.revenue, zips, sign * np.asarray(revenue, dtype=float))
+        np.add.at(self.fee, zips, sign * np.asarray(fee, dtype=float))
+
+    def _positions(self, customer_ids):
+        try:
+            return np.array([self._pos[c] for c in customer_ids], dtype=np.int64)
+        except KeyError as e:
+            raise KeyError(f"找不到顧客 {e.args[0]}") from None
+
+    def _grow(self, n_new):
+        need = self._size + n_new
+        if need > len(self._ids):
+            capacity = max(need, 2 * len(self._ids), 1024)
+            self._ids = np.resize(self._ids, capacity)
+            for f in CUSTOMER_FIELDS:
+                self._state[f] = np.resize(self._state[f], capacity)
+
+    # ---------- 事件 ----------
+    def insert(self, customer_ids, zips, revenue, fee, churned=False):
+        """新增顧客 (可為單筆或批次)。"""
+        customer_ids = np.atleast_1d(np.asarray(customer_ids, dtype=object))
+        n = len(customer_ids)
+        zips = np.broadcast_to(_as_zip(np.atleast_1d(zips)), n)
+        churned = np.broadcast_to(np.asarray(churned, dtype=bool), n)
+        revenue = np.broadcast_to(np.asarray(revenue, dtype=float), n)
+        fee = np.broadcast_to(np.asarray(fee, dtype=float), n)
+        if len(set(customer_ids)) != n or any(c in self._pos for c in customer_ids):
+            raise ValueError("新增的客戶編號重複或已存在")
+
+        self._grow(n)
+        rows = np.arange(self._size, self._size + n)
+        self._ids[rows] = customer_ids
+        for f, values in zip(CUSTOMER_FIELDS, [zips, churned, revenue, fee]):
+            self._state[f][rows] = values
+        self._pos.update(zip(customer_ids, rows.tolist()))
+        self._size += n
+        self._apply(zips, churned, revenue, fee, +1)
+
+    def update(self, customer_ids, zips=None, revenue=None, fee=None, churned=None):
+        """更新既有顧客的欄位 (None 代表不變)；同一批次中的客戶編號不可重複。"""
+        customer_ids = np.atleast_1d(np.asarray(customer_ids, dtype=object))
+        rows = self._positions(customer_ids)
+        if len(np.unique(rows)) != len(rows):
+            raise ValueError("同一批次更新的客戶編號不可重複")
+        old = [self._state[f][rows] for f in CUSTOMER_FIELDS]
+        self._apply(*old, -1)
+
+        new = {'zip': zips, 'churned': churned, 'revenue': revenue, 'fee': fee}
+        for f in CUSTOMER_FIELDS:
+            if new[f] is not None:
+                values = _as_zip(np.atleast_1d(new[f])) if f == 'zip' else new[f]
+                self._state[f][rows] = values
+        self._apply(*[self._state[f][rows] for f in CUSTOMER_FIELDS], +1)
+
+    def churn(self, customer_ids):
+        """標記顧客流失。"""
+        self.update(customer_ids, churned=True)
+
+    def apply_events(self, events):
+        """
+        依序套用事件表 (欄位: event, 客戶編號, 郵遞區號, 總收入, 每月費用)。
+        insert 事件的欄位必須完整；update 事件中缺失 (NaN) 的欄位沿用顧客目前的值。
+        連續同類型且客戶不重複的事件會合併成一次向量化更新。
+        """
+        kinds = events['event'].to_numpy()
+        ids = events['客戶編號'].to_numpy()
+        starts = np.flatnonzero(np.r_[True, kinds[1:] != kinds[:-1]])
+        for start, stop in zip(starts, np.r_[starts[1:], len(events)]):
+            for part in _unique_runs(ids[start:stop]):
+                batch = events.iloc[start + part.start:start + part.stop]
+                kind = kinds[start]
+                values = [batch[col].to_numpy(dtype=float) for col in EVENT_COLUMNS.values()]
+                if kind == 'insert':
+                    missing = [col for col, v in zip(EVENT_COLUMNS.values(), values) if np.isnan(v).any()]
+                    if missing:
+                        raise ValueError(f"insert 事件缺少欄位: {missing}")
+                    self.insert(batch['客戶編號'].to_numpy(), *values)
+                elif kind == 'update':
+                    rows = self._positions(batch['客戶編號'].to_numpy())
+                    merged = [np.where(np.isnan(v), self._state[f][rows], v) for f, v in zip(EVENT_COLUMNS, values)]
+                    self.update(batch['客戶編號'].to_numpy(), *merged)
+                elif kind == 'churn':
+                    self.churn(batch['客戶編號'].to_numpy())
+                else:
+                    raise ValueError(f"未知的事件類型: {kind}")
+
+    # ---------- 查詢 ----------
+    def _rate(self, num, den):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(den > 0, num / np.where(den > 0, den, 1), 0.0)
+
+    def penetration(self, population, zips):
+        """客戶滲透率 (%)。population 為郵遞區號直接定址的人口陣列 (ZipIndex.population)。"""
+        return self._rate(self.count[zips] * 100, population[zips])
+
+    def churn_rate(self, zips):
+        return self._rate(self.churned[zips], self.count[zips])
+
+    def revenue_per_capita(self, population, zips):
+        return self._rate(self.revenue[zips], population[zips])
+
+    def mean_fee(self, zips):
+        return self._rate(self.fee[zips], self.count[zips])
+
+    def to_frame(self, index, zips=None):
+        """搭配 ZipIndex 產生各郵遞區號的彙總與比率表 (預設為人口資料中的所有郵遞區號)。"""
+        zips = index.zips if zips is None else _as_zip(zips)
+        return pd.DataFrame({
+            '郵遞區號': zips,
+            '城市': index.city(zips),
+            '人口數': index.population[zips],
+            '客戶數量': self.count[zips],
+            '流失數量': self.churned[zips],
+            '總收入': self.revenue[zips],
+            '平均每月費用': self.mean_fee(zips),
+            '客戶滲透率 (%)': self.penetration(index.population, zips),
+            '流失率': self.churn_rate(zips),
+            '人均收入': self.revenue_per_capita(index.population, zips),
+        })
+
+    # ---------- 讀寫 ----------
+    def save(self, path):
+        n = self._size
+        np.savez_compressed(path, customer_ids=self._ids[:n].astype(str),
+                            **{f: self._state[f][:n] for f in CUSTOMER_FIELDS})
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['customer_ids'], data['zip'], data['churned'], data['revenue'], data['fee'])
+
+
+def _unique_runs(ids):
+    """把序列切成客戶編號不重複的連續區段。"""
+    runs, seen, start = [], set(), 0
+    for i, c in enumerate(ids):
+        if c in seen:
+            runs.append(slice(start, i))
+            seen, start = set(), i
+        seen.add(c)
+    runs.append(slice(start, len(ids)))
+    return runs
+
+
+if __name__ == "__main__":
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    customer_df = pd.read_csv(os.path.join(base_dir, '..', 'cleaned_customer_data.csv'), encoding='utf-8-sig')
+    index = ZipIndex.from_files()
+
+    # 以前面的顧客建立初始彙總，其餘顧客與部分異動以事件串流套用
+    initial, arriving = customer_df.iloc[:6000], customer_df.iloc[6000:]
+    aggregates = ZipAggregates.from_frame(initial.assign(客戶狀態='Stayed'))
+
+    rng = np.random.default_rng(0)
+    moved = initial.sample(300, random_state=0)
+    events = pd.concat([
+        arriving.assign(event='insert'),
+        moved.assign(event='update', 郵遞區號=rng.choice(index.zips, len(moved)),
+                     每月費用=moved['每月費用'] + 5),
+        # 只帶總收入的異動：郵遞區號與每月費用為 NaN，沿用目前的值
+        moved.assign(event='update', 郵遞區號=np.nan, 每月費用=np.nan, 總收入=moved['總收入'] + 10),
+        customer_df[customer_df['客戶狀態'] == 'Churned'].assign(event='churn'),
+    ], ignore_index=True)
+
+    start = time.perf_counter()
+    aggregates.apply_events(events)
+    t_events = time.perf_counter() - start
+    start = time.perf_counter()
+    table = aggregates.to_frame(index)
+    t_query = time.perf_counter() - start
+
+    # 與直接對最終狀態重新 groupby 的結果比對
+    final = customer_df.set_index('客戶編號')
+    final.loc[moved['客戶編號'], '郵遞區號'] = events.loc[events['event'] == 'update', '郵遞區號'].to_numpy()[:len(moved)]
+    final.loc[moved['客戶編號'], '每月費用'] = moved['每月費用'].to_numpy() + 5
+    final.loc[moved['客戶編號'], '總收入'] = moved['總收入'].to_numpy() + 10
+    start = time.perf_counter()
+    expected = final.assign(流失=final['客戶狀態'] == 'Churned').groupby('郵遞區號').agg(
+        客戶數量=('城市', 'size'), 流失數量=('流失', 'sum'), 總收入=('總收入', 'sum'), 平均每月費用=('每月費用', 'mean'))
+    t_groupby = time.perf_counter() - start
+
+    got = table.set_index('郵遞區號').loc[expected.index]
+    same = all(np.allclose(got[c], expected[c]) for c in expected.columns)
+    print(f"套用 {len(events)} 筆事件: {t_events * 1000:.1f} ms, 查詢全部比率: {t_query * 1000:.1f} ms, "
+          f"重新 groupby: {t_groupby * 1000:.1f} ms")
+    print(f"與重新計算結果一致: {same}")
+    print(table.sort_values('流失率', ascending=False).head(10).to_string(index=False))
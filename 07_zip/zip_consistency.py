@@ -0,0 +1,116 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from geo import EARTH_RADIUS_KM
+from zip_index import _as_zip, median_centroids
+
+# 顧客座標與其郵遞區號中心點距離超過此值 (公里) 即視為可疑
+MAX_DISTANCE_KM = 20.0
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """兩組經緯度之間的大圓距離 (公里，向量化)。"""
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dphi = phi2 - phi1
+    dlam = np.radians(np.asarray(lon2, dtype=float) - lon1)
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlam / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def _unit_vectors(lat, lon):
+    phi, lam = np.radians(lat), np.radians(lon)
+    return np.stack([np.cos(phi) * np.cos(lam), np.cos(phi) * np.sin(lam), np.sin(phi)], axis=-1)
+
+
+def nearest_zip(lat, lon, centroid_lat, centroid_lon, chunk=8192):
+    """
+    回傳每個座標最近的郵遞區號中心點 (郵遞區號, 距離 km)。centroid_lat / centroid_lon 為
+    直接定址的中心點陣列 (NaN 代表沒有中心點)；以單位向量內積取最大值 (等同大圓距離最小)，
+    分塊做矩陣乘法。
+    """
+    zips = np.flatnonzero(~np.isnan(centroid_lat))
+    centers = _unit_vectors(centroid_lat[zips], centroid_lon[zips])
+    points = _unit_vectors(np.asarray(lat, dtype=float), np.asarray(lon, dtype=float))
+    best = np.empty(len(points), dtype=np.int64)
+    for s in range(0, len(points), chunk):
+        best[s:s + chunk] = np.argmax(points[s:s + chunk] @ centers.T, axis=1)
+    nearest = zips[best]
+    return nearest, haversine_km(lat, lon, centroid_lat[nearest], centroid_lon[nearest])
+
+
+def check_coordinates(customers, centroids=None, max_km=MAX_DISTANCE_KM):
+    """
+    檢查每位顧客的座標與其郵遞區號中心點是否一致。
+
+    centroids 為直接定址的 (緯度, 經度) 陣列 (例如 ZipIndex 的 lat / lon)，預設為 customers 本身
+    各郵遞區號的中位數座標，因此不受少數錯誤座標影響。回傳每位顧客一列的表：距離中心 (km)、
+    是否異常，以及異常者最近的中心點郵遞區號 (建議郵遞區號，與原本相同時為 -1) 與距離。
+    """
+    own = _as_zip(customers['郵遞區號'])
+    lat = customers['緯度'].to_numpy(dtype=float)
+    lon = customers['經度'].to_numpy(dtype=float)
+    centroid_lat, centroid_lon = median_centroids(own, lat, lon) if centroids is None else centroids
+    distance = haversine_km(lat, lon, centroid_lat[own], centroid_lon[own])
+    flagged = ~(distance <= max_km)                   # 沒有中心點 (NaN) 也視為異常
+
+    report = pd.DataFrame({
+        '客戶編號': customers['客戶編號'].to_numpy(),
+        '郵遞區號': own,
+        '緯度': lat,
+        '經度': lon,
+        '距離中心 (km)': distance,
+        '異常': flagged,
+        '建議郵遞區號': -1,
+        '建議距離 (km)': np.nan,
+    })
+    rows = np.flatnonzero(flagged)
+    if len(rows):
+        suggested, suggested_km = nearest_zip(lat[rows], lon[rows], centroid_lat, centroid_lon)
+        report.loc[rows, '建議郵遞區號'] = np.where(suggested != own[rows], suggested, -1)
+        report.loc[rows, '建議距離 (km)'] = suggested_km
+    return report
+
+
+if __name__ == "__main__":
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="檢查顧客郵遞區號與經緯度是否一致")
+    parser.add_argument('--max-km', type=float, default=MAX_DISTANCE_KM, help="與郵遞區號中心點的最大距離 (公里)")
+    parser.add_argument('--output', help="異常清單輸出 CSV 路徑")
+    args = parser.parse_args()
+
+    customer_df = pd.read_csv(os.path.join(base_dir, '..', 'cleaned_customer_data.csv'), encoding='utf-8-sig')
+    start = time.perf_counter()
+    report = check_coordinates(customer_df, max_km=args.max_km)
+    print(f"{len(report)} 位顧客檢查完成: {(time.perf_counter() - start) * 1000:.1f} ms, "
+          f"異常 {int(report['異常'].sum())} 位, 最大距離 {report['距離中心 (km)'].max():.3f} km")
+    if args.output:
+        report[report['異常']].to_csv(args.output, index=False, encoding='utf-8-sig')
+
+    # 模擬 1% 顧客的郵遞區號被填錯 (座標正確)，檢查能否找出並建議原本的郵遞區號
+    rng = np.random.default_rng(0)
+    corrupted = customer_df.copy()
+    rows = rng.choice(len(corrupted), len(corrupted) // 100, replace=False)
+    corrupted.loc[rows, '郵遞區號'] = rng.choice(customer_df['郵遞區號'].unique(), len(rows))
+    report = check_coordinates(corrupted, max_km=args.max_km)
+    changed = corrupted['郵遞區號'].to_numpy() != customer_df['郵遞區號'].to_numpy()
+    caught = report['異常'].to_numpy()
+    recovered = report.loc[caught & changed, '建議郵遞區號'] == customer_df.loc[caught & changed, '郵遞區號']
+    print(f"填錯 {changed.sum()} 位: 找出 {(caught & changed).sum()} 位, 誤報 {(caught & ~changed).sum()} 位, "
+          f"建議郵遞區號正確 {int(recovered.sum())} 位")
+
+    # 100 萬位模擬顧客 (5% 座標偏移 50 km 以上) 的單次檢查時間
+    n = 1_000_000
+    pick = rng.integers(0, len(customer_df), n)
+    synthetic = customer_df.iloc[pick][['客戶編號', '郵遞區號', '緯度', '經度']].reset_index(drop=True)
+    moved = rng.random(n) < 0.05
+    synthetic.loc[moved, '緯度'] += rng.choice([-1, 1], moved.sum()) * rng.uniform(0.5, 2.0, moved.sum())
+    start = time.perf_counter()
+    report = check_coordinates(synthetic, max_km=args.max_km)
+    print(f"{n:,} 位模擬顧客: {time.perf_counter() - start:.2f}s, 異常 {int(report['異常'].sum()):,} 位 "
+          f"(實際偏移 {int(moved.sum()):,} 位)")
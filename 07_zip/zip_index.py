@@ -0,0 +1,170 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+# 5 位數郵遞區號的定址空間，陣列第 z 格即郵遞區號 z
+ZIP_SPACE = 100000
+UNKNOWN_CITY = '未知城市'
+
+_base_dir = os.path.dirname(os.path.abspath(__file__))
+CUSTOMER_DATA_PATH = os.path.join(_base_dir, '..', 'cleaned_customer_data.csv')
+ZIP_DATA_PATH = os.path.join(_base_dir, '..', 'customer_zip.csv')
+
+
+def read_zip_population(path=ZIP_DATA_PATH):
+    """讀取 customer_zip.csv (big5)，並統一欄位名稱為 郵遞區號 / 人口數。"""
+    zip_df = pd.read_csv(path, encoding='big5')
+    zip_df.columns = ['郵遞區號', '人口數']
+    return zip_df
+
+
+def _as_zip(zips):
+    """把郵遞區號 (整數或字串) 轉成可直接當索引的 int64 陣列。"""
+    zips = np.asarray(zips)
+    if zips.dtype.kind not in 'iu':
+        zips = zips.astype(np.int64)
+    if zips.size and (zips.min() < 0 or zips.max() >= ZIP_SPACE):
+        raise ValueError("郵遞區號必須是 5 位數整數")
+    return zips.astype(np.int64, copy=False)
+
+
+def median_centroids(zips, lat, lon):
+    """
+    各郵遞區號座標的中位數 (對個別錯誤座標不敏感)，回傳直接定址的 (緯度, 經度) 陣列，
+    沒有顧客的郵遞區號為 NaN。每個座標軸各排序一次，不需 groupby。
+    """
+    zips = _as_zip(zips)
+    result = []
+    for values in (np.asarray(lat, dtype=float), np.asarray(lon, dtype=float)):
+        order = np.lexsort((values, zips))
+        keys, start, count = np.unique(zips[order], return_index=True, return_counts=True)
+        sorted_values = values[order]
+        centroid = np.full(ZIP_SPACE, np.nan)
+        centroid[keys] = (sorted_values[start + (count - 1) // 2] + sorted_values[start + count // 2]) / 2
+        result.append(centroid)
+    return tuple(result)
+
+
+class ZipIndex:
+    """
+    以郵遞區號直接定址的維度表。
+
+    人口數、城市、中心點經緯度與顧客數都存成長度 100000 的密集陣列，第 z 格就是郵遞區號 z，
+    任何郵遞區號查詢或合併都是一次向量化的取值，不需要雜湊或 merge。
+    """
+
+    def __init__(self, population, city_codes, cities, lat, lon, customers):
+        self.population = population      # 人口數，不在人口檔中的郵遞區號為 -1
+        self.city_codes = city_codes      # 城市代碼 (cities 的索引)，未知為 -1
+        self.cities = np.asarray(cities, dtype=str)
+        self.lat = lat                    # 中心點緯度，未知為 NaN
+        self.lon = lon
+        self.customers = customers        # 顧客數
+
+    # ---------- 建立 ----------
+    @classmethod
+    def from_frames(cls, zip_df, customer_df):
+        """由人口資料 (郵遞區號, 人口數) 與顧客資料 (郵遞區號, 城市, 緯度, 經度) 建立。"""
+        population = np.full(ZIP_SPACE, -1, dtype=np.int64)
+        population[_as_zip(zip_df['郵遞區號'])] = zip_df['人口數'].to_numpy()
+
+        zips = _as_zip(customer_df['郵遞區號'])
+        customers = np.bincount(zips, minlength=ZIP_SPACE)
+
+        # 每個郵遞區號取顧客最多的城市 (同數時取名稱排序較前者)，中心點座標取所有顧客座標的中位數
+        cities, codes = np.unique(customer_df['城市'].to_numpy().astype(str), return_inverse=True)
+        pairs, pair_count = np.unique(zips * len(cities) + codes, return_counts=True)
+        pair_zip, pair_city = pairs // len(cities), pairs % len(cities)
+        order = np.lexsort((-pair_count, pair_zip))
+        first = order[np.r_[True, pair_zip[order][1:] != pair_zip[order][:-1]]]
+        used, city_of_zip = np.unique(pair_city[first], return_inverse=True)
+        cities = cities[used]
+        city_codes = np.full(ZIP_SPACE, -1, dtype=np.int32)
+        city_codes[pair_zip[first]] = city_of_zip
+        lat, lon = median_centroids(zips, customer_df['緯度'].to_numpy(), customer_df['經度'].to_numpy())
+        return cls(population, city_codes, cities, lat, lon, customers)
+
+    @classmethod
+    def from_files(cls, customer_path=CUSTOMER_DATA_PATH, zip_path=ZIP_DATA_PATH):
+        customer_df = pd.read_csv(customer_path, encoding='utf-8-sig',
+                                  usecols=['郵遞區號', '城市', '緯度', '經度'])
+        return cls.from_frames(read_zip_population(zip_path), customer_df)
+
+    def save(self, path):
+        np.savez_compressed(path, population=self.population, city_codes=self.city_codes,
+                            cities=self.cities, lat=self.lat, lon=self.lon, customers=self.customers)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['population'], data['city_codes'], data['cities'],
+                       data['lat'], data['lon'], data['customers'])
+
+    # ---------- 查詢 ----------
+    @property
+    def zips(self):
+        """人口資料中的所有郵遞區號 (由小到大)。"""
+        return np.flatnonzero(self.population >= 0)
+
+    def city(self, zips, default=UNKNOWN_CITY):
+        codes = self.city_codes[_as_zip(zips)]
+        return np.where(codes >= 0, self.cities[np.maximum(codes, 0)], default)
+
+    def penetration(self, zips=None):
+        """客戶滲透率 (%)；人口數為 0 或未知時為 0。"""
+        zips = self.zips if zips is None else _as_zip(zips)
+        pop = self.population[zips]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(pop > 0, self.customers[zips] / pop * 100, 0.0)
+
+    def take(self, zips, field):
+        """以郵遞區號取出欄位值 ('population', 'lat', 'lon', 'customers' 或 'city')。"""
+        if field == 'city':
+            return self.city(zips)
+        return getattr(self, field)[_as_zip(zips)]
+
+    def to_frame(self, zips=None, coords=False):
+        """回傳 07.py 格式的滲透率表 (預設為人口資料中的所有郵遞區號)。"""
+        zips = self.zips if zips is None else _as_zip(zips)
+        table = pd.DataFrame({
+            '郵遞區號': zips,
+            '城市': self.city(zips),
+            '人口數': self.population[zips],
+            '客戶數量': self.customers[zips],
+            '客戶滲透率 (%)': self.penetration(zips),
+        })
+        if coords:
+            table['緯度'] = self.lat[zips]
+            table['經度'] = self.lon[zips]
+        return table
+
+
+if __name__ == "__main__":
+    customer_df = pd.read_csv(CUSTOMER_DATA_PATH, encoding='utf-8-sig')
+    zip_df = read_zip_population()
+
+    # 與原本兩次 pd.merge 的做法比較
+    start = time.perf_counter()
+    counts = customer_df.groupby('郵遞區號').size().reset_index(name='客戶數量')
+    city_map = customer_df[['郵遞區號', '城市']].drop_duplicates()
+    merged = zip_df.merge(counts, on='郵遞區號', how='left').merge(city_map, on='郵遞區號', how='left')
+    merged_zip = merged['客戶數量'].fillna(0).astype(int).to_numpy()
+    t_merge = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = ZipIndex.from_frames(zip_df, customer_df)
+    t_build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    table = index.to_frame()
+    t_table = time.perf_counter() - start
+
+    start = time.perf_counter()
+    population = index.population[_as_zip(customer_df['郵遞區號'])]
+    t_gather = time.perf_counter() - start
+
+    print(f"merge 版本: {t_merge * 1000:.1f} ms, 建立索引: {t_build * 1000:.1f} ms, "
+          f"產生滲透率表: {t_table * 1000:.1f} ms, {len(population)} 位顧客取人口數: {t_gather * 1e6:.0f} µs")
+    print(f"客戶數量一致: {np.array_equal(merged_zip, table['客戶數量'].to_numpy())}")
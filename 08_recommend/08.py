@@ -1,8 +1,14 @@
 import pandas as pd
 import matplotlib.pyplot as plt
 import os
+import sys
 import seaborn as sns
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from correlation_accumulator import CovarianceAccumulator
+from association_matrix import association_matrix, top_associations
+from similar_customers import SimilarCustomers
+
 def analyze_recommendations():
     """
     This script performs a comprehensive analysis of the '推薦次數' column 
@@ -44,7 +50,8 @@ def analyze_recommendations():
     # 相關性熱力圖 (Correlation Heatmap)
     print("   - 正在生成數值特徵相關性熱力圖...")
     numerical_cols = ['推薦次數', '年齡', '加入期間 (月)', '每月費用', '總收入']
-    correlation_matrix = df[numerical_cols].corr()
+    # 由分塊累加的共變異數累加器取出子集合的相關矩陣 (與 01.py 共用同一份快取)
+    correlation_matrix = CovarianceAccumulator.load_cached('cleaned_customer_data.csv').correlation(numerical_cols)
     plt.figure(figsize=(10, 8))
     sns.heatmap(correlation_matrix, annot=True, cmap='coolwarm', fmt=".2f")
     plt.title('主要數值特徵與推薦次數的相關性')
@@ -52,6 +59,31 @@ def analyze_recommendations():
     plt.close()
     print(f"   - 相關性熱力圖已儲存至: {os.path.join(output_dir, 'numerical_features_correlation_heatmap.png')}")
 
+    # 類別欄位 (合約類型、優惠方式、網路連線類型…) 也納入：數值–類別以相關比 η、類別–類別以 Cramér's V 衡量
+    print("   - 正在生成全部欄位與推薦次數 / 客戶狀態的關聯熱力圖...")
+    association, kinds = association_matrix(df)
+    drivers = association[['推薦次數', '客戶狀態']].drop(['推薦次數', '客戶狀態']).dropna(how='all')
+    drivers = drivers.loc[drivers.abs().max(axis=1).sort_values(ascending=False).index]
+    plt.figure(figsize=(8, 12))
+    sns.heatmap(drivers, annot=True, cmap='coolwarm', fmt=".2f", vmin=-1, vmax=1)
+    plt.title('各欄位與推薦次數、客戶狀態的關聯 (Pearson / η / Cramér\'s V)')
+    plt.savefig(os.path.join(output_dir, 'association_drivers_heatmap.png'), bbox_inches='tight')
+    plt.close()
+    print(f"   - 關聯熱力圖已儲存至: {os.path.join(output_dir, 'association_drivers_heatmap.png')}")
+    print("   - 與推薦次數關聯最強的欄位:")
+    print(top_associations(association, kinds, '推薦次數', n=5).round(3).to_string(index=False))
+
+    # --- 2. 相似顧客的服務推薦 ---
+    print("\n2. 正在以相似顧客推薦尚未使用的服務...")
+    model = SimilarCustomers.from_frame(df)
+    # 顧客數少時 LSH 比精確搜尋慢，auto 會依候選數改用精確 k 近鄰
+    print(f"   - 鄰居搜尋方式: {model.choose_method()}")
+    recommendations = model.recommend_all(k=20, n_jobs=min(4, os.cpu_count() or 1))
+    recommendations.to_csv(os.path.join(output_dir, 'similar_customer_recommendations.csv'),
+                           index=False, encoding='utf-8-sig')
+    print(f"   - 推薦結果已儲存至: {os.path.join(output_dir, 'similar_customer_recommendations.csv')}")
+    print("   - 最常被推薦的服務:")
+    print(recommendations['推薦1'].replace('', pd.NA).value_counts().head(5).to_string())
+
 if __name__ == '__main__':
     analyze_recommendations()
-
@@ -2,6 +2,7 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import os
+import sys
 
 # ---------- Paths ----------
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -9,11 +10,17 @@ DATA_PATH = os.path.join(BASE_DIR, "cleaned_customer_data.csv")
 ZIP_PATH = os.path.join(BASE_DIR, "customer_zip.csv")
 OUTPUT_DIR = os.path.join(os.path.dirname(__file__), "images")
 
+sys.path.insert(0, os.path.join(BASE_DIR, "07_zip"))
+from zip_index import ZipIndex, read_zip_population
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bundle_cube import BundleCube
+
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 # ---------- Load data ----------
 customer_df = pd.read_csv(DATA_PATH)
-zip_df = pd.read_csv(ZIP_PATH, encoding="big5")
+zip_index = ZipIndex.from_frames(read_zip_population(ZIP_PATH), customer_df)
 
 # ---------- Basic cleaning ----------
 customer_df["Age"] = pd.to_numeric(customer_df["年齡"], errors="coerce")
@@ -23,11 +30,9 @@ customer_df["Total_Revenue"] = pd.to_numeric(customer_df["總收入"], errors="c
 customer_df["Age"].fillna(customer_df["Age"].median(), inplace=True)
 customer_df["Dependents"].fillna(customer_df["Dependents"].median(), inplace=True)
 
-customer_df["郵遞區號"] = customer_df["郵遞區號"].astype(str)
-zip_df["郵遞區號"] = zip_df["郵遞區號"].astype(str)
-
-# ---------- Merge zipcode data ----------
-df = customer_df.merge(zip_df, on="郵遞區號", how="left")
+# ---------- Zipcode population (direct-address lookup, -1 if unknown) ----------
+df = customer_df.copy()
+df["人口估計"] = zip_index.take(df["郵遞區號"], "population")
 
 # ---------- CLV ----------
 df["CLV"] = df["Total_Revenue"]
@@ -64,6 +69,16 @@ clv_summary["Average_CLV"] = clv_summary["Average_CLV"].round(2)
 print("\n===== CLV Group Summary =====")
 print(clv_summary)
 
+# ---------- Service bundles (12-bit bundle ID cube) ----------
+bundle_cube = BundleCube.from_frame(customer_df)
+bundle_summary = bundle_cube.table(min_count=10)
+marginal_effects = bundle_cube.marginal_effects(min_count=10)
+
+print("\n===== Top Service Bundles by Revenue =====")
+print(bundle_summary.head(10)[["服務數", "客戶數量", "總收入", "平均每月費用", "流失率"]].round(3))
+print("\n===== Marginal Effect of Adding One Service =====")
+print(marginal_effects.round(3))
+
 # ---------- Plot 1: CLV Distribution ----------
 plt.figure()
 df["CLV"].plot(kind="hist", bins=40)
@@ -121,8 +136,22 @@ clv_summary.to_csv(
     encoding="utf-8-sig"
 )
 
+bundle_summary.to_csv(
+    os.path.join(os.path.dirname(__file__), "bundle_summary.csv"),
+    index=False,
+    encoding="utf-8-sig"
+)
+
+marginal_effects.to_csv(
+    os.path.join(os.path.dirname(__file__), "service_marginal_effects.csv"),
+    index=False,
+    encoding="utf-8-sig"
+)
+
 print("\nAnalysis completed.")
 print("Outputs:")
 print("09/customer_with_clv.csv")
 print("09/clv_group_summary.csv")
+print("09/bundle_summary.csv")
+print("09/service_marginal_effects.csv")
 print("09/images/*.png")
@@ -0,0 +1,177 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '06'))
+from service_recommender import SERVICE_COLUMNS, service_masks
+
+
+class BundleCube:
+    """
+    所有服務組合的營收 / 流失立方體。
+
+    每位顧客的 m 個服務 (Yes/No) 編成 m 位元的組合編號 (第 j 個服務為位元 1 << j)，
+    以 np.bincount 一次算出全部 2^m 個組合的客戶數、總收入、每月費用總和與流失數。
+    之後的查詢 (組合表、「多加一個服務」的邊際效果、只看部分服務的彙總) 都只用這 2^m 格，
+    不需再掃描顧客資料。
+    """
+
+    def __init__(self, services, count, revenue, monthly, churned):
+        self.services = list(services)
+        self.count = np.asarray(count, dtype=np.int64)
+        self.revenue = np.asarray(revenue, dtype=float)     # 總收入 加總
+        self.monthly = np.asarray(monthly, dtype=float)     # 每月費用 加總
+        self.churned = np.asarray(churned, dtype=np.int64)
+
+    @classmethod
+    def from_ids(cls, ids, revenue, monthly, churned, services=SERVICE_COLUMNS):
+        size = 1 << len(services)
+        ids = np.asarray(ids, dtype=np.int64)
+        return cls(services,
+                   np.bincount(ids, minlength=size),
+                   np.bincount(ids, weights=revenue, minlength=size),
+                   np.bincount(ids, weights=monthly, minlength=size),
+                   np.bincount(ids, weights=churned, minlength=size).astype(np.int64))
+
+    @classmethod
+    def from_frame(cls, df, services=SERVICE_COLUMNS):
+        ids = service_masks(df, services).astype(np.int64)
+        return cls.from_ids(ids, df['總收入'].to_numpy(dtype=float), df['每月費用'].to_numpy(dtype=float),
+                            (df['客戶狀態'] == 'Churned').to_numpy(), services)
+
+    # ---------- 衍生指標 ----------
+    def _ratio(self, total):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(self.count > 0, total / self.count, np.nan)
+
+    @property
+    def mean_monthly(self):
+        return self._ratio(self.monthly)
+
+    @property
+    def mean_revenue(self):
+        return self._ratio(self.revenue)
+
+    @property
+    def churn_rate(self):
+        return self._ratio(self.churned)
+
+    def bundle_id(self, services):
+        """服務名稱列表 → 組合編號。"""
+        return sum(1 << self.services.index(s) for s in services)
+
+    def bundle_names(self, ids):
+        names = np.array(self.services)
+        return ['、'.join(names[[(b >> j) & 1 == 1 for j in range(len(names))]]) or '(無)' for b in ids]
+
+    def table(self, min_count=1):
+        """客戶數 ≥ min_count 的組合表，依總收入排序。"""
+        ids = np.flatnonzero(self.count >= min_count)
+        table = pd.DataFrame({
+            '組合編號': ids,
+            '服務組合': self.bundle_names(ids),
+            '服務數': np.array([bin(b).count('1') for b in ids], dtype=np.int64),
+            '客戶數量': self.count[ids],
+            '總收入': self.revenue[ids],
+            '平均每月費用': self.mean_monthly[ids],
+            '平均總收入': self.mean_revenue[ids],
+            '流失率': self.churn_rate[ids],
+        })
+        return table.sort_values('總收入', ascending=False).reset_index(drop=True)
+
+    # ---------- 邊際效果 ----------
+    def add_service(self, service, min_count=10):
+        """
+        「多加 service」的效果：對每個不含該服務的組合 b，與翻轉該位元後的 b | bit 比較。
+        只列出兩邊客戶數都 ≥ min_count 的組合。
+        """
+        bit = 1 << self.services.index(service)
+        base = np.flatnonzero((np.arange(len(self.count)) & bit) == 0)
+        flipped = base | bit
+        keep = (self.count[base] >= min_count) & (self.count[flipped] >= min_count)
+        base, flipped = base[keep], flipped[keep]
+        return pd.DataFrame({
+            '原組合': self.bundle_names(base),
+            '原客戶數': self.count[base],
+            '加入後客戶數': self.count[flipped],
+            '每月費用差異': self.mean_monthly[flipped] - self.mean_monthly[base],
+            '平均總收入差異': self.mean_revenue[flipped] - self.mean_revenue[base],
+            '流失率差異': self.churn_rate[flipped] - self.churn_rate[base],
+        })
+
+    def marginal_effects(self, min_count=10):
+        """
+        每個服務的平均邊際效果：所有 (b, b | bit) 組合對的差異，以兩邊客戶數的較小值加權平均。
+        以相同的其他服務比較，排除了「持有該服務的人本來就持有較多服務」的混雜。
+        """
+        rows = []
+        for service in self.services:
+            bit = 1 << self.services.index(service)
+            base = np.flatnonzero((np.arange(len(self.count)) & bit) == 0)
+            flipped = base | bit
+            weight = np.minimum(self.count[base], self.count[flipped])
+            weight = np.where(weight >= min_count, weight, 0)
+            row = {'服務': service, '組合對數': int((weight > 0).sum()), '比較客戶數': int(weight.sum())}
+            for name, values in [('每月費用差異', self.mean_monthly), ('平均總收入差異', self.mean_revenue),
+                                 ('流失率差異', self.churn_rate)]:
+                delta = np.nan_to_num(values[flipped] - values[base])
+                row[name] = (delta * weight).sum() / weight.sum() if weight.sum() > 0 else np.nan
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+    # ---------- 彙總 ----------
+    def project(self, services):
+        """只保留部分服務的立方體 (其他服務加總掉)，由 2^m 格直接彙總。"""
+        ids = np.arange(len(self.count))
+        new_ids = np.zeros(len(ids), dtype=np.int64)
+        for k, s in enumerate(services):
+            new_ids |= ((ids >> self.services.index(s)) & 1) << k
+        size = 1 << len(services)
+        return BundleCube(services,
+                          np.bincount(new_ids, weights=self.count, minlength=size).astype(np.int64),
+                          np.bincount(new_ids, weights=self.revenue, minlength=size),
+                          np.bincount(new_ids, weights=self.monthly, minlength=size),
+                          np.bincount(new_ids, weights=self.churned, minlength=size).astype(np.int64))
+
+    # ---------- 讀寫 ----------
+    def save(self, path):
+        np.savez(path, services=np.array(self.services, dtype=str), count=self.count, revenue=self.revenue,
+                 monthly=self.monthly, churned=self.churned)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['services'].tolist(), data['count'], data['revenue'], data['monthly'], data['churned'])
+
+
+if __name__ == "__main__":
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    customer_df = pd.read_csv(os.path.join(base_dir, '..', 'cleaned_customer_data.csv'), encoding='utf-8-sig')
+
+    start = time.perf_counter()
+    cube = BundleCube.from_frame(customer_df)
+    print(f"{len(cube.count)} 個組合 (有客戶的 {int((cube.count > 0).sum())} 個): "
+          f"{(time.perf_counter() - start) * 1000:.1f} ms")
+
+    # 與 groupby 比對
+    df = customer_df.assign(組合=service_masks(customer_df).astype(np.int64),
+                            流失=customer_df['客戶狀態'] == 'Churned')
+    expected = df.groupby('組合').agg(客戶數量=('客戶編號', 'size'), 總收入=('總收入', 'sum'),
+                                     平均每月費用=('每月費用', 'mean'), 流失率=('流失', 'mean'))
+    got = cube.table().set_index('組合編號').loc[expected.index]
+    print(f"與 groupby 一致: {all(np.allclose(got[c], expected[c]) for c in expected.columns)}")
+    two = cube.project(['網路服務', '電話服務']).table()
+    print(f"只看 網路服務 × 電話服務 的彙總與原資料一致: "
+          f"{two['客戶數量'].sum() == len(customer_df) and np.isclose(two['總收入'].sum(), customer_df['總收入'].sum())}")
+
+    pd.options.display.float_format = '{:.3f}'.format
+    pd.options.display.max_colwidth = 60
+    print("\n總收入最高的 10 個服務組合:")
+    print(cube.table().head(10).to_string(index=False))
+    print("\n各服務的平均邊際效果 (其他服務相同的組合兩兩比較):")
+    print(cube.marginal_effects().to_string(index=False))
+    print("\n加入 技術支援計劃 的效果 (流失率下降最多的 5 個組合):")
+    print(cube.add_service('技術支援計劃').nsmallest(5, '流失率差異').to_string(index=False))
@@ -0,0 +1,204 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+CUSTOMER_DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cleaned_customer_data.csv')
+
+
+class CovarianceAccumulator:
+    """
+    可分塊更新、可合併的共變異數 / 相關係數累加器。
+
+    對每一對欄位 (i, j) 保存兩者皆非缺失的列數 n、各自的和、平方和與交叉乘積和，
+    與 pandas 的 corr() 一樣採成對刪除缺失值。累加的是減去固定平移量 (第一塊資料的平均)
+    後的值，避免大數值相減造成精度損失；不同平移量的累加器合併時會先換算到同一平移量。
+    任意欄位子集合的相關矩陣都可直接由累加值算出，不需再讀一次資料。
+    """
+
+    def __init__(self, columns, shift=None):
+        self.columns = list(columns)
+        k = len(self.columns)
+        self.shift = None if shift is None else np.asarray(shift, dtype=float)
+        self.n = np.zeros((k, k), dtype=np.int64)    # 兩欄皆非缺失的列數
+        self.sums = np.zeros((k, k))                 # sums[i, j]: 欄 i 在 (i, j) 皆非缺失列上的和
+        self.squares = np.zeros((k, k))              # squares[i, j]: 同上的平方和
+        self.cross = np.zeros((k, k))                # cross[i, j]: 交叉乘積和
+
+    # ---------- 累加 ----------
+    def update(self, chunk):
+        """加入一塊資料 (DataFrame 或欄位順序相同的二維陣列)。"""
+        values = chunk[self.columns].to_numpy(dtype=float) if isinstance(chunk, pd.DataFrame) \
+            else np.asarray(chunk, dtype=float)
+        if self.shift is None:
+            with np.errstate(invalid='ignore'):
+                mean = np.nanmean(values, axis=0) if len(values) else np.zeros(len(self.columns))
+            self.shift = np.nan_to_num(mean)
+        valid = ~np.isnan(values)
+        a = np.where(valid, values - self.shift, 0.0)
+        m = valid.astype(float)
+        self.n += (m.T @ m).astype(np.int64)
+        self.sums += a.T @ m
+        self.squares += (a * a).T @ m
+        self.cross += a.T @ a
+        return self
+
+    def _shifted(self, shift):
+        """回傳換算到另一個平移量的 (sums, squares, cross)。"""
+        d = (self.shift - shift)[:, None]             # 原值 a = x - c，新值 a + d
+        sums = self.sums + d * self.n
+        squares = self.squares + 2 * d * self.sums + d * d * self.n
+        cross = self.cross + d.T * self.sums + d * self.sums.T + d * d.T * self.n
+        return sums, squares, cross
+
+    def merge(self, other):
+        """合併另一個累加器 (欄位需相同)，回傳新的累加器。"""
+        if other.columns != self.columns:
+            raise ValueError("合併的累加器欄位不一致")
+        if self.shift is None:
+            return other.copy()
+        result = self.copy()
+        if other.shift is None:
+            return result
+        sums, squares, cross = other._shifted(self.shift)
+        result.n += other.n
+        result.sums += sums
+        result.squares += squares
+        result.cross += cross
+        return result
+
+    def copy(self):
+        result = CovarianceAccumulator(self.columns, self.shift)
+        result.n, result.sums, result.squares, result.cross = \
+            self.n.copy(), self.sums.copy(), self.squares.copy(), self.cross.copy()
+        return result
+
+    # ---------- 結果 ----------
+    def _select(self, columns):
+        idx = np.arange(len(self.columns)) if columns is None else \
+            np.array([self.columns.index(c) for c in columns])
+        ix = np.ix_(idx, idx)
+        return [self.columns[i] for i in idx], self.n[ix].astype(float), self.sums[ix], \
+            self.squares[ix], self.cross[ix]
+
+    def covariance(self, columns=None, ddof=1):
+        """樣本共變異數矩陣 (成對刪除缺失值，列數不足時為 NaN)。"""
+        names, n, s, _, c = self._select(columns)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cov = (c - s * s.T / n) / (n - ddof)
+        cov[n <= ddof] = np.nan
+        return pd.DataFrame(cov, index=names, columns=names)
+
+    def correlation(self, columns=None):
+        """Pearson 相關係數矩陣，結果與 DataFrame.corr() 相同。"""
+        names, n, s, q, c = self._select(columns)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            numerator = c - s * s.T / n
+            var_i = q - s * s / n                     # 欄 i 在 (i, j) 成對列上的離均差平方和
+            corr = numerator / np.sqrt(var_i * var_i.T)
+        corr = np.clip(corr, -1, 1)
+        corr[(n < 2) | ~np.isfinite(corr)] = np.nan
+        return pd.DataFrame(corr, index=names, columns=names)
+
+    def means(self):
+        diag = np.diag(self.n).astype(float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return pd.Series(np.diag(self.sums) / diag + self.shift, index=self.columns)
+
+    # ---------- 讀寫 ----------
+    def save(self, path):
+        np.savez(path, columns=np.array(self.columns, dtype=str), shift=self.shift,
+                 n=self.n, sums=self.sums, squares=self.squares, cross=self.cross)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            result = cls(data['columns'].tolist(), data['shift'])
+            result.n, result.sums, result.squares, result.cross = \
+                data['n'], data['sums'], data['squares'], data['cross']
+        return result
+
+    # ---------- 由 CSV 建立 ----------
+    @classmethod
+    def from_csv(cls, path=CUSTOMER_DATA_PATH, columns=None, chunksize=100_000, encoding='utf-8-sig',
+                 skiprows=None, nrows=None):
+        """
+        分塊讀取 CSV 並累加；columns 預設為第一塊中所有數值欄位。
+        一次只有一塊資料在記憶體中，因此可處理大於記憶體的檔案。
+        """
+        accumulator = None
+        reader = pd.read_csv(path, encoding=encoding, usecols=columns, chunksize=chunksize,
+                             skiprows=skiprows, nrows=nrows)
+        for chunk in reader:
+            if accumulator is None:
+                numeric = columns or chunk.select_dtypes('number').columns.tolist()
+                accumulator = cls(numeric)
+            accumulator.update(chunk)
+        return accumulator if accumulator is not None else cls(columns or [])
+
+    @classmethod
+    def from_csv_parallel(cls, path=CUSTOMER_DATA_PATH, columns=None, n_jobs=4, chunksize=100_000,
+                          encoding='utf-8-sig'):
+        """把資料列切成 n_jobs 段，各行程分別累加後合併。"""
+        with open(path, 'rb') as f:
+            n_rows = sum(1 for _ in f) - 1
+        if columns is None:
+            columns = pd.read_csv(path, encoding=encoding, nrows=1000).select_dtypes('number').columns.tolist()
+        bounds = np.linspace(0, n_rows, n_jobs + 1).astype(int)
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            shards = pool.map(_accumulate_shard, [(path, columns, chunksize, encoding, a, b)
+                                                  for a, b in zip(bounds[:-1], bounds[1:]) if b > a])
+            result = cls(columns)
+            for shard in shards:
+                result = result.merge(shard)
+        return result
+
+    @classmethod
+    def load_cached(cls, csv_path=CUSTOMER_DATA_PATH, cache_path=None):
+        """讀取 CSV 旁的快取 (.corr.npz)，CSV 較新或快取不存在時重新分塊累加。"""
+        cache_path = cache_path or os.path.splitext(csv_path)[0] + '.corr.npz'
+        if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(csv_path):
+            return cls.load(cache_path)
+        accumulator = cls.from_csv(csv_path)
+        accumulator.save(cache_path)
+        return accumulator
+
+
+def _accumulate_shard(args):
+    path, columns, chunksize, encoding, start, stop = args
+    # 保留表頭 (第 0 列)，跳過本段之前的資料列
+    return CovarianceAccumulator.from_csv(path, columns, chunksize, encoding,
+                                          skiprows=range(1, start + 1), nrows=stop - start)
+
+
+if __name__ == "__main__":
+    df = pd.read_csv(CUSTOMER_DATA_PATH, encoding='utf-8-sig')
+
+    start = time.perf_counter()
+    accumulator = CovarianceAccumulator.from_csv(chunksize=1000)
+    t_stream = time.perf_counter() - start
+    expected = df[accumulator.columns].corr()
+    got = accumulator.correlation()
+    print(f"分塊累加 {len(accumulator.columns)} 個數值欄位: {t_stream * 1000:.1f} ms, "
+          f"與 DataFrame.corr() 最大差異 {np.nanmax(np.abs(got.to_numpy() - expected.to_numpy())):.2e}")
+
+    # 含缺失值時與 pandas 的成對刪除結果一致
+    rng = np.random.default_rng(0)
+    holes = df[accumulator.columns].mask(rng.random((len(df), len(accumulator.columns))) < 0.1)
+    partial = CovarianceAccumulator(accumulator.columns)
+    for rows in np.array_split(np.arange(len(holes)), 7):
+        partial.update(holes.iloc[rows])
+    print(f"10% 缺失值: 相關係數最大差異 {np.nanmax(np.abs(partial.correlation() - holes.corr()).to_numpy()):.2e}, "
+          f"共變異數最大相對差異 {np.nanmax(np.abs(partial.covariance() / holes.cov() - 1).to_numpy()):.2e}")
+
+    # 平行分段累加後合併
+    start = time.perf_counter()
+    merged = CovarianceAccumulator.from_csv_parallel(columns=accumulator.columns, n_jobs=4)
+    print(f"4 個行程分段累加並合併: {(time.perf_counter() - start) * 1000:.1f} ms, "
+          f"與單一累加器最大差異 {np.nanmax(np.abs(merged.correlation() - got).to_numpy()):.2e}")
+
+    subset = ['推薦次數', '年齡', '加入期間 (月)', '每月費用', '總收入']
+    print("\n欄位子集合的相關矩陣 (不需重新讀取資料):")
+    print(accumulator.correlation(subset).round(3).to_string())